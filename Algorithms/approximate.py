@@ -0,0 +1,404 @@
+import math
+import sys
+
+from tokens import *
+
+# The largest size in bits of an integer product, power or factorial that is computed exactly (a larger one is
+# approximated). Such results cost at most a few word multiplications per bit (see Algorithms.cost), so the digits
+# and the residues of results like (1000!)# or (2^4000) % 3 stay known
+MAX_EXACT_BITS = 1 << 16
+
+# The largest number of decimal digits of a float result (a larger float overflows, so it is approximated)
+MAX_FLOAT_DIGITS = 308
+
+# The rounding error of a float operation on a logarithm, relative to the logarithm (a few units in the last place)
+ROUNDING = 8 * sys.float_info.epsilon
+
+# The largest number of significant digits that an approximation is written with
+MAX_SIGNIFICANT_DIGITS = 15
+
+LN10 = math.log(10)
+
+LOG2_10 = math.log2(10)
+
+
+class Approximation:
+    """
+    This class represents an approximate number that may be too large for a float: its sign, the base 10 logarithm of
+    its absolute value, and an error bound of that logarithm (the exact number is within a factor of 10^error of the
+    approximation). The mantissa and the decimal exponent are derived from the logarithm
+    """
+    __slots__ = ('sign', 'log10', 'error', 'integral')
+
+    def __init__(self, sign:int, log10:float, error:float, integral:bool) -> None:
+        self.sign = sign  # The sign of the number (1 or -1, an approximation is never 0)
+        self.log10 = log10  # The base 10 logarithm of the absolute value
+        self.error = error  # The bound of the logarithm's absolute error
+        self.integral = integral  # Whether the exact number is an integer
+
+    @property
+    def exponent(self) -> int:
+        return math.floor(self.log10)
+
+    @property
+    def mantissa(self) -> float:
+        # The absolute value is mantissa * 10^exponent, with 1 <= mantissa < 10
+        return 10 ** (self.log10 - self.exponent)
+
+    @property
+    def relative_error(self) -> float:
+        # The bound of the relative error of the approximation (inf if not even the exponent is known)
+        if self.error > MAX_FLOAT_DIGITS:
+            return math.inf
+        return math.expm1(self.error * LN10)
+
+    @property
+    def significant_digits(self) -> int:
+        # The number of leading digits that the error bound leaves correct (0 if not even the first digit is known)
+        return _significant_digits(self.relative_error)
+
+    def __float__(self) -> float:
+        if self.log10 > MAX_FLOAT_DIGITS:
+            return math.copysign(math.inf, self.sign)
+        return self.sign * 10 ** self.log10
+
+    def __str__(self) -> str:
+        # The scientific notation, with the significant digits only (e.g. 2.8462596809e+35659)
+        digits = self.significant_digits
+        sign = '-' if self.sign < 0 else ''
+
+        # Without a known digit, only the magnitude is written (e.g. 10^1.5e+160)
+        if digits == 0:
+            log_digits = _significant_digits(self.error / abs(self.log10)) if self.log10 else 0
+            return f"{sign}10^{self.log10:.{max(1, log_digits) - 1}e}"
+
+        exponent = self.exponent
+        mantissa = f"{self.mantissa:.{digits - 1}f}"
+
+        # The mantissa may round up to 10
+        if float(mantissa) >= 10:
+            exponent += 1
+            mantissa = f"{self.mantissa / 10:.{digits - 1}f}"
+
+        return f"{sign}{mantissa}e{exponent:+d}"
+
+    def __repr__(self) -> str:
+        return f"Approximation({self}, relative_error={self.relative_error:.1e})"
+
+
+def _significant_digits(relative_error:float) -> int:
+    # The number of leading digits of a number that a relative error leaves correct
+    if relative_error <= 0:
+        return MAX_SIGNIFICANT_DIGITS
+    if relative_error >= 1:
+        return 0
+    return max(1, min(MAX_SIGNIFICANT_DIGITS, math.floor(-math.log10(relative_error))))
+
+
+def evaluate_approximate(expression:Token, bindings:dict = None) -> float:
+    """
+    This function evaluates an expression in the approximate mode: the integer products, powers and factorials with
+    more than MAX_EXACT_BITS bits (and the floats that would overflow) are approximated in log space, with
+    log-gamma (Stirling's series) for the factorials. The other results are exact. The operators raise like in the
+    exact evaluation, except that the size limits of the powers and factorials do not apply (the approximations are
+    cheap), and that the digits and the residues of approximations are unknown. The tree is walked with an explicit
+    stack
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+    Returns:
+        float: the result of the expression (an exact number, or an Approximation)
+    """
+    values = []  # The results of the evaluated subtrees, in post-order
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if type(node) == Number:
+            values.append(node.value)
+
+        elif type(node) == Variable:
+            if bindings is None or node.value not in bindings:
+                raise UnboundVariableException(node.value)
+            values.append(bindings[node.value])
+
+        elif expanded:
+            arity = len(node.children)
+            operands = values[len(values) - arity:]
+            del values[len(values) - arity:]
+            values.append(_apply(type(node), operands))
+
+        else:
+            # The tilda operand is validated before it is evaluated
+            if type(node) == Tilda:
+                node.validate_operands()
+
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return values[0]
+
+
+def _apply(operator:type, operands:list) -> float:
+    # The n-ary chains are applied as binary operators from left to right, so every step may switch to approximations
+    if operator in (Sum, Product):
+        binary = Plus if operator == Sum else Mult
+        result = operands[0]
+        for operand in operands[1:]:
+            result = _apply(binary, [result, operand])
+        return result
+
+    # Exact operands get an exact result if it is small enough (an overflowing float is approximated instead)
+    if not any(type(operand) == Approximation for operand in operands) and _is_exact(operator, operands):
+        try:
+            return operator.operate(*operands)
+        except OverflowError:
+            pass
+
+    return APPROXIMATIONS[operator](*operands)
+
+
+def _is_exact(operator:type, operands:list) -> bool:
+    # Whether the result of exact operands is small enough to compute exactly
+    is_float = any(type(operand) == float for operand in operands) or operator in (Div, Avg)
+    if operator == Power and operands[1] < 0:
+        is_float = True
+
+    # Without floats, only the products, the powers and the factorials grow faster than their operands
+    if not is_float and operator not in (Mult, Power, Factorial):
+        return True
+
+    if is_float:
+        return _result_log10(operator, operands) < MAX_FLOAT_DIGITS
+    return _result_log10(operator, operands) * LOG2_10 < MAX_EXACT_BITS
+
+
+def _result_log10(operator:type, operands:list) -> float:
+    # An estimate of the base 10 logarithm of the result's absolute value (an invalid operand gets 0, so the exact
+    # evaluation raises its exception)
+    if operator == Factorial:
+        n, = operands
+        if not (n >= 0 and n % 1 == 0):
+            return 0.0
+        return _log_factorial(_to_float(n))
+
+    if operator == Power:
+        base, exponent = operands
+        if base == 0 or exponent == 0:
+            return 0.0
+        return _to_float(exponent) * _log10(base)
+
+    if operator == Mult:
+        return sum(_log10(operand) for operand in operands)
+
+    if operator == Div:
+        left, right = operands
+        return _log10(left) - _log10(right) if left != 0 and right != 0 else 0.0
+
+    if operator in (Max, Min):
+        return -math.inf
+
+    return max(_log10(operand) for operand in operands) + 1
+
+
+def _log10(value:float) -> float:
+    return math.log10(abs(value)) if value != 0 else -math.inf
+
+
+def _to_float(value:float) -> float:
+    # A number as a float (inf if it is too large)
+    try:
+        return float(value)
+    except OverflowError:
+        return math.inf if value > 0 else -math.inf
+
+
+def _log_factorial(n:float) -> float:
+    # log10(n!) = lgamma(n + 1) / ln(10) (lgamma overflows for the largest floats)
+    return math.lgamma(n + 1) / LN10 if n < 1e300 else math.inf
+
+
+def _rounding(log10:float) -> float:
+    return ROUNDING * (1 + abs(log10))
+
+
+def _approximate(value:float) -> Approximation:
+    # The approximation of a nonzero exact number (or of an approximation)
+    if type(value) == Approximation:
+        return value
+    log10 = math.log10(abs(value))
+    return Approximation(1 if value > 0 else -1, log10, _rounding(log10), value % 1 == 0)
+
+
+def _checked(sign:int, log10:float, error:float, integral:bool) -> Approximation:
+    # An approximation, unless its logarithm overflowed
+    if not math.isfinite(log10) or not math.isfinite(error):
+        raise InvalidOperandException("Invalid operands. The result is out of the range of the approximations")
+    return Approximation(sign, log10, error + _rounding(log10), integral)
+
+
+def _negative(value:float) -> Approximation:
+    value = _approximate(value)
+    return Approximation(-value.sign, value.log10, value.error, value.integral)
+
+
+def _plus(left:float, right:float) -> float:
+    if left == 0 or right == 0:
+        return right if left == 0 else left
+    left, right = _approximate(left), _approximate(right)
+
+    big, small = (left, right) if left.log10 >= right.log10 else (right, left)
+    integral = left.integral and right.integral
+    ratio = 10 ** (small.log10 - big.log10) if small.log10 - big.log10 > -400 else 0.0
+
+    # A sum of numbers of the same sign has the largest relative error of the numbers
+    if big.sign == small.sign:
+        return _checked(big.sign, big.log10 + math.log1p(ratio) / LN10, max(big.error, small.error), integral)
+
+    # A difference amplifies the errors of the numbers by big / (big - small)
+    relative_error = (big.relative_error + ratio * small.relative_error) / (1 - ratio) if ratio < 1 else math.inf
+    if relative_error >= 1:
+        raise InvalidOperandException("Invalid operands for subtraction. The difference is smaller than the error "
+                                      "of its approximate operands")
+    return _checked(big.sign, big.log10 + math.log1p(-ratio) / LN10, -math.log10(1 - relative_error), integral)
+
+
+def _minus(left:float, right:float) -> float:
+    return _plus(left, _negative(right) if type(right) == Approximation else -right)
+
+
+def _mult(left:float, right:float) -> float:
+    if left == 0 or right == 0:
+        return _zero(left, right)
+    left, right = _approximate(left), _approximate(right)
+    return _checked(left.sign * right.sign, left.log10 + right.log10, left.error + right.error,
+                    left.integral and right.integral)
+
+
+def _div(left:float, right:float) -> float:
+    Div.validate_operands(left, right)
+    if left == 0:
+        return 0.0
+    left, right = _approximate(left), _approximate(right)
+    return _checked(left.sign * right.sign, left.log10 - right.log10, left.error + right.error, False)
+
+
+def _avg(left:float, right:float) -> float:
+    total = _plus(left, right)
+    if total == 0:
+        return 0.0
+    total = _approximate(total)
+    return _checked(total.sign, total.log10 - math.log10(2), total.error, False)
+
+
+def _power(base:float, exponent:float) -> float:
+    if base == 0 and exponent == 0:
+        Power.validate_operands(base, exponent)
+
+    # 0 to a positive power is 0 (and to a negative power, a division by 0 like in the exact evaluation)
+    if base == 0:
+        if _sign(exponent) < 0:
+            raise ZeroDivisionError("0.0 cannot be raised to a negative power")
+        return base
+    if exponent == 0:
+        return 1.0 if type(exponent) == float else 1
+
+    base = _approximate(base)
+    power = _to_float(exponent)
+    exponent_error = exponent.relative_error if type(exponent) == Approximation else 0.0
+
+    # A negative base has the sign of the exponent's parity (an approximate exponent has an unknown parity)
+    sign = 1
+    if base.sign < 0:
+        if type(exponent) == Approximation:
+            raise InvalidOperandException("Invalid operands for power expression. The sign of the power of an "
+                                          "approximate exponent is unknown")
+        if exponent % 1 != 0:
+            raise InvalidOperandException("Invalid operand for power expression. The result of the power expression "
+                                          "is a complex number")
+        sign = -1 if exponent % 2 == 1 else 1
+
+    log10 = power * base.log10
+    error = abs(power) * base.error + abs(log10) * exponent_error
+    integral = base.integral and _sign(exponent) > 0 and (type(exponent) == Approximation or exponent % 1 == 0)
+    return _checked(sign, log10, error, integral)
+
+
+def _factorial(value:float) -> float:
+    if type(value) != Approximation:
+        Factorial.validate_operands(value)
+    elif value.sign < 0 or not value.integral:
+        raise InvalidOperandException("Invalid operand for the factorial operator. Only natural numbers are allowed")
+
+    # log10(n!) grows by about log10(n) per unit of n, so the relative error of n is amplified by n * log10(n)
+    n = _to_float(value)
+    conversion_error = _approximate(value).relative_error if n != value else 0.0
+    log10 = _log_factorial(n)
+    error = n * conversion_error * math.log10(n + 1)
+    return _checked(1, log10, error, type(value) == int or (type(value) == Approximation and value.integral))
+
+
+def _mod(left:float, right:float) -> float:
+    Mod.validate_operands(left, right)
+
+    # The residue of a number that is smaller than the modulus (with the same sign) is the number, and the other
+    # residues of approximations are unknown
+    if left == 0:
+        return left
+    approximate_left, approximate_right = _approximate(left), _approximate(right)
+    if approximate_left.sign == approximate_right.sign and \
+            approximate_left.log10 + approximate_left.error < approximate_right.log10 - approximate_right.error:
+        return left
+    raise InvalidOperandException("Invalid operands for mod operator. The residue of an approximate number is unknown")
+
+
+def _max(left:float, right:float) -> float:
+    return left if _order(left) > _order(right) else right
+
+
+def _min(left:float, right:float) -> float:
+    return left if _order(left) < _order(right) else right
+
+
+def _sum_digits(value:float) -> float:
+    raise InvalidOperandException("Invalid operand for the sum of digits. The digits of an approximate number are "
+                                  "unknown")
+
+
+def _power_mod(base:float, exponent:float, modulus:float) -> float:
+    return _mod(_power(base, exponent), modulus)
+
+
+def _factorial_mod(value:float, modulus:float) -> float:
+    return _mod(_factorial(value), modulus)
+
+
+def _sign(value:float) -> int:
+    if type(value) == Approximation:
+        return value.sign
+    return (value > 0) - (value < 0)
+
+
+def _zero(*operands:float) -> float:
+    # A zero result, which is a float if one of the operands is not an integer
+    if any(type(operand) == float or (type(operand) == Approximation and not operand.integral) for operand in operands):
+        return 0.0
+    return 0
+
+
+def _order(value:float) -> tuple:
+    # A key that orders exact numbers and approximations by their values
+    value = value if value == 0 else _approximate(value)
+    if type(value) != Approximation:
+        return 0, 0.0
+    return value.sign, value.sign * value.log10
+
+
+# The approximate operation of every operator, on exact numbers or approximations
+APPROXIMATIONS = {
+    Negative: _negative, Tilda: _negative, Factorial: _factorial, SumDigits: _sum_digits,
+    Plus: _plus, Minus: _minus, Mult: _mult, Div: _div, Power: _power, Mod: _mod, Max: _max, Min: _min, Avg: _avg,
+    PowerMod: _power_mod, FactorialMod: _factorial_mod}
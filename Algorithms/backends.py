@@ -0,0 +1,336 @@
+import math
+from fractions import Fraction
+
+from Algorithms.digits import sum_digits
+from Algorithms.factorial import factorial, factorial_mod, max_operand
+from Algorithms.lexing import native_literal
+from tokens import *
+
+# gmpy2 is optional: the GMP backend needs it, and falls back to the exact backend without it
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+# The message of the overflows of the float backend
+FLOAT_OVERFLOW = "The result is too large for the float backend"
+
+
+class NumericBackend:
+    """
+    This class represents a numeric backend: it builds the values of the literals, computes the operators and reports
+    its overflows. The native backend (this class) computes like the tree evaluation: integer literals are ints, the
+    other literals are floats, and the operators are the operators' own arithmetic
+    """
+    name = 'native'  # The name of the backend (see make_backend)
+    overflow_errors = (OverflowError,)  # The exceptions that the backend raises when a result is too large
+
+    def __init__(self) -> None:
+        self.kernels = {}  # The kernels that replace the operators' own arithmetic, by operator type
+
+    def literal(self, number:int, digits_after_decimal_point:int) -> float:
+        """
+        this method builds the value of a number literal from its digits (see Algorithms.lexing.native_literal)
+
+        Args:
+            number (int): the digits of the literal (without the decimal point)
+            digits_after_decimal_point (int): the number of digits after the decimal point
+
+        Returns:
+            float: the value of the literal
+        """
+        return native_literal(number, digits_after_decimal_point)
+
+    def convert(self, value:float) -> float:
+        """
+        this method converts a value (of a literal that was built by another backend, or of a variable) to the
+        numbers of the backend
+
+        Args:
+            value (float): the value
+
+        Returns:
+            float: the value in the numbers of the backend
+        """
+        return value
+
+    def operate(self, node_type:type, values:list) -> float:
+        """
+        this method computes an operator from the values of its operands
+
+        Args:
+            node_type (type): the type of the operator node
+            values (list): the values of its operands
+
+        Returns:
+            float: the result of the operator
+        """
+        kernel = self.kernels.get(node_type, node_type.operate)
+        return kernel(*values)
+
+    def evaluate(self, expression:Token, bindings:dict = None) -> float:
+        """
+        this method evaluates an expression tree with the backend's numbers, in the same order as the tree evaluation
+        (so it raises the same exceptions). The overflows of the backend are raised as OverflowError. The tree is
+        walked with an explicit stack
+
+        Args:
+            expression (Token): the root node of the expression
+            bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+        Returns:
+            float: the result of the expression
+        """
+        bindings = bindings or {}
+        values = []  # The values of the evaluated subtrees, in post-order
+        stack = [(expression, False)]
+
+        try:
+            while stack:
+                node, expanded = stack.pop()
+
+                if type(node) == Number:
+                    values.append(self.convert(node.value))
+
+                elif type(node) == Variable:
+                    if node.value not in bindings:
+                        raise UnboundVariableException(node.value)
+                    values.append(self.convert(bindings[node.value]))
+
+                elif expanded:
+                    arity = len(node.children)
+                    operands = values[len(values) - arity:]
+                    del values[len(values) - arity:]
+                    values.append(self.operate(type(node), operands))
+
+                else:
+                    # The tilda operand is validated before it is evaluated
+                    if type(node) == Tilda:
+                        node.validate_operands()
+
+                    stack.append((node, True))
+                    for child in reversed(node.children):
+                        stack.append((child, False))
+
+        except self.overflow_errors as error:
+            if isinstance(error, OverflowError):
+                raise
+            raise OverflowError(f"The result is too large for the {self.name} backend ({error})") from error
+
+        return values[0]
+
+
+class FloatBackend(NumericBackend):
+    """
+    This class represents the float backend: every number is a double, so the evaluation is fast and its results are
+    rounded. A result that overflows to an infinity (from finite operands) is reported as an overflow, instead of
+    being carried through the rest of the expression
+    """
+    name = 'float'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.kernels = {FactorialMod: self._factorial_mod}
+
+    def literal(self, number:int, digits_after_decimal_point:int) -> float:
+        return float(native_literal(number, digits_after_decimal_point))
+
+    def convert(self, value:float) -> float:
+        return float(value)
+
+    def operate(self, node_type:type, values:list) -> float:
+        try:
+            return _finite(super().operate(node_type, values), values)
+        except OverflowError as error:
+            raise OverflowError(FLOAT_OVERFLOW) from error
+
+    @staticmethod
+    def _factorial_mod(value:float, modulus:float) -> float:
+        # The float factorial is checked before its residue is taken (the residue of an infinity is NaN)
+        return Mod.operate(_finite(Factorial.operate(value), (value,)), modulus)
+
+
+class ExactBackend(NumericBackend):
+    """
+    This class represents the exact backend: the literals with a decimal point are fractions (0.1 is exactly 1/10),
+    divisions and averages are exact, and the integral fractions are normalized back to integers. Only the powers
+    with a fractional exponent (whose results are irrational) are rounded to floats
+    """
+    name = 'exact'
+    integer = int  # The integer type of the backend
+    rational = Fraction  # The fraction type of the backend
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.kernels = {Factorial: self._factorial, SumDigits: self._sum_digits, Div: self._div, Power: self._power,
+                        Avg: self._avg, PowerMod: self._power_mod, FactorialMod: self._factorial_mod}
+
+    def literal(self, number:int, digits_after_decimal_point:int) -> float:
+        return self.normalize(self.rational(self.integer(number), self.integer(10) ** digits_after_decimal_point))
+
+    def convert(self, value:float) -> float:
+        # The floats are converted to their exact binary values
+        if type(value) in (self.integer, self.rational):
+            return value
+        if isinstance(value, int):
+            return self.integer(value)
+        return self.normalize(self.rational(value))
+
+    def operate(self, node_type:type, values:list) -> float:
+        # An operator with a rounded operand computes like the tree evaluation, with Python's numbers
+        if float in map(type, values):
+            values = [self.native(value) for value in values]
+        return self.normalize(super().operate(node_type, values))
+
+    def native(self, value:float) -> float:
+        """
+        this method converts a number of the backend to a Python number (an int or a Fraction), so it is rounded to a
+        float like the numbers of the tree evaluation
+
+        Args:
+            value (float): the number
+
+        Returns:
+            float: the Python number
+        """
+        if type(value) == self.integer:
+            return int(value)
+        if type(value) == self.rational:
+            return Fraction(int(value.numerator), int(value.denominator))
+        return value
+
+    def normalize(self, value:float) -> float:
+        """
+        this method normalizes a result: Python ints and fractions become numbers of the backend, an integral fraction
+        becomes an integer, and a rounded result (of another type) becomes a float
+
+        Args:
+            value (float): the result
+
+        Returns:
+            float: the normalized result
+        """
+        if type(value) == self.integer or type(value) == float:
+            return value
+        # The kernels that compute with Python numbers (like the digit sums, and the operators with a rounded
+        # operand) give ints and fractions, which are exact
+        if type(value) == int:
+            return self.integer(value)
+        if type(value) == Fraction and self.rational != Fraction:
+            value = self.rational(self.integer(value.numerator), self.integer(value.denominator))
+        if type(value) == self.rational:
+            return self.integer(value.numerator) if value.denominator == 1 else value
+        return float(value)
+
+    def is_exact(self, value:float) -> bool:
+        return type(value) == self.integer or type(value) == self.rational
+
+    def _factorial(self, value:float) -> float:
+        Factorial.validate_operands(value)
+        return factorial(int(value) if self.is_exact(value) else value)
+
+    def _sum_digits(self, value:float) -> float:
+        # A fraction may have infinitely many digits, so the digits of its float are summed
+        return sum_digits(int(value) if type(value) == self.integer else float(self.native(value)))
+
+    def _div(self, left:float, right:float) -> float:
+        Div.validate_operands(left, right)
+        if self.is_exact(left) and self.is_exact(right):
+            return self.rational(left) / right
+        return left / right
+
+    def _avg(self, left:float, right:float) -> float:
+        total = left + right
+        return self.rational(total) / 2 if self.is_exact(total) else total / 2
+
+    def _power(self, left:float, right:float) -> float:
+        Power.validate_operands(left, right)
+
+        # The powers with a fractional exponent (and the powers of rounded operands) are rounded
+        if not self.is_exact(left) or type(right) != self.integer:
+            return Power.operate(float(self.native(left)), float(self.native(right)))
+
+        # The size of the result is known before computing it (like the integer powers of the tree evaluation)
+        if max(abs(left.numerator).bit_length(), left.denominator.bit_length()) * abs(right) > MAX_POWER_BITS:
+            raise InvalidOperandException("Invalid operands for power expression. The operands are too large")
+
+        # A negative exponent gives the exact fraction (0 to a negative power raises ZeroDivisionError, like the
+        # tree evaluation)
+        if right < 0:
+            return self.rational(left) ** right
+        return left ** right
+
+    def _power_mod(self, base:float, exponent:float, modulus:float) -> float:
+        Power.validate_operands(base, exponent)
+        if type(base) == self.integer and type(exponent) == self.integer and type(modulus) == self.integer \
+                and exponent >= 0:
+            Mod.validate_operands(0, modulus)
+            return pow(base, exponent, modulus)
+        return Mod.operate(self.normalize(self._power(base, exponent)), modulus)
+
+    def _factorial_mod(self, value:float, modulus:float) -> float:
+        Factorial.validate_operands(value)
+        if type(modulus) == self.integer and modulus != 0:
+            return factorial_mod(int(value) if self.is_exact(value) else value, int(modulus))
+        return Mod.operate(self.normalize(self._factorial(value)), modulus)
+
+
+class GmpyBackend(ExactBackend):
+    """
+    This class represents the exact backend on GMP numbers (gmpy2's mpz and mpq): it computes the same results as the
+    exact backend, and the large factorials, powers and modular powers run in GMP
+    """
+    name = 'gmpy2'
+    integer = gmpy2.mpz if gmpy2 is not None else None
+    rational = gmpy2.mpq if gmpy2 is not None else None
+    overflow_errors = (OverflowError, gmpy2.OverflowResultError) if gmpy2 is not None else (OverflowError,)
+
+    def __init__(self) -> None:
+        if gmpy2 is None:
+            raise ImportError("The gmpy2 backend requires gmpy2")
+        super().__init__()
+
+    def _factorial(self, value:float) -> float:
+        Factorial.validate_operands(value)
+        if not self.is_exact(value):
+            return factorial(value)
+        if value > max_operand():
+            raise InvalidOperandException("Invalid operand for the factorial operator. The operand is too large")
+        return gmpy2.fac(self.integer(value))
+
+    def _power_mod(self, base:float, exponent:float, modulus:float) -> float:
+        Power.validate_operands(base, exponent)
+        if type(base) == self.integer and type(exponent) == self.integer and type(modulus) == self.integer \
+                and exponent >= 0:
+            Mod.validate_operands(0, modulus)
+            # The residue takes the sign of the modulus, like Python's modulo
+            return gmpy2.powmod(base, exponent, modulus) % modulus
+        return Mod.operate(self.normalize(self._power(base, exponent)), modulus)
+
+
+# The backends, by name
+BACKENDS = {backend.name: backend for backend in (NumericBackend, FloatBackend, ExactBackend, GmpyBackend)}
+
+
+def make_backend(name:str = 'native') -> NumericBackend:
+    """
+    This function builds a numeric backend by its name. The gmpy2 backend falls back to the exact backend (which
+    computes the same results, in Python) if gmpy2 is not installed
+    Args:
+        name (str, optional): the name of the backend ('native', 'float', 'exact' or 'gmpy2'). Defaults to 'native'.
+
+    Returns:
+        NumericBackend: the backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown numeric backend '{name}'")
+    if name == GmpyBackend.name and gmpy2 is None:
+        return ExactBackend()
+    return BACKENDS[name]()
+
+
+def _finite(result:float, operands) -> float:
+    # A result that is not finite although its operands are is an overflow of the float arithmetic
+    if type(result) == float and not math.isfinite(result) and all(math.isfinite(operand) for operand in operands):
+        raise OverflowError(FLOAT_OVERFLOW)
+    return result
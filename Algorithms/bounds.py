@@ -0,0 +1,469 @@
+import math
+
+from Algorithms.cost import estimate_nodes
+from Algorithms.factorial import MAX_FLOAT_OPERAND, max_operand
+from Algorithms.hash_consing import evaluate_dag
+from tokens import *
+
+# The bounds are kept on the log-magnitude scale g(v) = sign(v) * log2(1 + |v|), which is monotonic (so the bounds of a
+# value are the bounds of its g) and stays small for huge integers
+
+# The log-magnitude below which an integer surely converts to a float
+FLOAT_MAGNITUDE = 1000
+
+# The relative widening of every computed bound, which covers the rounding of the float computations
+EPSILON = 1e-12
+
+LN2 = math.log(2)
+
+# The smallest cost (see Algorithms.cost) of a subtree that is approximated (a cheaper one is evaluated exactly)
+APPROXIMATE_MIN_COST = 1e4
+
+UNBOUNDED = (-math.inf, math.inf)
+
+# The operators whose result changes only a little when their operands change a little (an approximate operand of
+# another operator, like a '#', a '%', a '!' or a comparison of '$' and '&', may change its result completely)
+CONTINUOUS_OPERATORS = (Negative, Tilda, Plus, Sum, Minus, Mult, Product, Div, Avg)
+
+
+class Bounds:
+    """
+    This class represents the static bounds of an expression node: a range of the log-magnitude of its result,
+    whether its result is surely an integer, whether its subtree surely does not raise (so it can be skipped without
+    changing the raised exceptions), and whether the bounds can be trusted (a float subtree that may reach inf may
+    also produce NaN, which no range holds)
+    """
+    __slots__ = ('low', 'high', 'integral', 'safe', 'trusted')
+
+    def __init__(self, low:float, high:float, integral:bool, safe:bool, trusted:bool) -> None:
+        self.low = low  # A lower bound of the result's log-magnitude
+        self.high = high  # An upper bound of the result's log-magnitude
+        self.integral = integral  # Whether the result is an integer (and not a float)
+        self.safe = safe  # Whether the evaluation of the subtree surely does not raise
+        self.trusted = trusted  # Whether the result is surely within the bounds
+
+    def __repr__(self) -> str:
+        return f"Bounds(low={self.low}, high={self.high}, integral={self.integral}, safe={self.safe}, " \
+               f"trusted={self.trusted})"
+
+
+def magnitude(value:float) -> float:
+    """
+    This function returns the log-magnitude of a number, sign(v) * log2(1 + |v|)
+    Args:
+        value (float): the number (an integer of any size, or a float)
+
+    Returns:
+        float: its log-magnitude
+    """
+    g = math.log2(1 + abs(value))
+    return -g if value < 0 else g
+
+
+def magnitude_value(g:float) -> float:
+    """
+    This function returns the number of a log-magnitude (the inverse of magnitude), as a float
+    Args:
+        g (float): the log-magnitude
+
+    Returns:
+        float: the number (inf if it is larger than the largest float)
+    """
+    if abs(g) >= 1024:
+        return math.copysign(math.inf, g)
+    return math.copysign(math.expm1(abs(g) * LN2), g)
+
+
+def bound_nodes(expression:Token, bindings:dict = None) -> dict[int, Bounds]:
+    """
+    This function bounds every node of an expression without evaluating it. The tree is walked in post-order with an
+    explicit stack
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+    Returns:
+        dict[int, Bounds]: the bounds of the nodes, by the ids of the nodes
+    """
+    bounds = {}
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if type(node) in (Number, Variable):
+            if type(node) == Variable and (bindings is None or node.value not in bindings):
+                raise UnboundVariableException(node.value)
+            value = node.value if type(node) == Number else bindings[node.value]
+            g = magnitude(value)
+            bounds[id(node)] = Bounds(*_widen(g, g), type(value) == int, True, True)
+
+        elif expanded:
+            bounds[id(node)] = _bound_operator(node, [bounds[id(child)] for child in node.children])
+
+        else:
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return bounds
+
+
+def evaluate_pruned(expression:Token, bindings:dict = None, strict:bool = True, tolerance:float = None) -> tuple:
+    """
+    This function evaluates an expression, and skips the operands that cannot change the result: the dominated operand
+    of a '$' or a '&' (whose bounds are below, or above, the bounds of the other operand) is not evaluated.
+    If a tolerance is given, an expensive subtree whose bounds are within that relative error is not evaluated, and the
+    middle of its bounds is its (approximate, float) result. Only the subtrees whose ancestors are all continuous
+    arithmetic (see CONTINUOUS_OPERATORS) are approximated, so an approximation never reaches a digit sum, a residue,
+    a factorial, a power or a comparison.
+    In strict mode only the subtrees that surely do not raise are skipped, so the same exception is raised first like
+    in the tree evaluation. Otherwise, the exceptions of the skipped subtrees are not raised
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+        strict (bool, optional): whether only safe subtrees are skipped. Defaults to True.
+        tolerance (float, optional): the largest relative error of an approximate result. Defaults to None (exact).
+
+    Returns:
+        tuple[float, int]: the result of the expression, and the number of skipped subtrees
+    """
+    try:
+        bounds = bound_nodes(expression, bindings)
+    except UnboundVariableException:
+        # The evaluation raises the exception in its order
+        return evaluate_dag(expression, bindings), 0
+
+    # The costs decide which subtrees are worth approximating
+    estimates = estimate_nodes(expression, bindings) if tolerance is not None else None
+
+    values = []  # The results of the evaluated subtrees, in post-order
+    pruned = 0
+    stack = [(expression, False, True)]  # The nodes, whether they are expanded, and whether they may be approximated
+
+    while stack:
+        node, expanded, approximable = stack.pop()
+
+        if type(node) == Number:
+            values.append(node.value)
+
+        elif type(node) == Variable:
+            values.append(bindings[node.value])
+
+        # A node whose dominated operand was skipped passes the value of the other operand
+        elif expanded == 'pick':
+            pass
+
+        elif expanded:
+            arity = len(node.children)
+            operands = values[len(values) - arity:]
+            del values[len(values) - arity:]
+            values.append(node.operate(*operands))
+
+        else:
+            node_bounds = bounds[id(node)]
+
+            # Approximate a subtree whose bounds are narrow enough
+            if tolerance is not None and approximable and estimates[id(node)].cost >= APPROXIMATE_MIN_COST \
+                    and node_bounds.trusted and (node_bounds.safe or not strict):
+                approximation = _approximate(node_bounds, tolerance)
+                if approximation is not None:
+                    values.append(approximation)
+                    pruned += 1
+                    continue
+
+            # The tilda operand is validated before it is evaluated
+            if type(node) == Tilda:
+                node.validate_operands()
+
+            if type(node) in (Max, Min):
+                kept = _dominant_operand(node, bounds, strict)
+                if kept is not None:
+                    stack.append((node, 'pick', False))
+                    stack.append((kept, False, False))
+                    pruned += 1
+                    continue
+
+            stack.append((node, True, False))
+            approximable = approximable and type(node) in CONTINUOUS_OPERATORS
+            for child in reversed(node.children):
+                stack.append((child, False, approximable))
+
+    return values[0], pruned
+
+
+def _dominant_operand(node:Token, bounds:dict, strict:bool) -> Token:
+    # The operand of a '$' or a '&' that is surely its result, if the other operand can be skipped
+    left, right = bounds[id(node.left)], bounds[id(node.right)]
+    if not (left.trusted and right.trusted):
+        return None
+
+    # Max returns the left operand only if it is larger, and Min only if it is smaller (else the right one)
+    if type(node) == Max:
+        left_wins, right_wins = left.low > right.high, right.low >= left.high
+    else:
+        left_wins, right_wins = left.high < right.low, right.high <= left.low
+
+    if left_wins and (right.safe or not strict):
+        return node.left
+    if right_wins and (left.safe or not strict):
+        return node.right
+    return None
+
+
+def _approximate(node_bounds:Bounds, tolerance:float) -> float:
+    # The middle of the bounds, if every value within them is within the relative error of it (and it is a float)
+    low, high = node_bounds.low, node_bounds.high
+    if not (0 < low or high < 0) or max(abs(low), abs(high)) >= 1023:
+        return None
+
+    smallest, largest = sorted((abs(magnitude_value(low)), abs(magnitude_value(high))))
+    if largest - smallest > tolerance * smallest:
+        return None
+    middle = (smallest + largest) / 2
+    return middle if low > 0 else -middle
+
+
+def _widen(low:float, high:float) -> tuple[float, float]:
+    # Widen the bounds outwards, so the rounding of the float computations is covered
+    return low - EPSILON * (1 + abs(low)), high + EPSILON * (1 + abs(high))
+
+
+def _bound_operator(node:Token, operands:list) -> Bounds:
+    operator = type(node)
+    integral = all(operand.integral for operand in operands)
+    trusted = all(operand.trusted for operand in operands)
+
+    # The safety of an operator is decided from the bounds of its operands, so they must hold
+    safe = trusted and all(operand.safe for operand in operands)
+
+    if operator in (Negative, Tilda):
+        a, = operands
+        low, high = -a.high, -a.low
+        if operator == Tilda:
+            try:
+                node.validate_operands()
+            except InvalidOperandException:
+                safe = False
+
+    elif operator in (Plus, Sum):
+        low, high = _add_bounds(operands)
+
+    elif operator == Minus:
+        a, b = operands
+        low, high = _add_bounds([a, Bounds(-b.high, -b.low, b.integral, b.safe, b.trusted)])
+
+    elif operator in (Mult, Product):
+        low, high = operands[0].low, operands[0].high
+        for operand in operands[1:]:
+            low, high = _multiply(low, high, operand.low, operand.high)
+
+    elif operator == Div:
+        a, b = operands
+        integral = False
+        safe = safe and _excludes_zero(b)
+        low, high = _divide(a.low, a.high, b.low, b.high) if _excludes_zero(b) else UNBOUNDED
+
+    elif operator == Avg:
+        integral = False
+        low, high = _add_bounds(operands)
+        low, high = _halve(low), _halve(high)
+
+    elif operator in (Max, Min):
+        a, b = operands
+        choose = max if operator == Max else min
+        low, high = choose(a.low, b.low), choose(a.high, b.high)
+
+    elif operator in (Mod, PowerMod, FactorialMod):
+        modulus = operands[-1]
+        safe = safe and _excludes_zero(modulus)
+        if operator == PowerMod:
+            integral = integral and operands[1].low > -1
+            safe = safe and _power_is_safe(*operands[:2])
+        if operator == FactorialMod:
+            safe = safe and _factorial_is_safe(node.children[0], operands[0])
+        low, high = min(modulus.low, 0.0), max(modulus.high, 0.0)
+
+    elif operator == Power:
+        # An integer to a negative power is a float
+        a, b = operands
+        integral = integral and b.low > -1
+        safe = safe and _power_is_safe(a, b)
+        low, high = _power(a, b)
+
+    elif operator == Factorial:
+        a, = operands
+        safe = safe and _factorial_is_safe(node.operand, a)
+        low, high = _factorial(a)
+
+    else:
+        # SumDigits: at most 9 per decimal digit (and a float has at most 17 digits), with the sign of the operand
+        a, = operands
+        integral = True
+        digits = max(17.0, math.log10(2) * max(abs(a.low), abs(a.high)) + 1)
+        largest = magnitude(9 * digits)
+        low = 1.0 if a.low > 0 else -largest
+        high = 0.0 if a.high <= 0 else largest
+
+    # An integer that is too large for a float raises when it is converted (mixed with a float, or to a negative power)
+    converted = not all(operand.integral for operand in operands) or operator in (Power, PowerMod)
+    if not integral and converted and operator not in (Max, Min) and \
+            any(operand.integral and not _fits_float(operand) for operand in operands):
+        safe = False
+
+    # The true division of integers raises if its result is too large for a float
+    if operator in (Div, Avg) and not (-FLOAT_MAGNITUDE < low and high < FLOAT_MAGNITUDE):
+        safe = False
+
+    # A float that may not be finite may be NaN
+    if not integral and not (-1023 < low and high < 1023):
+        trusted = False
+
+    return Bounds(*_widen(low, high), integral, safe, trusted)
+
+
+def _excludes_zero(b:Bounds) -> bool:
+    return b.low > 0 or b.high < 0
+
+
+def _fits_float(b:Bounds) -> bool:
+    return -FLOAT_MAGNITUDE < b.low and b.high < FLOAT_MAGNITUDE
+
+
+def _power_is_safe(a:Bounds, b:Bounds) -> bool:
+    # 0^0 and 0 to a negative power raise
+    if not _excludes_zero(a) and b.low <= 0:
+        return False
+
+    # A negative base with a fractional exponent has a complex result
+    if a.low < 0 and not b.integral:
+        return False
+
+    # An integer power that is too large raises (the power operator checks the bound |a|.bit_length() * b of its size
+    # in bits, which is at most (log2(|a|) + 1) * b)
+    if a.integral and b.integral and b.low > -1:
+        return magnitude_value(b.high) * (_log(max(1.0, -a.low, a.high)) + 1) <= MAX_POWER_BITS
+
+    # A float power that overflows raises
+    low, high = _power(a, b)
+    return -FLOAT_MAGNITUDE < low and high < FLOAT_MAGNITUDE
+
+
+def _factorial_is_safe(operand:Token, a:Bounds) -> bool:
+    # The operand is a natural number (a literal is checked directly, and an integer by its bounds)
+    if type(operand) == Number:
+        value = operand.value
+        return value >= 0 and value % 1 == 0 and value <= max_operand()
+    return a.integral and a.low > -1 and a.high <= math.log2(1 + max_operand())
+
+
+def _log(g:float) -> float:
+    # log2 of the absolute value of a number, from its log-magnitude (-inf for 0)
+    g = abs(g)
+    value = -math.expm1(-g * LN2)
+    return g + math.log2(value) if value else -math.inf
+
+
+def _from_log(logarithm:float, negative:bool) -> float:
+    # The log-magnitude of a number, from log2 of its absolute value and its sign
+    if logarithm > 0:
+        g = logarithm + math.log1p(2.0 ** -logarithm) / LN2
+    else:
+        g = math.log1p(2.0 ** logarithm) / LN2
+    return -g if negative else g
+
+
+def _add_points(p:float, q:float) -> float:
+    # The log-magnitude of the sum of two numbers, from their log-magnitudes
+    if p == 0 or q == 0:
+        return p + q
+
+    big, small = (p, q) if abs(p) >= abs(q) else (q, p)
+    same_sign = (big > 0) == (small > 0)
+    if math.isinf(big):
+        return big if same_sign or not math.isinf(small) else math.nan
+
+    # log2(x + y) = log2(x) + log2(1 + y / x), where |y / x| <= 1
+    ratio = 2.0 ** (_log(small) - _log(big))
+    if not same_sign and ratio == 1:
+        return 0.0
+    return _from_log(_log(big) + math.log1p(ratio if same_sign else -ratio) / LN2, big < 0)
+
+
+def _add_bounds(operands:list) -> tuple[float, float]:
+    # The sum is increasing in every operand, so its bounds are the sums of the bounds
+    low, high = operands[0].low, operands[0].high
+    for operand in operands[1:]:
+        low, high = _add_points(low, operand.low), _add_points(high, operand.high)
+    return (low, high) if not (math.isnan(low) or math.isnan(high)) else UNBOUNDED
+
+
+def _multiply_points(p:float, q:float) -> float:
+    if p == 0 or q == 0:
+        return 0.0
+    return _from_log(_log(p) + _log(q), (p < 0) != (q < 0))
+
+
+def _divide_points(p:float, q:float) -> float:
+    if p == 0:
+        return 0.0
+    return _from_log(_log(p) - _log(q), (p < 0) != (q < 0))
+
+
+def _corners(point, a_low:float, a_high:float, b_low:float, b_high:float) -> tuple[float, float]:
+    # The extremes of a product (or a quotient by numbers of the same sign) of two ranges are at their ends
+    results = [point(p, q) for p in (a_low, a_high) for q in (b_low, b_high)]
+    if any(math.isnan(result) for result in results):
+        return UNBOUNDED
+    return min(results), max(results)
+
+
+def _multiply(a_low:float, a_high:float, b_low:float, b_high:float) -> tuple[float, float]:
+    return _corners(_multiply_points, a_low, a_high, b_low, b_high)
+
+
+def _divide(a_low:float, a_high:float, b_low:float, b_high:float) -> tuple[float, float]:
+    return _corners(_divide_points, a_low, a_high, b_low, b_high)
+
+
+def _halve(g:float) -> float:
+    return _from_log(_log(g) - 1, g < 0) if g else 0.0
+
+
+def _power(a:Bounds, b:Bounds) -> tuple[float, float]:
+    # For a base of at least 1, the power is monotonic in both operands, so its extremes are at the ends
+    if a.low >= 1:
+        return _corners(_power_point, a.low, a.high, b.low, b.high)
+
+    # A base between 0 and 1 with an exponent that is not negative has a power between 0 and 1
+    if a.low >= 0 and a.high <= 1 and b.low >= 0:
+        return 0.0, 1.0
+
+    # A base of at most -1 with an integer exponent has the magnitude of its opposite's power, with either sign
+    if a.high <= -1 and b.integral:
+        largest = _corners(_power_point, -a.high, -a.low, b.low, b.high)[1]
+        return -largest, largest
+
+    return UNBOUNDED
+
+
+def _power_point(base:float, exponent:float) -> float:
+    # log2(x^n) = n * log2(x), for x >= 1
+    logarithm = _log(base)
+    return _from_log(magnitude_value(exponent) * logarithm if logarithm else 0.0, False)
+
+
+def _factorial(a:Bounds) -> tuple[float, float]:
+    # n! is increasing for natural numbers, and log2(n!) = lgamma(n + 1) / ln(2). The result is at least 1
+    n_low, n_high = magnitude_value(max(a.low, 0.0)), magnitude_value(max(a.high, 0.0))
+    low = _from_log(_log_factorial(n_low), False)
+
+    # A float factorial past 170! is inf
+    if math.isinf(n_high) or (not a.integral and n_high > MAX_FLOAT_OPERAND):
+        return low, math.inf
+    return low, _from_log(_log_factorial(n_high), False)
+
+
+def _log_factorial(n:float) -> float:
+    # log2(n!), which is not negative (lgamma overflows for the largest floats)
+    return max(0.0, math.lgamma(n + 1) / LN2) if n < 1e300 else math.inf
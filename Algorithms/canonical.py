@@ -0,0 +1,71 @@
+from hashlib import blake2b
+
+from Config.constants import COMMUTATIVE_OPERATORS
+from tokens import *
+
+DIGEST_SIZE = 16  # The size of a digest in bytes
+
+
+def number_digest(value:float) -> bytes:
+    """
+    This function returns the digest of a number (integers and floats with equal values have different digests)
+    Args:
+        value (float): the number
+
+    Returns:
+        bytes: the digest of the number
+    """
+    if type(value) == float:
+        encoded = b'f' + value.hex().encode()
+    else:
+        # Hexadecimal digits are used, since decimal strings of huge integers are slow (and limited)
+        encoded = b'i' + format(value, 'x').encode()
+
+    return blake2b(encoded, digest_size=DIGEST_SIZE).digest()
+
+
+def expression_digests(expression:Token) -> tuple[bytes, bytes]:
+    """
+    This function computes two structural digests of an expression tree (a Merkle hash of its nodes).
+    The ordered digest identifies the exact tree. The canonical digest sorts the operands of commutative operators,
+    so expressions like 2*3+1 and 1+3*2 share it. The tree is walked with an explicit stack
+    Args:
+        expression (Token): the root node of the expression
+
+    Returns:
+        tuple[bytes, bytes]: the ordered digest and the canonical digest of the expression
+    """
+    digests = []  # The (ordered, canonical) digests of the visited subtrees, in post-order
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if type(node) == Number:
+            digest = number_digest(node.value)
+            digests.append((digest, digest))
+
+        elif type(node) == Variable:
+            digest = blake2b(b'v' + node.value.encode(), digest_size=DIGEST_SIZE).digest()
+            digests.append((digest, digest))
+
+        elif expanded:
+            arity = len(node.children)
+            children = digests[len(digests) - arity:]
+            del digests[len(digests) - arity:]
+
+            ordered = [child[0] for child in children]
+            canonical = [child[1] for child in children]
+            if type(node) in COMMUTATIVE_OPERATORS:
+                canonical.sort()
+
+            name = type(node).__name__.encode()
+            digests.append((blake2b(name + b':' + b''.join(ordered), digest_size=DIGEST_SIZE).digest(),
+                            blake2b(name + b':' + b''.join(canonical), digest_size=DIGEST_SIZE).digest()))
+
+        else:
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return digests[0]
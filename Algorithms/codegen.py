@@ -0,0 +1,234 @@
+import math
+import threading
+from collections import OrderedDict
+
+from Algorithms.canonical import expression_digests
+from Algorithms.digits import sum_digits
+from Algorithms.factorial import factorial
+from tokens import *
+
+# The largest integer literal that is written into the source (larger literals are passed as constants)
+MAX_INLINE_INTEGER = 2 ** 63
+
+# The names that the generated functions use
+NAMESPACE = {'Div': Div, 'Mod': Mod, 'Power': Power, 'Factorial': Factorial, 'MAX_POWER_BITS': MAX_POWER_BITS,
+             'PowerMod': PowerMod, 'FactorialMod': FactorialMod, 'InvalidOperandException': InvalidOperandException,
+             '_factorial': factorial, '_sum_digits': sum_digits}
+
+# Unknown values of the operands (the values of literals are known when the source is generated)
+UNKNOWN = object()
+
+
+def generate_source(expression:Token) -> tuple[str, tuple, list]:
+    """
+    This function generates the source of a Python function that evaluates an expression in straight-line code: one
+    statement per node, in the same order as the tree evaluation, with the operators' checks inlined. A check is left
+    out when the literal operands make it pass. The function takes the values of the variables as its arguments
+    (v0, v1, ...) and the large literals as constants (c0, c1, ...). The tree is walked with an explicit stack
+    Args:
+        expression (Token): the root node of the expression
+
+    Returns:
+        tuple[str, tuple, list]: the source of the function, the names of its arguments' variables (in the order of
+            their first appearance), and the values of its constants
+    """
+    lines = []
+    variables = {}  # The arguments' indices of the variables, by name
+    constants = []
+    results = []  # The (source, known value) of the visited subtrees, in post-order
+    temporaries = 0  # The number of operator nodes (every one of them is computed into a temporary variable)
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if type(node) == Number:
+            value = node.value
+            # The literal is parenthesized, since the rewrite pass folds negative literals (and -7 ** x is -(7 ** x))
+            if (type(value) == int and value < MAX_INLINE_INTEGER) or (type(value) == float and math.isfinite(value)):
+                results.append((f"({value!r})", value))
+            else:
+                results.append((f"c{len(constants)}", value))
+                constants.append(value)
+
+        elif type(node) == Variable:
+            index = variables.setdefault(node.value, len(variables))
+            results.append((f"v{index}", UNKNOWN))
+
+        elif expanded:
+            arity = len(node.children)
+            operands = results[len(results) - arity:]
+            del results[len(results) - arity:]
+
+            target = f"t{temporaries}"
+            temporaries += 1
+            lines += _node_lines(type(node), target, operands)
+            results.append((target, UNKNOWN))
+
+        else:
+            # The tilda operand is validated before it is evaluated, so an invalid tilda raises in place of its subtree
+            if type(node) == Tilda:
+                try:
+                    node.validate_operands()
+                except InvalidOperandException as ioe:
+                    lines.append(f"raise InvalidOperandException({str(ioe)!r})")
+                    results.append(("None", UNKNOWN))
+                    continue
+
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    arguments = ', '.join(f"v{index}" for index in range(len(variables)))
+    lines.append(f"return {results[0][0]}")
+    source = f"def expression({arguments}):\n" + ''.join(f"    {line}\n" for line in lines)
+    return source, tuple(variables), constants
+
+
+def _node_lines(node_type:type, target:str, operands:list) -> list[str]:
+    # The statements that compute a node into its target from its operands' sources
+    if node_type in (Negative, Tilda):
+        return [f"{target} = -1 * {operands[0][0]}"]
+
+    if node_type == Factorial:
+        (value, known), = operands
+        lines = []
+        if known is UNKNOWN or not (known >= 0 and known % 1 == 0):
+            lines.append(f"if not ({value} >= 0 and {value} % 1 == 0): Factorial.validate_operands({value})")
+        return lines + [f"{target} = _factorial({value})"]
+
+    if node_type == SumDigits:
+        return [f"{target} = _sum_digits({operands[0][0]})"]
+
+    # The n-ary chains are accumulated from left to right, one statement per operand (a long chain written as one
+    # Python expression exhausts the stack of the compiler)
+    if node_type in (Sum, Product):
+        operator = ' += ' if node_type == Sum else ' *= '
+        return [f"{target} = {operands[0][0]}"] + [f"{target}{operator}{source}" for source, _ in operands[1:]]
+
+    if node_type in (PowerMod, FactorialMod):
+        return [f"{target} = {node_type.__name__}.operate({', '.join(source for source, _ in operands)})"]
+
+    (left, left_known), (right, right_known) = operands
+
+    if node_type in (Div, Mod):
+        lines = []
+        if right_known is UNKNOWN or right_known == 0:
+            lines.append(f"if {right} == 0: {node_type.__name__}.validate_operands({left}, {right})")
+        operator = '/' if node_type == Div else '%'
+        return lines + [f"{target} = {left} {operator} {right}"]
+
+    if node_type == Power:
+        # The checks of two literals are done now (a failing check is generated as a call that always raises). Only a
+        # negative base with a fractional exponent keeps the complex result check
+        if left_known is not UNKNOWN and right_known is not UNKNOWN:
+            try:
+                Power.validate_operands(left_known, right_known)
+                lines = []
+            except InvalidOperandException:
+                lines = [f"Power.validate_operands({left}, {right})"]
+            lines.append(f"{target} = {left} ** {right}")
+            if left_known < 0 and right_known % 1 != 0:
+                lines.append(f"if type({target}) is complex: Power.operate({left}, {right})")
+            return lines
+
+        lines = []
+        if (left_known is UNKNOWN or left_known == 0) and (right_known is UNKNOWN or right_known == 0):
+            lines.append(f"if {left} == 0 and {right} == 0: Power.validate_operands({left}, {right})")
+
+        # The size check only applies to integer operands
+        if type(left_known) != float and type(right_known) != float and (right_known is UNKNOWN or right_known > 0) \
+                and (left_known is UNKNOWN or abs(left_known) > 1):
+            lines.append(f"if type({left}) is int and type({right}) is int and {right} > 0 and abs({left}) > 1 "
+                         f"and abs({left}).bit_length() * {right} > MAX_POWER_BITS: "
+                         f"Power.validate_operands({left}, {right})")
+
+        lines.append(f"{target} = {left} ** {right}")
+
+        # Only a negative base with a fractional exponent has a complex result
+        if (left_known is UNKNOWN or left_known < 0) and (right_known is UNKNOWN or right_known % 1 != 0):
+            lines.append(f"if type({target}) is complex: Power.operate({left}, {right})")
+        return lines
+
+    if node_type == Max:
+        return [f"{target} = {left} if {left} > {right} else {right}"]
+    if node_type == Min:
+        return [f"{target} = {left} if {left} < {right} else {right}"]
+    if node_type == Avg:
+        return [f"{target} = ({left} + {right}) / 2"]
+
+    operator = {Plus: '+', Minus: '-', Mult: '*'}[node_type]
+    return [f"{target} = {left} {operator} {right}"]
+
+
+def build_function(expression:Token) -> tuple:
+    """
+    This function generates the source of an expression's function and compiles it into a function object
+    Args:
+        expression (Token): the root node of the expression
+
+    Returns:
+        tuple[function, tuple]: the function, and the names of the variables of its arguments
+    """
+    source, variables, constants = generate_source(expression)
+    namespace = dict(NAMESPACE)
+    namespace.update((f"c{index}", constant) for index, constant in enumerate(constants))
+    exec(compile(source, "<expression>", "exec"), namespace)
+    return namespace['expression'], variables
+
+
+class FunctionCache:
+    """
+    This class represents a bounded LRU cache of generated functions, keyed by the ordered digests of their
+    expressions (so equal trees that were parsed separately share their function)
+    """
+
+    def __init__(self, max_size:int = 1024) -> None:
+        self.max_size = max_size  # The maximum number of cached functions
+        self.entries = OrderedDict()  # The (function, variables) entries, from the least to the most recently used
+        self.lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def function(self, expression:Token) -> tuple:
+        """
+        this method returns the generated function of an expression, and generates it on a cache miss
+
+        Args:
+            expression (Token): the root node of the expression
+
+        Returns:
+            tuple[function, tuple]: the function, and the names of the variables of its arguments
+        """
+        key = expression_digests(expression)[0]
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = build_function(expression)
+
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return entry
+
+    def clear(self) -> None:
+        # Remove all the cached functions
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# The generated functions cache of the process
+functions = FunctionCache()
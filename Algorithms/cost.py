@@ -0,0 +1,200 @@
+import math
+
+from tokens import *
+
+# The size of a machine word in bits (the cost unit is a multiplication of two words)
+WORD_BITS = 64
+
+# The largest float, in bits (a float result is bounded no matter how large its operands are)
+FLOAT_BITS = 1024
+
+# Below this many words, CPython multiplies integers with the schoolbook algorithm (and with Karatsuba above it)
+KARATSUBA_WORDS = 35
+
+
+class Estimate:
+    """
+    This class represents the static estimate of an expression node: an upper bound of the size of its result in bits,
+    whether its result is a float, and the CPU cost of evaluating its whole subtree (in word multiplications)
+    """
+    __slots__ = ('bits', 'is_float', 'cost')
+
+    def __init__(self, bits:float, is_float:bool, cost:float) -> None:
+        self.bits = bits  # An upper bound of log2 of the result's absolute value (inf if it is unbounded)
+        self.is_float = is_float  # Whether the result is a float
+        self.cost = cost  # The estimated cost of the subtree
+
+    def __repr__(self) -> str:
+        return f"Estimate(bits={self.bits}, is_float={self.is_float}, cost={self.cost})"
+
+
+def estimate_nodes(expression:Token, bindings:dict = None) -> dict[int, Estimate]:
+    """
+    This function estimates every node of an expression from the bounds of its operands, without evaluating it.
+    The tree is walked in post-order with an explicit stack
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+    Returns:
+        dict[int, Estimate]: the estimates of the nodes, by the ids of the nodes
+    """
+    estimates = {}
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if type(node) == Number:
+            estimates[id(node)] = _estimate_number(node.value)
+
+        # A variable is estimated like its value (without a value, nothing can be estimated)
+        elif type(node) == Variable:
+            if bindings is None or node.value not in bindings:
+                raise UnboundVariableException(node.value)
+            estimates[id(node)] = _estimate_number(bindings[node.value])
+
+        elif expanded:
+            operands = [estimates[id(child)] for child in node.children]
+            estimates[id(node)] = _estimate_operator(type(node), *operands)
+
+        else:
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return estimates
+
+
+def estimate(expression:Token, bindings:dict = None) -> Estimate:
+    """
+    This function estimates the result size and the cost of a whole expression
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+    Returns:
+        Estimate: the estimate of the root node
+    """
+    return estimate_nodes(expression, bindings)[id(expression)]
+
+
+def _estimate_number(value:float) -> Estimate:
+    # The bound of a literal is exact
+    return Estimate(math.log2(abs(value)) if abs(value) > 1 else 0, type(value) == float, 0)
+
+
+def _estimate_operator(operator:type, *operands:Estimate) -> Estimate:
+    # The cost of the operands' subtrees
+    cost = sum(operand.cost for operand in operands)
+    is_float = any(operand.is_float for operand in operands)
+
+    if operator in (Sum, Product, PowerMod, FactorialMod):
+        bits, is_float, own_cost = _estimate_fused(operator, operands, is_float)
+    elif len(operands) == 1:
+        bits, is_float, own_cost = _estimate_unary(operator, operands[0])
+    else:
+        bits, is_float, own_cost = _estimate_binary(operator, operands[0], operands[1], is_float)
+
+    # A float result is bounded by the largest float (a larger one raises an OverflowError or becomes inf)
+    if is_float:
+        bits = min(bits, FLOAT_BITS)
+
+    return Estimate(bits, is_float, cost + own_cost)
+
+
+def _estimate_unary(operator:type, a:Estimate) -> tuple:
+    if operator == Factorial:
+        # A float factorial is a chain of at most 170 float multiplications
+        if a.is_float:
+            return FLOAT_BITS, True, 170
+
+        # log2(n!) = lgamma(n + 1) / ln(2), and the product tree multiplies numbers of growing sizes log2(n) times
+        n = _power_of_two(a.bits)
+        bits = math.lgamma(n + 1) / math.log(2) if n < 1e300 else math.inf
+        return bits, False, _multiplication_cost(bits / 2, bits / 2) * max(1, math.log2(n))
+
+    if operator == SumDigits:
+        # The sum is at most 9 per decimal digit, and the conversion to decimal is a product tree
+        digits = a.bits * math.log10(2) + 1
+        bits = math.log2(9 * digits)
+        if a.is_float:
+            return bits, False, 1
+        return bits, False, _multiplication_cost(a.bits / 2, a.bits / 2) * max(1, math.log2(_words(a.bits)))
+
+    # Negative and Tilda
+    return a.bits, a.is_float, _words(a.bits)
+
+
+def _estimate_binary(operator:type, a:Estimate, b:Estimate, is_float:bool) -> tuple:
+    if is_float and operator != Power:
+        return max(a.bits, b.bits) + 1, True, 1
+
+    if operator in (Plus, Minus, Max, Min):
+        return max(a.bits, b.bits) + 1, False, _words(max(a.bits, b.bits))
+
+    if operator == Mult:
+        return a.bits + b.bits, False, _multiplication_cost(a.bits, b.bits)
+
+    if operator == Mod:
+        return min(a.bits, b.bits), False, _words(a.bits) * _words(b.bits)
+
+    # The true division of integers converts them to floats
+    if operator in (Div, Avg):
+        return a.bits - 1 if operator == Avg else a.bits, True, _words(a.bits) * _words(b.bits)
+
+    # Power: |a^b| <= 2^(bits(a) * b), with b <= 2^bits(b)
+    exponent = _power_of_two(b.bits)
+    bits = a.bits * exponent if a.bits > 0 else 0
+    if is_float:
+        return bits, True, 1
+
+    # Square and multiply: the last squarings dominate the cost
+    return bits, False, 2 * _multiplication_cost(bits / 2, bits / 2) + math.log2(exponent + 1)
+
+
+def _estimate_fused(operator:type, operands:list, is_float:bool) -> tuple:
+    if operator in (Sum, Product):
+        # The operands are combined from left to right, like the chain of binary operators
+        binary = Plus if operator == Sum else Mult
+        result = operands[0]
+        own_cost = 0
+        for operand in operands[1:]:
+            bits, result_is_float, cost = _estimate_binary(binary, result, operand, result.is_float or operand.is_float)
+            result = Estimate(min(bits, FLOAT_BITS) if result_is_float else bits, result_is_float, 0)
+            own_cost += cost
+        return result.bits, result.is_float, own_cost
+
+    if operator == PowerMod:
+        a, b, m = operands
+        if is_float:
+            return _estimate_binary(Power, a, b, True)
+
+        # Square and multiply modulo m: two products of residues (and their reductions) per bit of the exponent
+        return min(a.bits * _power_of_two(b.bits), m.bits), False, 2 * max(1, b.bits) * _words(m.bits) ** 2
+
+    # FactorialMod: a float factorial is computed in full, and an integer one multiplies n residues
+    n, m = operands
+    if n.is_float:
+        return FLOAT_BITS if m.is_float else m.bits, True, 170
+    return m.bits, False, min(_power_of_two(n.bits), _power_of_two(m.bits)) * _words(m.bits)
+
+
+def _power_of_two(bits:float) -> float:
+    # The largest value of a bit-length (inf if it does not fit in a float)
+    try:
+        return 2.0 ** bits
+    except OverflowError:
+        return math.inf
+
+
+def _words(bits:float) -> float:
+    return max(1, bits / WORD_BITS)
+
+
+def _multiplication_cost(a_bits:float, b_bits:float) -> float:
+    # The cost of a multiplication of two integers of the given sizes (schoolbook or Karatsuba)
+    a, b = _words(a_bits), _words(b_bits)
+    if min(a, b) < KARATSUBA_WORDS:
+        return a * b
+    return _power_of_two(math.log2(max(a, b)) * math.log2(3))
@@ -0,0 +1,200 @@
+import decimal
+from typing import Iterator
+
+# Integers up to this many bits are converted with str() (it is quadratic, but fast for small integers)
+STR_BITS_LIMIT = 3000
+
+# The size (in bits) of the pieces that are converted to decimal directly
+PIECE_BITS = 128
+
+# The number of extra digits of the bounds of a large integer's leading digits (see int_to_scientific)
+GUARD_DIGITS = 20
+
+# The number of characters of the chunks of the decimal digits (see int_to_chunks)
+CHUNK_SIZE = 1 << 16
+
+
+def int_to_decimal(n:int) -> decimal.Decimal:
+    """
+    This function converts an integer to an exact Decimal in subquadratic time, without the int-to-str digits limit.
+    The integer is split in halves by bits (hi * 2^w + lo), and the halves are combined with the decimal module's
+    fast multiplication
+    Args:
+        n (int): the integer
+
+    Returns:
+        decimal.Decimal: the integer as a Decimal
+    """
+    powers = {}  # The powers of 2 as Decimals, by their exponents
+
+    def power_of_two(w:int) -> decimal.Decimal:
+        result = powers.get(w)
+        if result is None:
+            if w <= PIECE_BITS:
+                result = decimal.Decimal(2) ** w
+            elif w - 1 in powers:
+                result = powers[w - 1] * 2
+            else:
+                half = w >> 1
+                result = power_of_two(half) * power_of_two(w - half)
+            powers[w] = result
+        return result
+
+    # The recursion depth is the logarithm of the number of bits
+    def convert(n:int, w:int) -> decimal.Decimal:
+        if w <= PIECE_BITS:
+            return decimal.Decimal(n)
+        half = w >> 1
+        high = n >> half
+        low = n - (high << half)
+        return convert(low, half) + convert(high, w - half) * power_of_two(half)
+
+    with decimal.localcontext() as context:
+        # Exact arithmetic (an inexact result would be a bug, so it raises)
+        context.prec = decimal.MAX_PREC
+        context.Emax = decimal.MAX_EMAX
+        context.Emin = decimal.MIN_EMIN
+        context.traps[decimal.Inexact] = True
+
+        result = convert(abs(n), abs(n).bit_length())
+        return -result if n < 0 else result
+
+
+def int_to_string(n:int) -> str:
+    """
+    This function converts an integer to its decimal string, without the int-to-str digits limit
+    Args:
+        n (int): the integer
+
+    Returns:
+        str: the decimal digits of the integer (with a leading '-' if it is negative)
+    """
+    if n.bit_length() <= STR_BITS_LIMIT:
+        return str(n)
+    return str(int_to_decimal(n))
+
+
+def int_to_chunks(n:int, chunk_size:int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    This function converts an integer to its decimal string in subquadratic time, and yields the string in chunks
+    (so the device that writes them does not copy the whole string again)
+    Args:
+        n (int): the integer
+        chunk_size (int, optional): the number of characters of every chunk. Defaults to CHUNK_SIZE.
+
+    Returns:
+        Iterator[str]: the chunks of the decimal digits of the integer (with a leading '-' if it is negative)
+    """
+    digits = int_to_string(n)
+    for start in range(0, len(digits), chunk_size):
+        yield digits[start:start + chunk_size]
+
+
+def int_to_scientific(n:int, significant_digits:int) -> str:
+    """
+    This function formats an integer in scientific notation with its first significant digits (truncated, not
+    rounded). Only the leading bits of a large integer are converted: they bound its leading digits, and an integer
+    whose bounds have different leading digits (like a power of 10) is compared with the upper bound exactly
+    Args:
+        n (int): the integer
+        significant_digits (int): the number of significant digits
+
+    Returns:
+        str: the integer in scientific notation (like 9.33262154e+157)
+    """
+    magnitude = abs(n)
+
+    with decimal.localcontext() as context:
+        context.Emax = decimal.MAX_EMAX
+        context.Emin = decimal.MIN_EMIN
+        context.rounding = decimal.ROUND_DOWN
+
+        if magnitude.bit_length() <= STR_BITS_LIMIT:
+            context.prec = significant_digits
+            return _format_scientific(n < 0, +decimal.Decimal(magnitude), significant_digits)
+
+        # The leading bits bound the integer (top * 2^shift <= n < (top + 1) * 2^shift). A bit is less than a digit,
+        # and the margins cover the rounding of the bounds
+        precision = significant_digits + GUARD_DIGITS
+        shift = magnitude.bit_length() - 4 * precision
+        top = magnitude >> shift
+        context.prec = precision
+        scale = decimal.Decimal(2) ** shift
+        margin = decimal.Decimal(10) ** -(precision - GUARD_DIGITS // 2)
+        low = decimal.Decimal(top) * scale * (1 - margin)
+        high = decimal.Decimal(top + 1) * scale * (1 + margin)
+
+        # The bounds are so close that their leading digits are equal or adjacent
+        context.prec = significant_digits
+        leading, upper = +low, +high
+        if leading != upper:
+            _, digits, exponent = upper.as_tuple()
+            if magnitude >= int(''.join(map(str, digits))) * 10 ** exponent:
+                leading = upper
+
+        return _format_scientific(n < 0, leading, significant_digits)
+
+
+def fraction_to_scientific(numerator:int, denominator:int, significant_digits:int) -> str:
+    """
+    This function formats a fraction in scientific notation with its first significant digits (truncated, not rounded)
+    Args:
+        numerator (int): the numerator of the fraction
+        denominator (int): the denominator of the fraction (positive)
+        significant_digits (int): the number of significant digits
+
+    Returns:
+        str: the fraction in scientific notation
+    """
+    numerator_decimal = int_to_decimal(abs(numerator))
+    denominator_decimal = int_to_decimal(denominator)
+
+    with decimal.localcontext() as context:
+        context.Emax = decimal.MAX_EMAX
+        context.Emin = decimal.MIN_EMIN
+        context.rounding = decimal.ROUND_DOWN
+        context.prec = significant_digits
+        return _format_scientific(numerator < 0, numerator_decimal / denominator_decimal, significant_digits)
+
+
+def _format_scientific(negative:bool, leading:decimal.Decimal, significant_digits:int) -> str:
+    # The leading digits are already truncated, so the format only pads them with zeros (the format of a zero Decimal
+    # moves its exponent, so 0 is formatted like the float 0.0)
+    if not leading:
+        return f"{0.0:.{significant_digits - 1}e}".replace('e+00', 'e+0')
+    return ('-' if negative else '') + f"{leading:.{significant_digits - 1}e}"
+
+
+def int_to_bytes(n:int) -> bytes:
+    """
+    This function converts an integer to its big-endian two's complement bytes (in linear time)
+    Args:
+        n (int): the integer
+
+    Returns:
+        bytes: the shortest big-endian two's complement bytes of the integer
+    """
+    return n.to_bytes(((n if n >= 0 else ~n).bit_length() + 8) // 8, 'big', signed=True)
+
+
+def sum_digits(num:float) -> float:
+    """
+    This function sums the decimal digits of a number. The sum is negative if the number is not positive.
+    Integers of any size are converted in subquadratic time. Floats sum the digits of their shortest representation,
+    without the digits of the exponent (1e+20 sums to 1, 1.5e-07 to 6), and infinities have no digits
+    Args:
+        num (float): the number
+
+    Returns:
+        float: the sum of its digits
+    """
+    if type(num) == float:
+        # The mantissa of the shortest representation that round-trips to the float
+        digits = repr(num).partition('e')[0]
+    else:
+        digits = int_to_string(num)
+
+    # Count every digit in a single pass over the string (in C)
+    total = sum(digit * digits.count(str(digit)) for digit in range(1, 10))
+
+    return total if num > 0 else -total
@@ -0,0 +1,224 @@
+import math
+import threading
+from bisect import bisect_right, insort
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from Exceptions.exceptions import InvalidOperandException
+
+# The default largest operand of the factorial operator (100000! has about 456,000 digits, see operand_limit)
+MAX_OPERAND = 100000
+
+# The largest operand of the factorial operator in the current context
+_max_operand = ContextVar('max_operand', default=MAX_OPERAND)
+
+# The largest operand whose float factorial is finite (171! overflows a float)
+MAX_FLOAT_OPERAND = 170
+
+# The largest modulus (in bits) whose factorial residues are computed factor by factor
+MAX_RESIDUE_BITS = 1024
+
+# The smallest operand whose factorial is memoized (smaller factorials are cheaper to compute than to look up)
+MIN_MEMOIZED_OPERAND = 256
+
+
+class FactorialMemo:
+    """
+    This class represents a process-wide LRU table of computed factorials, bounded by the total size of their values.
+    A new factorial is computed from the largest memoized factorial below it when it is close enough
+    """
+
+    def __init__(self, max_bytes:int = 32 << 20) -> None:
+        self.max_bytes = max_bytes  # The maximum total size of the memoized values
+        self.entries = OrderedDict()  # The memoized factorials by their operands, from the least to the most recently used
+        self.operands = []  # The memoized operands, sorted
+        self.size = 0  # The total size of the memoized values in bytes
+        self.lock = threading.Lock()
+
+    def floor(self, n:int) -> tuple[int, int]:
+        """
+        this method returns the memoized factorial with the largest operand that is not larger than n
+
+        Args:
+            n (int): the operand
+
+        Returns:
+            tuple[int, int]: the operand and its factorial, or (0, 1) if there is no such factorial
+        """
+        with self.lock:
+            i = bisect_right(self.operands, n)
+            if i == 0:
+                return 0, 1
+            m = self.operands[i - 1]
+            self.entries.move_to_end(m)
+            return m, self.entries[m]
+
+    def store(self, n:int, value:int) -> None:
+        """
+        this method memoizes a factorial, and evicts the least recently used factorials if the table is too large
+
+        Args:
+            n (int): the operand
+            value (int): its factorial
+        """
+        size = _size(value)
+
+        # A value that takes a large part of the table would evict everything else
+        if size > self.max_bytes // 4:
+            return
+
+        with self.lock:
+            if n in self.entries:
+                return
+
+            self.entries[n] = value
+            insort(self.operands, n)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                old_n, old_value = self.entries.popitem(last=False)
+                self.operands.remove(old_n)
+                self.size -= _size(old_value)
+
+    def clear(self) -> None:
+        # Remove all the memoized factorials
+        with self.lock:
+            self.entries.clear()
+            self.operands.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# The memo table of the process
+memo = FactorialMemo()
+
+
+def max_operand() -> int:
+    """
+    This function returns the largest operand of the factorial operator in the current context
+    Returns:
+        int: the largest operand (MAX_OPERAND outside of an operand_limit block)
+    """
+    return _max_operand.get()
+
+
+@contextmanager
+def operand_limit(limit:int):
+    """
+    This context manager sets the largest operand of the factorial operator inside its block (like a calculator's
+    max_factorial_operand setting). The limit is local to the thread (and to the asyncio task)
+    Args:
+        limit (int): the largest operand (None keeps the current limit)
+    """
+    if limit is None:
+        yield
+        return
+
+    token = _max_operand.set(limit)
+    try:
+        yield
+    finally:
+        _max_operand.reset(token)
+
+
+def factorial(n:float) -> float:
+    """
+    This function computes the factorial of a natural number, without recursion.
+    Integers get an exact result, and floats get the float product of the old recursive engine (inf past 170!)
+    Args:
+        n (float): the operand (a natural number)
+
+    Returns:
+        float: the factorial of the operand
+    """
+    if n > _max_operand.get():
+        raise InvalidOperandException("Invalid operand for the factorial operator. The operand is too large")
+
+    # Multiply the floats in the same order as the recursive engine, so the result is rounded the same way
+    if type(n) == float:
+        if n > MAX_FLOAT_OPERAND:
+            return math.inf
+        result = 1
+        for k in range(1, int(n) + 1):
+            result = float(k) * result
+        return result
+
+    if n < MIN_MEMOIZED_OPERAND:
+        return math.factorial(n)
+
+    # Extend the closest memoized factorial if only a few factors are missing, else compute it from scratch
+    # (math.factorial splits the product into balanced halves, so its cost is subquadratic)
+    m, base = memo.floor(n)
+    if m == n:
+        return base
+    if n - m <= n // 4:
+        result = base * product_range(m + 1, n)
+    else:
+        result = math.factorial(n)
+
+    memo.store(n, result)
+    return result
+
+
+def factorial_mod(n:float, modulus:int) -> float:
+    """
+    This function computes the factorial of a natural number modulo a nonzero integer, like factorial(n) % modulus.
+    The residue is computed factor by factor, and is 0 right away once the modulus divides the product (a modulus
+    that is not larger than n is one of the factors)
+    Args:
+        n (float): the operand (a natural number)
+        modulus (int): the modulus (not 0)
+
+    Returns:
+        float: the factorial of the operand modulo the modulus (with the sign of the modulus)
+    """
+    if n > _max_operand.get():
+        raise InvalidOperandException("Invalid operand for the factorial operator. The operand is too large")
+
+    # Float factorials and huge moduli are computed in full (the residues of a huge modulus are not cheaper)
+    if type(n) == float or abs(modulus).bit_length() > MAX_RESIDUE_BITS:
+        return factorial(n) % modulus
+
+    size = abs(modulus)
+    residue = 0
+    if n < size:
+        residue = 1 % size
+        for k in range(2, n + 1):
+            residue = residue * k % size
+            if residue == 0:
+                break
+
+    # Python's modulo has the sign of the modulus
+    return residue + modulus if modulus < 0 and residue else residue
+
+
+def product_range(low:int, high:int) -> int:
+    """
+    This function multiplies the integers in a range by binary splitting: the factors are multiplied in pairs, round
+    after round, so every multiplication is between numbers of similar sizes
+    Args:
+        low (int): the first factor
+        high (int): the last factor
+
+    Returns:
+        int: the product of the factors
+    """
+    factors = list(range(low, high + 1))
+    if not factors:
+        return 1
+
+    while len(factors) > 1:
+        paired = [factors[i] * factors[i + 1] for i in range(0, len(factors) - 1, 2)]
+        if len(factors) % 2:
+            paired.append(factors[-1])
+        factors = paired
+
+    return factors[0]
+
+
+def _size(value:int) -> int:
+    # The size of an integer's value in bytes
+    return (value.bit_length() + 7) // 8
@@ -0,0 +1,93 @@
+from tokens import *
+
+
+def hash_cons(expression:Token) -> tuple[Token, int]:
+    """
+    This function interns the structurally identical subtrees of an expression into shared nodes, which turns the tree
+    into a DAG. The input tree is not modified. The tree is walked with an explicit stack
+    Args:
+        expression (Token): the root node of the expression
+
+    Returns:
+        tuple[Token, int]: the root node of the DAG, and the number of nodes that were deduplicated
+    """
+    interned = {}  # The unique nodes, by their structural keys
+    results = []  # The interned nodes of the visited subtrees, in post-order
+    nodes = 0  # The number of nodes in the tree
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if type(node) == Number:
+            nodes += 1
+            # The type of the value is a part of the key (the integer 1 and the float 1.0 are different numbers)
+            key = (Number, type(node.value), node.value)
+            results.append(interned.setdefault(key, node))
+
+        elif type(node) == Variable:
+            nodes += 1
+            results.append(interned.setdefault((Variable, node.value), node))
+
+        elif expanded:
+            nodes += 1
+            arity = len(node.children)
+            children = results[len(results) - arity:]
+            del results[len(results) - arity:]
+
+            # The children are already interned, so identical subtrees have identical children
+            key = (type(node),) + tuple(id(child) for child in children)
+            if key not in interned:
+                interned[key] = node.build(*children)
+            results.append(interned[key])
+
+        else:
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return results[0], nodes - len(interned)
+
+
+def evaluate_dag(expression:Token, bindings:dict = None) -> float:
+    """
+    This function evaluates an expression DAG, evaluating every unique node only once.
+    The nodes are evaluated in the same order as the tree evaluation, so the same exception is raised first
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+    Returns:
+        float: the result of the expression
+    """
+    values = {}  # The values of the evaluated nodes, by their ids
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        # Skip the nodes that were already evaluated
+        if id(node) in values:
+            continue
+
+        if type(node) == Number:
+            values[id(node)] = node.value
+
+        elif type(node) == Variable:
+            if bindings is None or node.value not in bindings:
+                raise UnboundVariableException(node.value)
+            values[id(node)] = bindings[node.value]
+
+        elif expanded:
+            values[id(node)] = node.operate(*[values[id(child)] for child in node.children])
+
+        else:
+            # The tilda operand is validated before it is evaluated
+            if type(node) == Tilda:
+                node.validate_operands()
+
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return values[id(expression)]
@@ -1,3 +1,7 @@
+import re
+import sys
+from array import array
+
 from Config.constants import OPERATORS
 from Exceptions.exceptions import *
 from tokens import *
@@ -5,8 +9,8 @@ from tokens import *
 
 class TokenStream:
     # This class represents a token stream - an iterator of tokens
-    def __init__(self, tokens:list[Token]) -> None:
-        self.tokens = tokens
+    def __init__(self, tokens:list[Token] = None) -> None:
+        self.tokens = tokens if tokens is not None else []
         self.i = 0
 
     def next(self) -> Token:
@@ -73,14 +77,224 @@ class TokenStream:
             return self.tokens[self.i]
         return self.tokens[self.i-1]
 
+    def peek_type(self) -> type:
+        """
+        this method returns the type of the next token in the stream without popping it
+
+        Returns:
+            type: the type of the next token in the stream (None if there is no next token)
+        """
+        if self.has_next():
+            return type(self.tokens[self.i])
+
+    def look_ahead_type(self) -> type:
+        """
+        this method returns the type of the token after the next one in the stream without popping it
+
+        Returns:
+            type: the type of the token after the next one in the stream (None if there is no such token)
+        """
+        if self.has_double_next():
+            return type(self.tokens[self.i+1])
+
+    def last_token_type(self) -> type:
+        """
+        this method returns the type of the last token that was popped out of the stream
+
+        Returns:
+            type: the type of the last token that was popped out of the stream
+        """
+        return type(self.last_token())
+
+    def next_position(self) -> int:
+        """
+        this method pops the next token in the stream without returning it (the parsers build the operators' nodes
+        from its position, see build_at)
+
+        Returns:
+            int: the position of the popped token in the stream
+        """
+        self.i += 1
+        return self.i - 1
+
+    def index_at(self, position:int) -> int:
+        """
+        this method returns the index in the input string of the token at a position of the stream
+
+        Args:
+            position (int): the position of the token in the stream
+
+        Returns:
+            int: the index of the token in the input string
+        """
+        return self.tokens[position].index
+
+    def build_at(self, position:int, *children:Token) -> Token:
+        """
+        this method builds the node of the operator token at a position of the stream, with the given children
+
+        Args:
+            position (int): the position of the operator token in the stream
 
+        Returns:
+            Token: the new node
+        """
+        return self.tokens[position].build(*children)
+
+    def append_number(self, index:int, value:float) -> None:
+        # Append a number token to the end of the stream
+        self.tokens.append(Number(index, value))
+
+    def append_operator(self, index:int, char:str) -> None:
+        # Append an operator token to the end of the stream
+        self.tokens.append(OPERATORS[char](index, char))
+
+    def append_variable(self, index:int, name:str) -> None:
+        # Append a variable token to the end of the stream
+        self.tokens.append(Variable(index, name))
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+# Type codes of the compact token stream. Numbers have two codes (integers and decimals), operators have one code each,
+# and variables have the last code
+INTEGER = 0
+DECIMAL = 1
+OPERATOR_CODES = {char: code for code, char in enumerate(OPERATORS.keys(), start=2)}
+VARIABLE = len(OPERATORS) + 2
+CODE_TYPES = [Number, Number] + list(OPERATORS.values()) + [Variable]  # The token type of every code
+CODE_CHARS = [None, None] + list(OPERATORS.keys()) + [None]  # The operator character of every code
+
+MAX_EXACT_INTEGER = 2 ** 53  # Integers below this bound (in absolute value) are exactly representable as doubles
+
+
+class CompactTokenStream(TokenStream):
+    """
+    This class represents a token stream that stores the tokens as parallel arrays instead of Token objects.
+    The parsers dispatch on the type codes, so only the nodes of the tree are built: a number or a variable when it is
+    popped, and an operator's node from its position (see build_at). The operators' own tokens and the parentheses
+    are never built
+    """
+    def __init__(self) -> None:
+        self.codes = bytearray()  # The type code of every token
+        self.indices = array('I')  # The index of every token in the input string
+        self.values = array('d')  # The value of every number token (0 for operators)
+        self.big_integers = {}  # The values of number tokens that are not doubles or small integers, by position
+        self.names = {}  # The names of the variable tokens, by position
+        self.i = 0
+
+    def _token(self, position:int) -> Token:
+        # Build the token object at the given position
+        code = self.codes[position]
+        index = self.indices[position]
+
+        if code == DECIMAL:
+            return Number(index, self.values[position])
+        if code == INTEGER:
+            return Number(index, self.big_integers[position] if position in self.big_integers else int(self.values[position]))
+        if code == VARIABLE:
+            return Variable(index, self.names[position])
+        return CODE_TYPES[code](index, CODE_CHARS[code])
+
+    def next(self) -> Token:
+        if self.i < len(self.codes):
+            self.i += 1
+            return self._token(self.i - 1)
+
+    def peek(self) -> Token:
+        if self.has_next():
+            return self._token(self.i)
+
+    def look_ahead(self) -> Token:
+        if self.has_double_next():
+            return self._token(self.i+1)
+
+    def has_next(self) -> bool:
+        return self.i < len(self.codes)
+
+    def has_double_next(self) -> bool:
+        return self.i < len(self.codes)-1
+
+    def last_token(self) -> Token:
+        if self.i == 0:
+            return self._token(self.i)
+        return self._token(self.i-1)
 
-def lex_input_string(string) -> TokenStream:
+    def peek_type(self) -> type:
+        if self.i < len(self.codes):
+            return CODE_TYPES[self.codes[self.i]]
+
+    def look_ahead_type(self) -> type:
+        if self.i < len(self.codes)-1:
+            return CODE_TYPES[self.codes[self.i+1]]
+
+    def last_token_type(self) -> type:
+        return CODE_TYPES[self.codes[self.i-1 if self.i > 0 else 0]]
+
+    def index_at(self, position:int) -> int:
+        return self.indices[position]
+
+    def build_at(self, position:int, *children:Token) -> Token:
+        code = self.codes[position]
+        return CODE_TYPES[code](self.indices[position], CODE_CHARS[code], *children)
+
+    def append_number(self, index:int, value:float) -> None:
+        position = len(self.codes)
+
+        if type(value) == float:
+            self.codes.append(DECIMAL)
+            self.values.append(value)
+        else:
+            self.codes.append(INTEGER)
+            # Integers that cannot be represented exactly as doubles (and the numbers of the other backends, like
+            # fractions) are kept in the side table
+            if type(value) == int and -MAX_EXACT_INTEGER < value < MAX_EXACT_INTEGER:
+                self.values.append(value)
+            else:
+                self.values.append(0)
+                self.big_integers[position] = value
+
+        self.indices.append(index)
+
+    def append_operator(self, index:int, char:str) -> None:
+        self.codes.append(OPERATOR_CODES[char])
+        self.indices.append(index)
+        self.values.append(0)
+
+    def append_variable(self, index:int, name:str) -> None:
+        self.names[len(self.codes)] = name
+        self.codes.append(VARIABLE)
+        self.indices.append(index)
+        self.values.append(0)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+
+def native_literal(number:int, digits_after_decimal_point:int) -> float:
+    """
+    This function builds the value of a number literal from its digits: an integer if it has no decimal point, and a
+    float otherwise
+    Args:
+        number (int): the digits of the literal (without the decimal point)
+        digits_after_decimal_point (int): the number of digits after the decimal point
+
+    Returns:
+        float: the value of the literal
+    """
+    return number * (10 ** -digits_after_decimal_point)
+
+
+def lex_input_string(string, literal=native_literal) -> TokenStream:
         
     """
-    This function performs lexical analysis on the input string, and detects numbers and operators
+    This function performs lexical analysis on the input string, and detects numbers, operators and variables
     Args:
         string (str): _description_
+        literal (function, optional): builds the value of a number from its digits and the number of digits after
+            its decimal point (see Algorithms.backends). Defaults to native_literal.
 
     Returns:
         list[Token]: _description_
@@ -145,11 +359,132 @@ def lex_input_string(string) -> TokenStream:
                 if digits_after_decimal_point == 0:
                     raise InvalidSymbolException(index-1, string)
                 # Else, calculate the total number and add the corresponding token to the list
-            tokens.append(Number(index-1, number * (10 ** -digits_after_decimal_point)))
+            tokens.append(Number(index-1, literal(number, digits_after_decimal_point)))
+
+        # Else, if the character is a letter or an underscore, read the variable's name (letters, digits and underscores)
+        elif _is_name_start(string[index]):
+            start = index
+            while _is_name_start(string[index]) or (string[index].isascii() and string[index].isdigit()):
+                index += 1
+
+            tokens.append(Variable(start, string[start:index]))
 
         # Else, the character is not valid, so raise an exception
         else:
             raise InvalidSymbolException(index, string)
 
     # Return a TokenStream object of the tokens list
-    return TokenStream(tokens)
\ No newline at end of file
+    return TokenStream(tokens)
+
+
+def _is_name_start(char:str) -> bool:
+    # Variable names are ASCII letters, digits and underscores, and do not start with a digit
+    return char.isascii() and (char.isalpha() or char == '_')
+
+
+# The pattern of a single token (or a run of whitespaces) for the scanner
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+    | (?P<integer>\d[\d\s]*)(?:\.(?P<fraction>[\d\s]*))?
+    | (?P<operator>[""" + re.escape(''.join(OPERATORS.keys())) + r"""])
+    | (?P<variable>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<invalid>.)
+""", re.VERBOSE | re.DOTALL)
+
+# The pattern of a non-whitespace character (to detect empty input strings)
+NON_SPACE_PATTERN = re.compile(r"\S")
+
+
+def scan_input_string(string, stream_type:type=CompactTokenStream, literal=native_literal) -> TokenStream:
+    """
+    This function performs lexical analysis on the input string with a single compiled pattern.
+    It produces the same tokens and raises the same exceptions as lex_input_string, but it converts every number with
+    one int() call instead of looping over its characters, and by default it emits a compact stream (so no token object
+    is built while lexing). The '\\0' sentinel is optional
+    Args:
+        string (str): the input string
+        stream_type (type, optional): the type of the stream to build (TokenStream or CompactTokenStream). Defaults to
+            CompactTokenStream.
+        literal (function, optional): builds the value of a number from its digits and the number of digits after
+            its decimal point. Defaults to native_literal.
+
+    Returns:
+        TokenStream: the stream of tokens
+    """
+
+    # The input ends at the sentinel (or at the end of the string if there is no sentinel)
+    end = string.find('\0')
+    if end == -1:
+        end = len(string)
+
+    # If the string is empty or only whitespaces, raise an exception
+    if not NON_SPACE_PATTERN.search(string, 0, end):
+        raise EmptyInputString()
+
+    tokens = stream_type()
+    append_number = tokens.append_number
+    append_operator = tokens.append_operator
+    append_variable = tokens.append_variable
+    limit = _max_str_digits()
+
+    for match in TOKEN_PATTERN.finditer(string, 0, end):
+        kind = match.lastgroup
+
+        if kind == 'operator':
+            append_operator(match.start(), match.group())
+
+        # The number's index is the index of its last character (including whitespaces inside and after it)
+        elif kind == 'integer' or kind == 'fraction':
+            digits, fraction = match.group('integer', 'fraction')
+            digits_after_decimal_point = 0
+
+            # Remove the whitespaces between the digits
+            if not digits.isdigit():
+                digits = ''.join(digits.split())
+
+            if fraction is not None:
+                if not fraction.isdigit():
+                    fraction = ''.join(fraction.split())
+
+                # If there are no digits after the decimal place, the number is not valid (like the number 2342.)
+                if not fraction:
+                    raise InvalidSymbolException(match.end() - 1, string)
+
+                digits += fraction
+                digits_after_decimal_point = len(fraction)
+
+            # Calculate the number the same way as lex_input_string, so the values are identical
+            number = int(digits) if len(digits) <= limit else _digits_to_int(digits, limit)
+            append_number(match.end() - 1, literal(number, digits_after_decimal_point))
+
+        elif kind == 'variable':
+            append_variable(match.start(), match.group())
+
+        elif kind == 'invalid':
+            raise InvalidSymbolException(match.start(), string)
+
+    return tokens
+
+
+def _max_str_digits() -> int:
+    # The interpreter's int-to-str conversion limit (unlimited on interpreters without one)
+    limit = sys.get_int_max_str_digits() if hasattr(sys, 'get_int_max_str_digits') else 0
+    return limit if limit > 0 else sys.maxsize
+
+
+def _digits_to_int(digits:str, limit:int) -> int:
+    """
+    This function converts a string of digits to an integer.
+    Strings longer than the interpreter's int-to-str limit are split in half and converted separately
+    Args:
+        digits (str): the digits string
+        limit (int): the interpreter's int-to-str limit
+
+    Returns:
+        int: the integer value of the digits
+    """
+    if len(digits) <= limit:
+        return int(digits)
+
+    middle = len(digits) // 2
+    return _digits_to_int(digits[:middle], limit) * 10 ** (len(digits) - middle) + _digits_to_int(digits[middle:], limit)
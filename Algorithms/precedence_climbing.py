@@ -0,0 +1,207 @@
+from Algorithms.lexing import TokenStream
+from Config.constants import PRIORITIES
+from Exceptions.exceptions import *
+from tokens import *
+
+# The priority of every binary operator
+BINARY_PRIORITIES = {operator: priority for priority, operators in PRIORITIES.items() for operator in operators}
+
+
+def parse_expression_iteratively(tokens: TokenStream, string:str) -> Token:
+    """
+    This function parses the expression with precedence climbing over an explicit stack.
+    It accepts the same grammar, builds the same trees and raises the same exceptions as the recursive descent parser,
+    but the Python stack depth does not grow with the length or the nesting of the expression.
+    The parser dispatches on the token types (peek_type is None at the end of the stream), and the operators' nodes are
+    built from their positions in the stream, so no other token object is built
+    Args:
+        tokens (TokenStream): the sequence of tokens
+        string (str): the original input string (to report errors)
+
+    Returns:
+        Token: a token node representing the expression
+    """
+
+    # Stack of the enclosing expressions, one entry per open parenthesis
+    paren_stack = []
+
+    # The state of the current expression
+    operands = []  # the operand nodes that are waiting for their operators
+    operators = []  # the binary operators that are waiting for their right operand
+    in_paren = False
+
+    while True:
+        # Parse the prefix operators of the next operand
+        negatives, tildas, minuses = _parse_prefix(tokens, in_paren)
+
+        # If the operand is a parenthesis expression, save the current state and start parsing the inner expression
+        if tokens.peek_type() == OpenParen:
+            # If the previous token is a tilda, raise an exception
+            if tokens.last_token_type() == Tilda:
+                raise InvalidOperandException("Invalid operand for the tilda operator. Only numbers are allowed")
+
+            # Pop the '('
+            tokens.next_position()
+
+            paren_stack.append((operands, operators, in_paren, negatives, tildas, minuses))
+            operands, operators, in_paren = [], [], True
+            continue
+
+        # Else, the operand is a number or a variable (or it is missing)
+        a = tokens.next() if tokens.peek_type() in (Number, Variable) else None
+
+        while True:
+            # Apply the prefix and postfix operators of the operand
+            a = _apply_unary_operators(tokens, string, in_paren, a, negatives, tildas, minuses)
+
+            # If the next token is a binary operator
+            if tokens.peek_type() in BINARY_PRIORITIES:
+                # Pop the operator (its node is built from its position in the stream, once it is reduced)
+                priority = BINARY_PRIORITIES[tokens.peek_type()]
+                c = tokens.next_position()
+
+                # Reduce the operators with a higher or equal priority (all the operators are left associative)
+                operands.append(a)
+                _reduce(tokens, operands, operators, priority)
+                operators.append((priority, c))
+
+                # Parse the right hand side of the operator
+                break
+
+            # If the next token is a number, a variable, a '(' or a '~', raise an exception (there is a missing operator)
+            if tokens.peek_type() in (Number, Variable, OpenParen, Tilda):
+                raise MissingOperatorException(tokens.peek().index, string)
+
+            # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
+            if not in_paren and tokens.peek_type() == CloseParen:
+                raise MissingParenthesisException()
+
+            # Else, the current expression is over, so reduce all its operators
+            operands.append(a)
+            _reduce(tokens, operands, operators, 0)
+            a = operands.pop()
+
+            # If the expression is not in parenthesis, it is the whole expression
+            if not paren_stack:
+                return a
+
+            # Else, the next token must close the parenthesis
+            if tokens.peek_type() == CloseParen:
+                tokens.next_position()
+            else:
+                raise MissingParenthesisException()
+
+            # Restore the enclosing expression, with the inner expression as the operand
+            operands, operators, in_paren, negatives, tildas, minuses = paren_stack.pop()
+
+
+def _parse_prefix(tokens: TokenStream, in_paren:bool) -> tuple:
+    """
+    This function pops the prefix operators of an operand
+    Args:
+        tokens (TokenStream): the sequence of tokens
+        in_paren (bool): is the current expression is in parenthasis
+
+    Returns:
+        tuple: the positions of the leading negative minuses, of the tildas and of the minuses after the tildas
+    """
+
+    # A minus followed by a minus or a tilda is a negative of the whole (factorial) expression
+    negatives = []
+    while tokens.peek_type() == Minus and tokens.look_ahead_type() in (Minus, Tilda):
+        negatives.append(tokens.next_position())
+
+    # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
+    if not in_paren and tokens.peek_type() == CloseParen:
+        raise MissingParenthesisException()
+
+    tildas = []
+    while tokens.peek_type() == Tilda:
+        tildas.append(tokens.next_position())
+
+    # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
+    if not in_paren and tokens.peek_type() == CloseParen:
+        raise MissingParenthesisException()
+
+    # A minus right before the operand is a negative of the operand only
+    minuses = []
+    while tokens.peek_type() == Minus:
+        minuses.append(tokens.next_position())
+
+    return negatives, tildas, minuses
+
+
+def _apply_unary_operators(tokens: TokenStream, string:str, in_paren:bool, a:Token, negatives:list, tildas:list, minuses:list) -> Token:
+    """
+    This function builds the unary operators' nodes around an operand, and pops its postfix operators
+    Args:
+        tokens (TokenStream): the sequence of tokens
+        string (str): the original input string (to report errors)
+        in_paren (bool): is the current expression is in parenthasis
+        a (Token): the operand node (None if the operand is missing)
+        negatives (list): the positions of the leading negative minuses of the operand
+        tildas (list): the positions of the tildas of the operand
+        minuses (list): the positions of the minuses after the tildas
+
+    Returns:
+        Token: a token node representing the operand
+    """
+
+    # Wrap the operand with its minuses, from the innermost one
+    for c in reversed(minuses):
+        # If a is None, raise an exception (there is a missing operand)
+        if not a:
+            raise MissingOperandException(tokens.index_at(c), string)
+        a = Negative(tokens.index_at(c), '-', a)
+
+    # Wrap the operand with its tildas, from the innermost one
+    for c in reversed(tildas):
+        # If a is None, raise an exception (there is a missing operand)
+        if not a:
+            raise MissingOperandException(tokens.index_at(c), string)
+        a = tokens.build_at(c, a)
+
+    # If a is None, raise an exception (there is a missing operand)
+    if not a:
+        raise MissingOperandException(tokens.last_token().index, string)
+
+    while True:
+        # If the next token is a SumDigits
+        if tokens.peek_type() == SumDigits:
+            a = tokens.build_at(tokens.next_position(), a)
+
+        # If the next token is a factorial
+        if tokens.peek_type() == Factorial:
+            a = tokens.build_at(tokens.next_position(), a)
+
+        # Else, there is no more factorial or sumDigits operators in the expression
+        else:
+            # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
+            if not in_paren and tokens.peek_type() == CloseParen:
+                raise MissingParenthesisException()
+            break
+
+    # Wrap the whole expression with its negatives, from the innermost one
+    for c in reversed(negatives):
+        a = Negative(tokens.index_at(c), '-', a)
+
+    return a
+
+
+def _reduce(tokens: TokenStream, operands:list, operators:list, priority:int) -> None:
+    """
+    This function builds the nodes of the waiting operators whose priority is higher or equal to the given priority
+    Args:
+        tokens (TokenStream): the sequence of tokens (the operators' nodes are built from their positions in it)
+        operands (list): the operand nodes that are waiting for their operators
+        operators (list): the (priority, operator position) pairs that are waiting for their right operand
+        priority (int): the priority of the next operator
+    """
+    while operators and operators[-1][0] >= priority:
+        _, c = operators.pop()
+
+        # Build the operator's node, with the left hand and right hand sides of the expression as its children
+        right = operands.pop()
+        left = operands.pop()
+
+        operands.append(tokens.build_at(c, left, right))
@@ -0,0 +1,206 @@
+from time import perf_counter
+
+from Algorithms.cost import estimate_nodes
+from Exceptions.exceptions import EvaluationTimeoutException, InvalidOperandException, UnboundVariableException
+from metrics import result_bits
+from tokens import *
+
+# The exceptions that stop a profiled evaluation (the profile is still returned, with the error on the failing path).
+# The arithmetic errors include the ones that the operators do not validate, like the ZeroDivisionError of 0^-1
+PROFILED_ERRORS = (InvalidOperandException, ArithmeticError, EvaluationTimeoutException)
+
+
+class NodeProfile:
+    """
+    This class represents the profile of an evaluated node: its wall time (with and without its children), the size of
+    its result, its estimated cost, and whether it is on the hottest path of the expression
+    """
+    __slots__ = ('node', 'children', 'start', 'seconds', 'self_seconds', 'result', 'bits', 'estimated_cost',
+                 'error', 'hot')
+
+    def __init__(self, node:Token) -> None:
+        self.node = node
+        self.children = []  # The profiles of the children
+        self.start = None  # The time the evaluation of the node started
+        self.seconds = 0.0  # The wall time of the node, with its children
+        self.self_seconds = 0.0  # The wall time of the node itself
+        self.result = None  # The result of the node (None if it was not evaluated)
+        self.bits = None  # The size of the result in bits
+        self.estimated_cost = None  # The estimated cost of the subtree (see Algorithms.cost)
+        self.error = None  # The message of the exception that stopped the evaluation in this subtree
+        self.hot = False  # Whether the node is on the hottest path
+
+    @property
+    def name(self) -> str:
+        return type(self.node).__name__
+
+    def to_dict(self) -> dict:
+        """
+        this method converts the profile to nested dictionaries (without the results, which can be huge)
+
+        Returns:
+            dict: the profile of the node and its children
+        """
+        # Build the dictionaries with an explicit stack (every dictionary is added to its parent's children list)
+        root = {}
+        stack = [(self, root)]
+        while stack:
+            profile, entry = stack.pop()
+            entry.update({'operator': profile.name, 'value': profile.node.value if not profile.node.children else None,
+                          'seconds': profile.seconds, 'self_seconds': profile.self_seconds, 'bits': profile.bits,
+                          'estimated_cost': profile.estimated_cost, 'error': profile.error, 'hot': profile.hot,
+                          'children': [{} for _ in profile.children]})
+            stack.extend(zip(profile.children, entry['children']))
+        return root
+
+
+def profile_expression(expression:Token, bindings:dict = None) -> tuple[NodeProfile, float]:
+    """
+    This function evaluates an expression (like the tree evaluation, and in the same order) and profiles every node.
+    If the evaluation raises, the failing node and its ancestors get the error and the time spent until then
+    (an unbound variable is not an evaluation error, so its UnboundVariableException is raised)
+    Args:
+        expression (Token): the root node of the expression
+        bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+    Returns:
+        tuple[NodeProfile, float]: the profile of the root node, and the result (None if the evaluation raised)
+    """
+    root = NodeProfile(expression)
+    values = []  # The results of the evaluated subtrees, in post-order
+    stack = [(root, False)]
+    profile = root
+
+    try:
+        while stack:
+            profile, expanded = stack.pop()
+            node = profile.node
+
+            if type(node) == Number:
+                profile.result = node.value
+
+            elif type(node) == Variable:
+                if bindings is None or node.value not in bindings:
+                    raise UnboundVariableException(node.value)
+                profile.result = bindings[node.value]
+
+            elif expanded:
+                arity = len(profile.children)
+                operands = values[len(values) - arity:]
+                del values[len(values) - arity:]
+                profile.result = node.operate(*operands)
+                profile.seconds = perf_counter() - profile.start
+
+            else:
+                profile.start = perf_counter()
+
+                # The tilda operand is validated before it is evaluated
+                if type(node) == Tilda:
+                    node.validate_operands()
+
+                profile.children = [NodeProfile(child) for child in node.children]
+                stack.append((profile, True))
+                for child in reversed(profile.children):
+                    stack.append((child, False))
+                continue
+
+            profile.bits = result_bits(profile.result)
+            values.append(profile.result)
+
+    except PROFILED_ERRORS as error:
+        # The unfinished nodes are the failing node and the nodes that wait for their operands (its ancestors)
+        now = perf_counter()
+        for unfinished, expanded in stack + [(profile, True)]:
+            if expanded:
+                unfinished.seconds = now - unfinished.start
+                unfinished.error = str(error)
+
+    # Add the estimates, the self times and the hottest path
+    estimates = estimate_nodes(expression, bindings)
+    for profile in _walk(root):
+        profile.estimated_cost = estimates[id(profile.node)].cost
+        profile.self_seconds = max(0.0, profile.seconds - sum(child.seconds for child in profile.children))
+
+    # The hottest path follows the failing child, or else the slowest operator child
+    profile = root
+    while profile is not None:
+        profile.hot = True
+        operators = [child for child in profile.children if child.children]
+        failed = [child for child in operators if child.error is not None]
+        profile = max(failed or operators, key=lambda child: child.seconds, default=None)
+
+    return root, values[0] if values and root.error is None else None
+
+
+def operator_summary(root:NodeProfile) -> dict[str, dict]:
+    """
+    This function sums the profile by operator type
+    Args:
+        root (NodeProfile): the profile of the root node
+
+    Returns:
+        dict[str, dict]: the number of nodes and their total self time, by operator name, from the slowest operator
+    """
+    summary = {}
+    for profile in _walk(root):
+        if not profile.node.children:
+            continue
+        entry = summary.setdefault(profile.name, {'calls': 0, 'seconds': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += profile.self_seconds
+
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['seconds']))
+
+
+def format_profile(root:NodeProfile) -> str:
+    """
+    This function draws the profile as an annotated tree. The nodes on the hottest path are marked with a '*'
+    Args:
+        root (NodeProfile): the profile of the root node
+
+    Returns:
+        str: the lines of the tree
+    """
+    total = root.seconds or 1.0
+    lines = []
+    stack = [(root, '', '')]
+
+    while stack:
+        profile, prefix, child_prefix = stack.pop()
+        marker = '*' if profile.hot else ' '
+
+        if not profile.node.children:
+            lines.append(f"{marker} {prefix}{profile.node.value}")
+        else:
+            line = (f"{marker} {prefix}{profile.name} '{profile.node.value}'  {_format_seconds(profile.seconds)} "
+                    f"(self {_format_seconds(profile.self_seconds)}, {100 * profile.seconds / total:.1f}%)")
+            if profile.bits is not None:
+                line += f"  bits={profile.bits}"
+            line += f"  est={profile.estimated_cost:.3g}"
+            if profile.error is not None:
+                line += f"  error: {profile.error.strip()}"
+            lines.append(line)
+
+        # Push the children in reverse, so the first child is drawn first
+        for i, child in reversed(list(enumerate(profile.children))):
+            last = i == len(profile.children) - 1
+            stack.append((child, child_prefix + ('└─ ' if last else '├─ '), child_prefix + ('   ' if last else '│  ')))
+
+    return '\n'.join(lines)
+
+
+def _walk(root:NodeProfile):
+    # Iterate over all the profiles of a tree
+    stack = [root]
+    while stack:
+        profile = stack.pop()
+        yield profile
+        stack.extend(profile.children)
+
+
+def _format_seconds(seconds:float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
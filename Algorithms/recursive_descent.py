@@ -51,32 +51,28 @@ def parse_binary_expression(tokens: TokenStream, priority:int, string:str, in_pa
 
         while True:
             # If the next token is a valid operator
-            if tokens.has_next() and type(tokens.peek()) in operators:
-                # Get the operator's node
-                c = tokens.next()
+            if tokens.has_next() and tokens.peek_type() in operators:
+                # Pop the operator (its node is built from its position in the stream)
+                c = tokens.next_position()
 
                 # Parse the right hand side of the expression
                 b = parse_binary_expression(tokens, priority+1, string, in_paren)
 
                 # If the right hand side, is None, raise an exception
                 if not b:
-                    raise MissingOperandException(c.index, string)
+                    raise MissingOperandException(tokens.index_at(c), string)
 
-                # Set the left hand and right hand sides of the expression as the operator's children
-                c.left = a
-                c.right = b
-
-                # Set a to be the operator node
-                a = c  
+                # Build the operator's node, with the left hand and right hand sides of the expression as its children
+                a = tokens.build_at(c, a, b)
 
             # Else, there is no more valid operators at the current priority
             else:
-                # If the next token is a number, a '(' or a '~', raise an exception (there is a missing operator)
-                if type(tokens.peek()) == Number or type(tokens.peek()) == OpenParen or type(tokens.peek()) == Tilda:
+                # If the next token is a number, a variable, a '(' or a '~', raise an exception (there is a missing operator)
+                if tokens.peek_type() in (Number, Variable, OpenParen, Tilda):
                     raise MissingOperatorException(tokens.peek().index, string)
 
                 # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
-                if not in_paren and type(tokens.peek()) == CloseParen:
+                if not in_paren and tokens.peek_type() == CloseParen:
                     raise MissingParenthesisException()
                 
                 # Else, return the node itself
@@ -95,24 +91,24 @@ def parse_first_negative_expression(tokens:TokenStream, string:str, in_paren:Fal
         Token: a token node representing the expression
     """
     # If the next token is a minus, and the one after that is a minus or a tilda
-    if tokens.has_next() and type(tokens.peek()) == Minus and tokens.has_double_next() and (type(tokens.look_ahead()) == Minus or type(tokens.look_ahead()) == Tilda):
-        # Get the minus operator node
-        c = tokens.next()
+    if tokens.has_next() and tokens.peek_type() == Minus and tokens.has_double_next() and (tokens.look_ahead_type() == Minus or tokens.look_ahead_type() == Tilda):
+        # Pop the minus operator
+        c = tokens.next_position()
 
         # Parse the right side of the expression
         a = parse_first_negative_expression(tokens, string, in_paren)
 
         # If a is None, raise an exception (there is a missing operand)
         if not a:
-            raise MissingOperandException(c.index, string)
+            raise MissingOperandException(tokens.index_at(c), string)
 
         # Set the right side as the negative node child and return it
-        return Negative(c.index, '-', a)
+        return Negative(tokens.index_at(c), '-', a)
     
     # Else, there is no minus operator in the expression
     else:
         # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
-        if not in_paren and type(tokens.peek()) == CloseParen:
+        if not in_paren and tokens.peek_type() == CloseParen:
             raise MissingParenthesisException()
 
         # Else try parsing the rest of the expression
@@ -140,27 +136,19 @@ def parse_factorial_digitsSum_expression(tokens: TokenStream, string:str, in_par
 
     while True:
         # If the next token is a SumDigits
-        if tokens.has_next() and type(tokens.peek()) == SumDigits:
-            # Get the sumDigits operator node
-            c = tokens.next()
-            # Set the left side as the sumDigits node
-            c.operand = a
-            # Set a to be the factorial node
-            a = c
+        if tokens.has_next() and tokens.peek_type() == SumDigits:
+            # Pop the sumDigits operator and build its node, with the left side as its child
+            a = tokens.build_at(tokens.next_position(), a)
 
         # If the next token is a factorial
-        if tokens.has_next() and type(tokens.peek()) == Factorial:
-            # Get the factorial operator node
-            c = tokens.next()
-            # Set the left side as the factorial node child
-            c.operand = a
-            # Set a to be the factorial node 
-            a = c
+        if tokens.has_next() and tokens.peek_type() == Factorial:
+            # Pop the factorial operator and build its node, with the left side as its child
+            a = tokens.build_at(tokens.next_position(), a)
         
         # Else, there is no more factorial or sumDigits operators in the expression
         else:
             # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
-            if not in_paren and type(tokens.peek()) == CloseParen:
+            if not in_paren and tokens.peek_type() == CloseParen:
                     raise MissingParenthesisException()
 
             # Else, return the node itself
@@ -180,26 +168,23 @@ def parse_tilda_expression(tokens: TokenStream, string:str, in_paren=False) -> T
     """
     
     # If the next token is a tilda operator
-    if tokens.has_next() and type(tokens.peek()) == Tilda:
-        # Get the tilda operator node
-        c = tokens.next()
+    if tokens.has_next() and tokens.peek_type() == Tilda:
+        # Pop the tilda operator
+        c = tokens.next_position()
         # Parse the right side of the expression
         a = parse_tilda_expression(tokens, string, in_paren)
 
         # If a is None, raise an exception (there is a missing operand)
         if not a:
-            raise MissingOperandException(c.index, string)
-
-        # Set the right side as the tilda node child
-        c.operand = a
+            raise MissingOperandException(tokens.index_at(c), string)
 
-        # Return the tilda node
-        return c
+        # Build the tilda node, with the right side as its child
+        return tokens.build_at(c, a)
     
     # Else, there is no tilda operator in the expression
     else:
         # If the expression is not in parenthesis and we encountered a ')', raise an exception (missing parenthesis)
-        if not in_paren and type(tokens.peek()) == CloseParen:
+        if not in_paren and tokens.peek_type() == CloseParen:
             raise MissingParenthesisException()
 
         # Else, try parsing the rest of the expression
@@ -218,40 +203,40 @@ def parse_final_expression(tokens: TokenStream, string:str) -> Token:
         Token: a token node representing the expression
     """
 
-    # If the next token is a number, pop it and return it
-    if tokens.has_next() and type(tokens.peek()) == Number:
+    # If the next token is a number or a variable, pop it and return it
+    if tokens.has_next() and (tokens.peek_type() == Number or tokens.peek_type() == Variable):
         a = tokens.next()
         return a
 
     # If the next token is a minus operator
-    elif tokens.has_next() and type(tokens.peek()) == Minus:
-        # Get the minus operator node
-        c = tokens.next()
+    elif tokens.has_next() and tokens.peek_type() == Minus:
+        # Pop the minus operator
+        c = tokens.next_position()
         # Parse the left side of the expression
         a = parse_final_expression(tokens, string)
 
         # If a is None, raise an exception (there is a missing operand)
         if not a:
-            raise MissingOperandException(c.index, string) 
+            raise MissingOperandException(tokens.index_at(c), string)
 
         # Return a negative node with the left side as its child
-        return Negative(c.index, '-', a)
+        return Negative(tokens.index_at(c), '-', a)
     
     # Else, if the next token is an '('
-    elif tokens.has_next() and type(tokens.peek()) == OpenParen:
+    elif tokens.has_next() and tokens.peek_type() == OpenParen:
         # If the previous token is a tilda, raise an exception
-        if type(tokens.last_token()) == Tilda:
+        if tokens.last_token_type() == Tilda:
             raise InvalidOperandException("Invalid operand for the tilda operator. Only numbers are allowed")
         
         # Pop the '('
-        tokens.next()
+        tokens.next_position()
 
         # Parse the inner expression
         a = parse_expression(tokens, string, True)
 
         # If the next token is a ')', pop the token and return the expression
-        if tokens.has_next() and type(tokens.peek()) == CloseParen:
-            tokens.next()
+        if tokens.has_next() and tokens.peek_type() == CloseParen:
+            tokens.next_position()
             return a
         
         # Else, raise an exception
@@ -0,0 +1,138 @@
+from Algorithms.cost import estimate
+from tokens import *
+
+# The largest cost (see Algorithms.cost) and result size in bits of a constant subtree that is folded into a literal
+# (a larger one is left to the evaluation, so the rewrite pass itself stays cheap)
+FOLD_MAX_COST = 1e4
+FOLD_MAX_BITS = 4096
+
+# The exceptions of a constant subtree that is not folded (it raises when it is evaluated, in its place)
+FOLD_ERRORS = (InvalidOperandException, ArithmeticError)
+
+# The n-ary node of every flattened binary chain operator
+CHAINS = {Plus: Sum, Mult: Product}
+
+
+def rewrite(expression:Token, fold:bool = True) -> Token:
+    """
+    This function rewrites an expression tree into an equivalent tree of cheaper nodes. Every rewrite gives the same
+    result (of the same type) and raises the same exceptions in the same order:
+    - a constant subtree is folded into a literal, if it is cheap and does not raise
+    - (a^b)%m and (n!)%m, where m is an integer literal, are fused into PowerMod (modular exponentiation) and
+      FactorialMod (a residue that stops once m divides the product)
+    - a chain of Plus (or Mult) operators whose right operands are literals or variables is flattened into an n-ary
+      Sum (or Product) that adds its operands in the same order
+    A tilda operand is not rewritten, since the tilda validates its structure. The input tree is not modified, and the
+    unchanged subtrees are shared. The tree is walked with an explicit stack
+    Args:
+        expression (Token): the root node of the expression
+        fold (bool, optional): whether the constant subtrees are folded (the folded literals are computed with the
+            native arithmetic, so the other numeric backends do not fold). Defaults to True.
+
+    Returns:
+        Token: the root node of the rewritten tree
+    """
+    results = []  # The rewritten subtrees, in post-order
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if expanded == 'chain':
+            results.append(_rewrite_chain(node, results.pop(), fold))
+
+        elif not node.children or type(node) == Tilda:
+            results.append(node)
+
+        # A chain of Plus (or Mult) operators with leaf right operands is rewritten in a single pass over its left
+        # spine, once the subtree at its bottom is rewritten
+        elif type(node) in CHAINS and type(node.right) in (Number, Variable) and type(node.left) == type(node):
+            spine = [node]
+            while type(spine[-1].left) == type(node) and type(spine[-1].left.right) in (Number, Variable):
+                spine.append(spine[-1].left)
+            stack.append((spine, 'chain'))
+            stack.append((spine[-1].left, False))
+
+        elif expanded:
+            arity = len(node.children)
+            children = results[len(results) - arity:]
+            del results[len(results) - arity:]
+
+            if any(new is not old for new, old in zip(children, node.children)):
+                node = node.build(*children)
+            results.append(_rewrite_node(node, fold))
+
+        else:
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return results[0]
+
+
+def _rewrite_node(node:Token, fold:bool) -> Token:
+    # Apply the first matching rule to a node whose children are already rewritten
+    children = node.children
+
+    if all(type(child) == Number for child in children):
+        return _fold(node) if fold else node
+
+    if type(node) == Mod and _is_integer_literal(node.right) and node.right.value != 0:
+        # A fused node of literals is cheap, so it can be folded
+        if type(node.left) == Power:
+            return _fold_constant(PowerMod(node.index, node.value, node.left.left, node.left.right, node.right), fold)
+        if type(node.left) == Factorial:
+            return _fold_constant(FactorialMod(node.index, node.value, node.left.operand, node.right), fold)
+
+    # The right operands of a chain are leaves, so all the operands of the n-ary node are evaluated before the first
+    # addition just like in the chain (a literal or a bound variable cannot raise between two additions)
+    if type(node) in CHAINS and type(node.right) in (Number, Variable):
+        binary, nary = type(node), CHAINS[type(node)]
+        if type(node.left) == binary:
+            return nary(node.index, node.value, node.left.left, node.left.right, node.right)
+        if type(node.left) == nary:
+            return nary(node.index, node.value, *node.left.operands, node.right)
+
+    return node
+
+
+def _rewrite_chain(spine:list, left:Token, fold:bool) -> Token:
+    # Rewrite the nodes of a chain's left spine (from the top down) from the bottom up, on the rewritten left operand of
+    # the bottom node. Once a node is flattened, the rest of the chain only adds its right operands to the n-ary node,
+    # so the operands are collected in a list and the n-ary node is built once (with the top node's position)
+    operands = None  # The operands of the n-ary node, once the chain is flattened
+    for node in reversed(spine):
+        if operands is not None:
+            operands.append(node.right)
+            continue
+
+        if left is not node.left:
+            node = node.build(left, node.right)
+        left = _rewrite_node(node, fold)
+        if type(left) == CHAINS[type(spine[0])]:
+            operands = list(left.operands)
+
+    if operands is None:
+        return left
+    top = spine[0]
+    return CHAINS[type(top)](top.index, top.value, *operands)
+
+
+def _fold(node:Token) -> Token:
+    # Fold a constant node into a literal, unless it is expensive or raises
+    result = estimate(node)
+    if result.cost > FOLD_MAX_COST or result.bits > FOLD_MAX_BITS:
+        return node
+
+    try:
+        return Number(node.index, node.operate(*[child.value for child in node.children]))
+    except FOLD_ERRORS:
+        return node
+
+
+def _fold_constant(node:Token, fold:bool) -> Token:
+    return _fold(node) if fold and all(type(child) == Number for child in node.children) else node
+
+
+def _is_integer_literal(node:Token) -> bool:
+    return type(node) == Number and type(node.value) == int
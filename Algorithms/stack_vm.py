@@ -0,0 +1,158 @@
+from array import array
+
+from Exceptions.exceptions import *
+from tokens import *
+
+# Opcodes of the instructions that are not operator kernels
+PUSH = 0  # Push the constant at index `arg` onto the stack
+RAISE = 1  # Raise an InvalidOperandException with the message at index `arg`
+LOAD = 2  # Push the value of the variable in slot `arg` onto the stack
+
+# Operator node classes, in opcode order (the opcode of KERNELS[i] is i + 3)
+KERNELS = [Negative, Tilda, Factorial, SumDigits, Plus, Minus, Mult, Div, Power, Mod, Max, Min, Avg,
+           Sum, Product, PowerMod, FactorialMod]
+OPCODES = {kernel: opcode for opcode, kernel in enumerate(KERNELS, start=3)}
+OPERATE = [None, None, None] + [kernel.operate for kernel in KERNELS]  # The kernel function of every opcode
+
+
+class Program:
+    # This class represents a compiled expression - a flat postfix program for the stack VM
+    def __init__(self) -> None:
+        self.opcodes = array('B')  # The opcode of every instruction
+        self.args = array('I')  # The argument of every instruction (a constant index, a variable slot or the operator's arity)
+        self.constants = []  # The numbers and messages used by the instructions
+        self.variables = []  # The names of the variables, by slot (in the order of their first appearance)
+        self.slots = {}  # The slots of the variables, by name
+
+    def emit(self, opcode:int, arg:int) -> None:
+        """
+        this method appends an instruction to the program
+
+        Args:
+            opcode (int): the opcode of the instruction
+            arg (int): the argument of the instruction
+        """
+        self.opcodes.append(opcode)
+        self.args.append(arg)
+
+    def emit_constant(self, opcode:int, constant) -> None:
+        """
+        this method appends an instruction that refers to a constant
+
+        Args:
+            opcode (int): the opcode of the instruction (PUSH or RAISE)
+            constant: the constant of the instruction
+        """
+        self.constants.append(constant)
+        self.emit(opcode, len(self.constants) - 1)
+
+    def emit_variable(self, name:str) -> None:
+        """
+        this method appends an instruction that loads a variable (a variable gets a slot on its first appearance)
+
+        Args:
+            name (str): the name of the variable
+        """
+        if name not in self.slots:
+            self.slots[name] = len(self.variables)
+            self.variables.append(name)
+        self.emit(LOAD, self.slots[name])
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+
+def compile_expression(expression:Token) -> Program:
+    """
+    This function lowers an expression tree into a postfix program.
+    The tree is walked with an explicit stack, so the depth of the tree is not limited by the recursion limit
+    Args:
+        expression (Token): the root node of the expression
+
+    Returns:
+        Program: the compiled program
+    """
+    program = Program()
+
+    # Stack of (node, expanded) pairs. A node is expanded once its children were pushed
+    stack = [(expression, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        # Numbers are pushed as constants
+        if type(node) == Number:
+            program.emit_constant(PUSH, node.value)
+
+        # Variables are loaded from their slots
+        elif type(node) == Variable:
+            program.emit_variable(node.value)
+
+        # If the node's children were already compiled, emit the node's kernel
+        elif expanded:
+            program.emit(OPCODES[type(node)], len(node.children))
+
+        else:
+            # The tilda operand is validated before it is evaluated, so an invalid tilda is compiled into a RAISE
+            # instruction in place of the whole subtree (the operand is never evaluated)
+            if type(node) == Tilda:
+                try:
+                    node.validate_operands()
+                except InvalidOperandException as ioe:
+                    program.emit_constant(RAISE, str(ioe))
+                    continue
+
+            # Compile the children first (pushed in reverse, so the left child is compiled first)
+            stack.append((node, True))
+            for child in reversed(node.children):
+                stack.append((child, False))
+
+    return program
+
+
+def run_program(program:Program, values:list = ()) -> float:
+    """
+    This function runs a compiled program on a stack VM
+    Args:
+        program (Program): the program to run
+        values (list, optional): the values of the program's variables, by slot. Defaults to () (no variables).
+
+    Returns:
+        float: the result of the expression
+    """
+    # If a variable has no value, raise an exception
+    if len(values) < len(program.variables):
+        raise UnboundVariableException(program.variables[len(values)])
+
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    constants = program.constants
+    kernels = OPERATE
+
+    for opcode, arg in zip(program.opcodes, program.args):
+        if opcode == PUSH:
+            push(constants[arg])
+
+        elif opcode == LOAD:
+            push(values[arg])
+
+        elif opcode == RAISE:
+            raise InvalidOperandException(constants[arg])
+
+        # Unary kernels replace the top of the stack
+        elif arg == 1:
+            stack[-1] = kernels[opcode](stack[-1])
+
+        # Binary kernels pop the right operand and replace the left one
+        elif arg == 2:
+            right_value = pop()
+            stack[-1] = kernels[opcode](stack[-1], right_value)
+
+        # N-ary kernels (of the fused operators) replace all their operands
+        else:
+            operands = stack[len(stack) - arg:]
+            del stack[len(stack) - arg:]
+            push(kernels[opcode](*operands))
+
+    return stack[-1]
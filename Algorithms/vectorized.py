@@ -0,0 +1,200 @@
+from Algorithms.digits import sum_digits
+from Algorithms.factorial import MAX_FLOAT_OPERAND, factorial, max_operand
+from tokens import *
+
+# NumPy is optional: only the vectorized evaluation needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The largest float below which every integer is exact (so its shortest representation has all its digits)
+MAX_EXACT_FLOAT = 2.0 ** 53
+
+
+def evaluate_columns(expression:Token, columns:dict = None, size:int = None) -> tuple:
+    """
+    This function evaluates an expression element-wise over columns of values (one column per variable).
+    The arithmetic is float64, like the float results of the scalar evaluation. The exceptions of the scalar
+    evaluation (division by 0, an invalid factorial operand, a complex or overflowing power, an invalid tilda) do not
+    stop the evaluation: the failing rows are marked in an error mask and their values are NaN.
+    The tree is walked once with an explicit stack, and every node is computed for all the rows at once
+    Args:
+        expression (Token): the root node of the expression
+        columns (dict, optional): the values of the variables, by name (sequences or arrays of the same length).
+            Defaults to None (no variables).
+        size (int, optional): the number of rows, if there are no columns. Defaults to None.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: the results of the rows, and the error mask of the rows
+    """
+    if np is None:
+        raise ImportError("The vectorized evaluation requires NumPy")
+
+    columns = {name: np.asarray(column, dtype=np.float64) for name, column in (columns or {}).items()}
+    if size is None:
+        size = len(next(iter(columns.values()))) if columns else 1
+    for name, column in columns.items():
+        if column.shape != (size,):
+            raise ValueError(f"The column of '{name}' has {len(column)} rows instead of {size}")
+
+    errors = np.zeros(size, dtype=bool)  # The rows whose scalar evaluation raises
+    values = []  # The columns of the evaluated subtrees, in post-order
+    stack = [(expression, False)]
+
+    with np.errstate(all='ignore'):
+        while stack:
+            node, expanded = stack.pop()
+
+            if type(node) == Number:
+                values.append(_literal_column(node.value, size, errors))
+
+            elif type(node) == Variable:
+                if node.value not in columns:
+                    raise UnboundVariableException(node.value)
+                values.append(columns[node.value])
+
+            elif expanded:
+                arity = len(node.children)
+                operands = values[len(values) - arity:]
+                del values[len(values) - arity:]
+                result, failed = KERNELS[type(node)](*operands)
+                if failed is not None:
+                    errors |= failed
+                values.append(result)
+
+            else:
+                # An invalid tilda fails on every row, and its operand is never evaluated
+                if type(node) == Tilda:
+                    try:
+                        node.validate_operands()
+                    except InvalidOperandException:
+                        errors[:] = True
+                        values.append(np.full(size, np.nan))
+                        continue
+
+                stack.append((node, True))
+                for child in reversed(node.children):
+                    stack.append((child, False))
+
+    result = np.array(values[0], dtype=np.float64)
+    result[errors] = np.nan
+    return result, errors
+
+
+def _literal_column(value:float, size:int, errors):
+    # A literal is repeated over the rows (a literal that is too large for a float fails on every row)
+    try:
+        return np.full(size, float(value))
+    except OverflowError:
+        errors[:] = True
+        return np.full(size, np.nan)
+
+
+def _negative(value):
+    return -value, None
+
+
+def _factorial(value):
+    # Only natural numbers are valid operands, and the float factorials past 170! are inf
+    failed = ~((value >= 0) & (value % 1 == 0)) | (value > max_operand())
+    in_table = ~failed & (value <= MAX_FLOAT_OPERAND)
+    result = np.where(in_table, FACTORIALS[np.where(in_table, value, 0).astype(np.intp)], np.inf)
+    return result, failed
+
+
+def _sum_digits(value):
+    result = np.zeros(value.shape)
+
+    # The digits of small integers are summed with integer arithmetic (their representation has all their digits)
+    small = (np.abs(value) < MAX_EXACT_FLOAT) & (value % 1 == 0)
+    remaining = np.abs(np.where(small, value, 0)).astype(np.int64)
+    total = np.zeros(value.shape, dtype=np.int64)
+    while remaining.any():
+        total += remaining % 10
+        remaining //= 10
+    result[small] = np.where(value > 0, total, -total)[small]
+
+    # The other floats sum the digits of their representation, one by one
+    others = ~small & ~np.isnan(value)
+    if others.any():
+        result[others] = [sum_digits(float(number)) for number in value[others]]
+
+    return result, None
+
+
+def _plus(left, right):
+    return left + right, None
+
+
+def _minus(left, right):
+    return left - right, None
+
+
+def _mult(left, right):
+    return left * right, None
+
+
+def _div(left, right):
+    failed = right == 0
+    return left / np.where(failed, 1.0, right), failed
+
+
+def _power(left, right):
+    # 0^0, a negative base with a fractional exponent (a complex result), 0 to a negative power (a division by 0),
+    # and a finite power that overflows fail like the scalar evaluation
+    result = np.power(left, right)
+    failed = (((left == 0) & (right <= 0)) | ((left < 0) & (right % 1 != 0) & np.isfinite(right))
+              | (np.isinf(result) & np.isfinite(left) & np.isfinite(right)))
+    return result, failed
+
+
+def _mod(left, right):
+    # The float modulo of NumPy has the sign of the divisor, like Python's
+    failed = right == 0
+    return np.mod(left, np.where(failed, 1.0, right)), failed
+
+
+def _max(left, right):
+    return np.where(left > right, left, right), None
+
+
+def _min(left, right):
+    return np.where(left < right, left, right), None
+
+
+def _avg(left, right):
+    return (left + right) / 2, None
+
+
+def _chain(kernel):
+    # The kernel of an n-ary chain of a binary kernel, applied from left to right
+    def chained(*operands):
+        result, failed = operands[0], None
+        for operand in operands[1:]:
+            result, operand_failed = kernel(result, operand)
+            failed = operand_failed if failed is None else failed | operand_failed
+        return result, failed
+    return chained
+
+
+def _power_mod(base, exponent, modulus):
+    power, power_failed = _power(base, exponent)
+    result, mod_failed = _mod(power, modulus)
+    return result, power_failed | mod_failed
+
+
+def _factorial_mod(value, modulus):
+    product, factorial_failed = _factorial(value)
+    result, mod_failed = _mod(product, modulus)
+    return result, factorial_failed | mod_failed
+
+
+# The element-wise kernel of every operator. A kernel returns the result column and the rows that fail (or None)
+KERNELS = {
+    Negative: _negative, Tilda: _negative, Factorial: _factorial, SumDigits: _sum_digits,
+    Plus: _plus, Minus: _minus, Mult: _mult, Div: _div, Power: _power, Mod: _mod, Max: _max, Min: _min, Avg: _avg,
+    Sum: _chain(_plus), Product: _chain(_mult), PowerMod: _power_mod, FactorialMod: _factorial_mod}
+
+# The float factorials of 0..170, rounded like the scalar evaluation
+FACTORIALS = np.array([factorial(float(n)) for n in range(MAX_FLOAT_OPERAND + 1)]) if np is not None else None
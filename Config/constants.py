@@ -25,4 +25,8 @@ PRIORITIES = {
     3: [Power],
     4: [Mod],
     5: [Max, Min, Avg],
-}
\ No newline at end of file
+}
+
+# Binary operators whose operands can be swapped without changing the result (not Max and Min: on a tie, or with NaN,
+# they return their right operand, so 2$2.0 is 2.0 and 2.0$2 is 2)
+COMMUTATIVE_OPERATORS = [Plus, Mult, Avg]
@@ -41,9 +41,38 @@ class InvalidOperandException(Exception):
         super().__init__(message)
 
 
+# This exception is raised when an expression with a variable is evaluated without a value for the variable
+class UnboundVariableException(Exception):
+    def __init__(self, name:str) -> None:
+        super().__init__(f"Unbound variable '{name}'")
+        self.name = name
+
+
+# This exception is raised when a named result of a session would depend on itself
+class CircularDependencyException(Exception):
+    def __init__(self, name:str) -> None:
+        super().__init__(f"Circular dependency: '{name}' depends on itself")
+        self.name = name
+
+
 # Other excpetions
 
 # This exception is raised when there is some keyboard interrupt during the parsing of the expression
 class ParsingInterrupt(Exception):
     def __init__(self, message:str="Parsing has been interruped") -> None:
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+# This exception is raised when the evaluation of an expression takes longer than its time limit
+class EvaluationTimeoutException(Exception):
+    def __init__(self, message:str="The evaluation of the expression has timed out") -> None:
+        super().__init__(message)
+
+# This exception is raised when the estimated cost or result size of an expression is over the budgets of the calculator
+class ExpressionTooExpensiveException(Exception):
+    def __init__(self, message:str="The expression is too expensive to evaluate") -> None:
+        super().__init__(message)
+
+# This exception is raised when a calculation that may not run heavy expressions meets one (so it is sent to the heavy queue)
+class HeavyExpressionException(Exception):
+    def __init__(self, message:str="The expression must be evaluated in the heavy queue") -> None:
+        super().__init__(message)
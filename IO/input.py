@@ -1,3 +1,5 @@
+from typing import Iterator, TextIO
+
 from Exceptions.exceptions import EmptyInputString, ParsingInterrupt
 
 
@@ -44,4 +46,38 @@ class ConsoleReader(InputReader):
             raise ParsingInterrupt()
 
         # Return the string
-        return string
\ No newline at end of file
+        return string
+
+class StreamReader(InputReader):
+    """
+    This class represents an input device that reads expressions from a text stream (a file or stdin), one per line
+    """
+    def __init__(self, stream:TextIO) -> None:
+        self.stream = stream
+
+    def input(self, message:str) -> str:
+        # Read the next line (the message is ignored, there is no user to prompt)
+        try:
+            line = self.stream.readline()
+
+        # Catch IO errors
+        except IOError as ioe:
+            print(ioe.__cause__)
+            # Raise parsing interrupt exception
+            raise ParsingInterrupt()
+
+        # If the stream is over, raise parsing interrupt exception
+        if not line:
+            raise ParsingInterrupt()
+
+        return line.rstrip('\r\n')
+
+    def lines(self) -> Iterator[str]:
+        """
+        this method yields the lines of the stream one by one, without the line breaks
+
+        Returns:
+            Iterator[str]: the lines of the stream
+        """
+        for line in self.stream:
+            yield line.rstrip('\r\n')
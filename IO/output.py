@@ -1,18 +1,130 @@
+import json
+import math
+import numbers
+import sys
+from itertools import chain
+from typing import Iterable, Iterator, TextIO
+
+from Algorithms.digits import (STR_BITS_LIMIT, fraction_to_scientific, int_to_bytes, int_to_chunks,
+                               int_to_scientific)
 from Exceptions.exceptions import ParsingInterrupt
 
+# The formats of the numeric results (see format_number)
+DECIMAL = 'decimal'  # All the decimal digits
+SCIENTIFIC = 'scientific'  # The first significant digits and the exponent
+HEX = 'hex'  # The hexadecimal digits
+RAW = 'raw'  # The big-endian two's complement bytes of an integer (the other results are written in decimal)
+NUMBER_FORMATS = (DECIMAL, SCIENTIFIC, HEX, RAW)
+
+
+def format_number(result, number_format:str = DECIMAL, significant_digits:int = 20) -> Iterator[str]:
+    """
+    This function formats a result in one of the number formats, in chunks. Integers of any size are formatted in
+    subquadratic time (without the int-to-str digits limit), fractions are formatted as numerator/denominator, and the
+    results that are not numbers (like approximations) are formatted with str()
+    Args:
+        result (float): the result
+        number_format (str, optional): the number format (one of NUMBER_FORMATS). Defaults to DECIMAL.
+        significant_digits (int, optional): the number of significant digits of the scientific format. Defaults to 20.
+
+    Returns:
+        Iterator[str]: the chunks of the formatted result
+    """
+    if isinstance(result, bool) or not isinstance(result, (numbers.Rational, float)):
+        yield str(result)
+
+    elif isinstance(result, numbers.Integral):
+        n = int(result)
+        if number_format == SCIENTIFIC:
+            yield int_to_scientific(n, significant_digits)
+        elif number_format == HEX:
+            yield hex(n)
+        else:
+            yield from int_to_chunks(n)
+
+    elif isinstance(result, float):
+        if number_format == SCIENTIFIC and math.isfinite(result):
+            yield fraction_to_scientific(*result.as_integer_ratio(), significant_digits)
+        elif number_format == HEX:
+            yield result.hex()
+        else:
+            yield str(result)
+
+    else:
+        numerator, denominator = int(result.numerator), int(result.denominator)
+        if number_format == SCIENTIFIC:
+            yield fraction_to_scientific(numerator, denominator, significant_digits)
+        elif number_format == HEX:
+            yield f"{hex(numerator)}/{hex(denominator)}"
+        else:
+            yield from int_to_chunks(numerator)
+            yield '/'
+            yield from int_to_chunks(denominator)
+
+
+def format_json_result(result, number_format:str = DECIMAL, significant_digits:int = 20) -> Iterator[str]:
+    """
+    This function formats a result as a JSON value, in chunks (see format_number). The integers and the finite floats
+    in the decimal (or raw) format are JSON numbers. The other results (like approximations and fractions, the results
+    in the other number formats, the integers that are too long for the int-to-str digits limit, and the infinities
+    and NaN, which are not valid JSON numbers) are JSON strings of their formatted digits
+    Args:
+        result (float): the result
+        number_format (str, optional): the number format (one of NUMBER_FORMATS). Defaults to DECIMAL.
+        significant_digits (int, optional): the number of significant digits of the scientific format. Defaults to 20.
+
+    Returns:
+        Iterator[str]: the chunks of the JSON value
+    """
+    # The integers of the other numeric backends (like gmpy2's mpz) are JSON numbers as well
+    is_decimal = number_format in (DECIMAL, RAW)
+    if isinstance(result, numbers.Integral) and not isinstance(result, bool) and is_decimal and _fits_str(int(result)):
+        yield str(int(result))
+    elif type(result) == float and is_decimal and math.isfinite(result):
+        yield repr(result)
+    else:
+        # The formatted digits never need to be escaped (the approximations are written with digits, signs and '^')
+        yield '"'
+        yield from format_number(result, DECIMAL if number_format == RAW else number_format, significant_digits)
+        yield '"'
+
 
 class OutputPrinter:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, number_format:str = DECIMAL, significant_digits:int = 20) -> None:
+        if number_format not in NUMBER_FORMATS:
+            raise ValueError(f"Unknown number format '{number_format}'")
+        self.number_format = number_format  # The format of the numeric results (one of NUMBER_FORMATS)
+        self.significant_digits = significant_digits  # The number of significant digits of the scientific format
     
     def output(self, string:str) -> None:
         pass
 
+    def output_chunks(self, chunks:Iterable[str]) -> None:
+        # Output a line that is given in chunks (the devices that can write the chunks one by one override it)
+        self.output(''.join(chunks))
 
-class ConsoleOutputPrinter(OutputPrinter):
-    def __init__(self) -> None:
+    def output_bytes(self, data:bytes) -> None:
         pass
 
+    def output_number(self, prefix:str, result) -> None:
+        """
+        this method outputs a result after a prefix, in the printer's number format (see format_number). The raw
+        format writes only the bytes of an integer result
+
+        Args:
+            prefix (str): the text before the result
+            result (float): the result
+        """
+        if self.number_format == RAW and isinstance(result, numbers.Integral) and not isinstance(result, bool):
+            self.output_bytes(int_to_bytes(int(result)))
+        else:
+            self.output_chunks(chain((prefix,), format_number(result, self.number_format, self.significant_digits)))
+
+
+class ConsoleOutputPrinter(OutputPrinter):
+    def __init__(self, number_format:str = DECIMAL, significant_digits:int = 20) -> None:
+        super().__init__(number_format, significant_digits)
+
     def output(self, string: str) -> None:
         try:
             print(string)
@@ -26,4 +138,132 @@ class ConsoleOutputPrinter(OutputPrinter):
         except RuntimeError as rte:
             print(rte.__cause__)
             # Raise paring interrupt exception
-            raise ParsingInterrupt()
\ No newline at end of file
+            raise ParsingInterrupt()
+
+    def output_chunks(self, chunks:Iterable[str]) -> None:
+        try:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            sys.stdout.write('\n')
+        # Catch IO errors
+        except IOError as ioe:
+            print(ioe.__cause__)
+            # Raise paring interrupt exception
+            raise ParsingInterrupt()
+
+    def output_bytes(self, data:bytes) -> None:
+        try:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+        # Catch IO errors
+        except IOError as ioe:
+            print(ioe.__cause__)
+            # Raise paring interrupt exception
+            raise ParsingInterrupt()
+
+class StreamOutputPrinter(OutputPrinter):
+    """
+    This class represents an output device that writes lines to a text stream (a file or stdout).
+    The lines are buffered and written in large chunks
+    """
+    def __init__(self, stream:TextIO, buffer_size:int = 1 << 16, number_format:str = DECIMAL,
+                 significant_digits:int = 20) -> None:
+        super().__init__(number_format, significant_digits)
+        self.stream = stream
+        self.buffer_size = buffer_size  # The number of characters to collect before writing them
+        self.buffer = []
+        self.buffered = 0
+
+    def output(self, string: str) -> None:
+        self.buffer.append(string)
+        self.buffer.append('\n')
+        self.buffered += len(string) + 1
+
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def output_chunks(self, chunks:Iterable[str]) -> None:
+        # The buffer is flushed between the chunks, so a long line is not collected in memory
+        for chunk in chunks:
+            self.buffer.append(chunk)
+            self.buffered += len(chunk)
+            if self.buffered >= self.buffer_size:
+                self.flush()
+        self.output('')
+
+    def output_bytes(self, data:bytes) -> None:
+        # The bytes are written to the binary buffer of the stream, after the buffered lines
+        self.flush()
+        try:
+            self.stream.buffer.write(data)
+            self.stream.buffer.flush()
+        # Catch IO errors
+        except IOError as ioe:
+            print(ioe.__cause__)
+            # Raise paring interrupt exception
+            raise ParsingInterrupt()
+
+    def flush(self) -> None:
+        """
+        this method writes the buffered lines to the stream
+        """
+        try:
+            self.stream.write(''.join(self.buffer))
+            self.stream.flush()
+        # Catch IO errors
+        except IOError as ioe:
+            print(ioe.__cause__)
+            # Raise paring interrupt exception
+            raise ParsingInterrupt()
+
+        self.buffer.clear()
+        self.buffered = 0
+
+
+class RecordOutputPrinter(StreamOutputPrinter):
+    """
+    This class represents an output device that writes one structured record per evaluated line
+    """
+    def output_result(self, line_number:int, result) -> None:
+        pass
+
+    def output_error(self, line_number:int, error_type:str, message:str) -> None:
+        pass
+
+
+class JsonLinesOutputPrinter(RecordOutputPrinter):
+    """
+    This class represents an output device that writes every record as a JSON object on its own line
+    (see format_json_result: the results that are not JSON numbers, like approximations and infinities, are written as
+    strings). The results in the other number formats, and the integers that are too long for the int-to-str digits
+    limit, are written as strings of their formatted digits (the raw format writes the records in decimal)
+    """
+    def output_result(self, line_number:int, result) -> None:
+        self.output_chunks(chain((f'{{"line": {line_number}, "result": ',),
+                                 format_json_result(result, self.number_format, self.significant_digits), ('}',)))
+
+    def output_error(self, line_number:int, error_type:str, message:str) -> None:
+        self.output(json.dumps({"line": line_number, "error": error_type, "message": message.strip()}, allow_nan=False))
+
+
+class TsvOutputPrinter(RecordOutputPrinter):
+    """
+    This class represents an output device that writes every record as a tab separated line:
+    <line> result <result> or <line> error <exception type> <message>
+    """
+    def output_result(self, line_number:int, result) -> None:
+        number_format = DECIMAL if self.number_format == RAW else self.number_format
+        self.output_chunks(chain((f"{line_number}\tresult\t",),
+                                 format_number(result, number_format, self.significant_digits)))
+
+    def output_error(self, line_number:int, error_type:str, message:str) -> None:
+        # Escape the message, so every record is a single line
+        message = message.strip().replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+        self.output(f"{line_number}\terror\t{error_type}\t{message}")
+
+
+def _fits_str(n:int) -> bool:
+    # Whether str() can convert an integer (a bit is less than a third of a digit, so the estimate is conservative)
+    limit = sys.get_int_max_str_digits() if hasattr(sys, 'get_int_max_str_digits') else 0
+    return n.bit_length() <= STR_BITS_LIMIT or limit == 0 or n.bit_length() < 3 * (limit - 1)
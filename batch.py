@@ -0,0 +1,190 @@
+import argparse
+import sys
+from functools import partial
+from time import perf_counter
+
+from Algorithms.backends import BACKENDS, make_backend
+from cache import ExpressionCache
+from calculator import Calculator, error_message
+from cost_policy import CostPolicy
+from evaluator import StackVMEvaluator
+from IO.input import StreamReader
+from IO.output import DECIMAL, NUMBER_FORMATS, JsonLinesOutputPrinter, RecordOutputPrinter, TsvOutputPrinter
+from lexer import ScannerLexer
+from metrics import Metrics
+from parallel import ParallelBatchCalculator
+from parsing import PrecedenceClimbingParser
+from result_store import PersistentResultCache
+
+# The record formats of the batch output
+OUTPUT_FORMATS = {
+    'jsonl': JsonLinesOutputPrinter,
+    'tsv': TsvOutputPrinter}
+
+
+class BatchCalculator:
+    """
+    This class represents a calculator that evaluates a stream of expressions, one per line.
+    The lines are read lazily and the records are written as soon as they are ready, so the memory is constant
+    """
+
+    def __init__(self, reader:StreamReader, printer:RecordOutputPrinter, calculator:Calculator = None) -> None:
+        self.reader = reader  # Input device
+        self.printer = printer  # Output device
+        self.calculator = calculator if calculator else make_calculator()  # The calculator that evaluates every line
+
+    def run(self) -> tuple[int, int]:
+        """
+        This function evaluates all the lines of the input, and writes a record for each one of them
+        Returns:
+            tuple[int, int]: the number of successful lines and the number of failed lines
+        """
+        succeeded = failed = 0
+
+        metrics = self.calculator.metrics
+
+        for line_number, string in enumerate(self.reader.lines(), start=1):
+            try:
+                result = self.calculator.calculate(string)
+
+                if metrics is None:
+                    self.printer.output_result(line_number, result)
+                else:
+                    start = perf_counter()
+                    self.printer.output_result(line_number, result)
+                    metrics.observe_stage('output', perf_counter() - start)
+                succeeded += 1
+
+            # Catch every exception of the line (the calculation exceptions, the exceptions of results that cannot be
+            # converted to a string, and unexpected ones like RecursionError or ZeroDivisionError), so a single line
+            # cannot abort the run
+            except Exception as error:
+                self.printer.output_error(line_number, type(error).__name__, error_message(error))
+                failed += 1
+
+        self.printer.flush()
+        return succeeded, failed
+
+
+def make_calculator(result_cache_path:str = None, policy:CostPolicy = None, rewrite:bool = False,
+                    approximate:bool = False, backend:str = None, cache_size:int = 0) -> Calculator:
+    """
+    This function builds the calculator of a batch run (it is picklable, so the parallel workers can call it).
+    The calculator lexes with the scanner, parses with the iterative precedence climbing parser and evaluates with the
+    stack VM, so long lines are lexed quickly and deeply nested lines and long flat chains do not exhaust the stack
+    Args:
+        result_cache_path (str, optional): the path of the on-disk results cache. Defaults to None (no cache).
+        policy (CostPolicy, optional): the budgets of the evaluation. Defaults to None (no budgets).
+        rewrite (bool, optional): whether the trees are rewritten into cheaper equivalent trees. Defaults to False.
+        approximate (bool, optional): whether huge results are approximated. Defaults to False.
+        backend (str, optional): the name of the numeric backend (see Algorithms.backends.make_backend). Defaults to
+            None (the native arithmetic).
+        cache_size (int, optional): the number of compiled expressions that are cached (so a repeated line is not
+            lexed and parsed again). Defaults to 0 (no cache).
+
+    Returns:
+        Calculator: the calculator
+    """
+    calculator = Calculator()
+    calculator.lexer = ScannerLexer()
+    calculator.parser = PrecedenceClimbingParser()
+    calculator.evaluator = StackVMEvaluator()
+    if cache_size:
+        calculator.cache = ExpressionCache(cache_size)
+    if result_cache_path:
+        calculator.result_cache = PersistentResultCache(result_cache_path)
+    calculator.policy = policy
+    calculator.rewrite = rewrite
+    calculator.approximate = approximate
+    if backend is not None:
+        calculator.backend = make_backend(backend)
+    return calculator
+
+
+def make_policy(max_cost:float, max_bits:float = 1 << 26, heavy_seconds:float = None) -> CostPolicy:
+    """
+    This function builds the cost policy of a batch run from its largest cost. The thresholds keep the ratios of the
+    default policy: the expressions that are cheaper than a ten-thousandth of the largest cost are evaluated without a
+    time limit, and the ones that are cheaper than a hundredth of it are not sent to the heavy queue
+    Args:
+        max_cost (float): the largest estimated cost that is evaluated at all
+        max_bits (float, optional): the largest result (and intermediate result) that is evaluated at all. Defaults to 2^26.
+        heavy_seconds (float, optional): the time limit of heavy expressions. Defaults to None (the policy's default).
+
+    Returns:
+        CostPolicy: the cost policy
+    """
+    policy = CostPolicy(inline_cost=max_cost / 1e4, time_box_cost=max_cost / 100, heavy_cost=max_cost, max_bits=max_bits)
+    if heavy_seconds is not None:
+        policy.heavy_seconds = heavy_seconds
+    return policy
+
+
+def parse_arguments(arguments:list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluate a file of expressions, one per line")
+    parser.add_argument('input', nargs='?', default='-', help="the input file ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="the output file ('-' for stdout)")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS.keys(), default='jsonl', help="the record format")
+    parser.add_argument('-j', '--workers', type=int, help="evaluate in parallel with this many worker processes")
+    parser.add_argument('--chunk-size', type=int, default=256, help="the number of lines sent to a worker at once")
+    parser.add_argument('--unordered', action='store_true', help="write the records as soon as they are ready")
+    parser.add_argument('--timeout', type=float, help="the time limit of every expression in seconds (parallel mode)")
+    parser.add_argument('--result-cache', help="the path of an on-disk results cache shared across runs")
+    parser.add_argument('--cache-size', type=int, default=0, help="the number of compiled expressions that are cached "
+                                                                  "(per worker in parallel mode)")
+    parser.add_argument('--max-cost', type=float, help="refuse the expressions whose estimated cost is larger than this")
+    parser.add_argument('--max-bits', type=float, default=1 << 26, help="refuse the expressions whose results may be larger than this")
+    parser.add_argument('--metrics', help="write the counters of the run to this file (JSON if it ends with .json, "
+                                          "else Prometheus text; sequential mode)")
+    parser.add_argument('--rewrite', action='store_true', help="rewrite the expressions into cheaper equivalent ones "
+                                                               "(modular powers and factorials, folded constants)")
+    parser.add_argument('--approximate', action='store_true', help="approximate the huge results (sign, mantissa and "
+                                                                   "exponent, with an error bound) instead of computing "
+                                                                   "all their digits")
+    parser.add_argument('--backend', choices=BACKENDS.keys(), help="the numbers of the literals and the operators "
+                                                                   "(gmpy2 falls back to exact if it is not installed)")
+    parser.add_argument('--number-format', choices=NUMBER_FORMATS, default=DECIMAL,
+                        help="the format of the results (raw records are written in decimal)")
+    parser.add_argument('--significant-digits', type=int, default=20, help="the number of digits of the scientific format")
+    parser.add_argument('--heavy-workers', type=int, default=1, help="the number of workers that run heavy expressions (parallel mode)")
+    parser.add_argument('--heavy-timeout', type=float, help="the time limit of every heavy expression in seconds "
+                                                            "(with --max-cost; defaults to 60)")
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+
+    input_stream = sys.stdin if arguments.input == '-' else open(arguments.input, encoding='utf-8')
+    output_stream = sys.stdout if arguments.output == '-' else open(arguments.output, 'w', encoding='utf-8')
+
+    with input_stream, output_stream:
+        reader = StreamReader(input_stream)
+        printer = OUTPUT_FORMATS[arguments.format](output_stream, number_format=arguments.number_format,
+                                                   significant_digits=arguments.significant_digits)
+
+        policy = None
+        if arguments.max_cost:
+            policy = make_policy(arguments.max_cost, arguments.max_bits, arguments.heavy_timeout)
+
+        if arguments.workers:
+            batch = ParallelBatchCalculator(reader, printer, arguments.workers, arguments.chunk_size,
+                                            not arguments.unordered, arguments.timeout,
+                                            partial(make_calculator, arguments.result_cache, policy, arguments.rewrite,
+                                                    arguments.approximate, arguments.backend, arguments.cache_size),
+                                            arguments.heavy_workers, policy.heavy_seconds if policy else None)
+        else:
+            calculator = make_calculator(arguments.result_cache, policy, arguments.rewrite, arguments.approximate,
+                                         arguments.backend, arguments.cache_size)
+            if arguments.metrics:
+                calculator.metrics = Metrics()
+            batch = BatchCalculator(reader, printer, calculator)
+
+        succeeded, failed = batch.run()
+
+    print(f"{succeeded} expressions succeeded, {failed} expressions failed", file=sys.stderr)
+
+    if arguments.metrics and not arguments.workers:
+        with open(arguments.metrics, 'w', encoding='utf-8') as metrics_file:
+            metrics = calculator.metrics
+            metrics_file.write(metrics.to_json() if arguments.metrics.endswith('.json') else metrics.to_prometheus())
@@ -0,0 +1,123 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from Exceptions.exceptions import *
+from tokens import Token
+
+# The exceptions that the lexer and the parser raise for a given input no matter when it is compiled
+DETERMINISTIC_ERRORS = (InvalidSymbolException, EmptyInputString, SyntaxException, InvalidOperandException, OverflowError)
+
+# A letter or an underscore (a string without them has no variables), and a run of whitespaces between two name characters
+NAME_PATTERN = re.compile(r'[A-Za-z_]')
+WHITESPACE_PATTERN = re.compile(r'(?P<separator>(?<=[A-Za-z0-9_])\s+(?=[A-Za-z0-9_]))|\s+')
+
+
+def normalize(string:str) -> str:
+    """
+    This function normalizes an expression string by removing all its whitespaces.
+    The lexer ignores whitespaces (even between the digits of a number), so both strings compile to the same tree.
+    A whitespace that separates a variable name from a name or a number is kept (as a single space), since "x y" is
+    not the variable "xy"
+    Args:
+        string (str): the expression string
+
+    Returns:
+        str: the normalized string
+    """
+    if NAME_PATTERN.search(string) is None:
+        return ''.join(string.split())
+    return WHITESPACE_PATTERN.sub(lambda match: ' ' if match.group('separator') else '', string)
+
+
+def _copy_error(error:Exception) -> Exception:
+    # Copy an exception with its message (the exceptions' constructors build the message, so they are skipped)
+    return type(error).__new__(type(error), *error.args)
+
+
+class ExpressionCache:
+    """
+    This class represents a bounded LRU cache of compiled expressions, keyed by their normalized input strings (and by
+    the variant of the compiler, if it has settings that change the trees).
+    Deterministic lexing and parsing errors are cached as well, so a bad input fails without being lexed again
+    """
+
+    def __init__(self, max_size:int = 4096) -> None:
+        self.max_size = max_size  # The maximum number of cached expressions
+        self.entries = OrderedDict()  # The (tree, string, error) entries, from the least to the most recently used
+        self.lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def compile(self, string:str, compiler:Callable[[str], Token], variant:tuple = None) -> Token:
+        """
+        This function returns the compiled tree of an expression string, and compiles it on a cache miss
+        Args:
+            string (str): the expression string
+            compiler (Callable[[str], Token]): the function that lexes and parses the string
+            variant (tuple, optional): the settings of the compiler that change the tree (the trees of different
+                variants are cached apart). Defaults to None (the default settings).
+
+        Returns:
+            Token: a token node representing the expression
+        """
+        key = normalize(string) if variant is None else (variant, normalize(string))
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            # An error is only reused for the exact same string, since its message points at an index in the string
+            if entry is not None and (entry[2] is None or entry[1] == string):
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry is not None:
+            tree, _, error = entry
+            if error is not None:
+                raise _copy_error(error)
+            return tree
+
+        try:
+            tree = compiler(string)
+        except DETERMINISTIC_ERRORS as error:
+            # Store a copy of the exception without its traceback (which keeps the compiler's frames alive)
+            self._store(key, (None, string, _copy_error(error)))
+            raise
+
+        self._store(key, (tree, string, None))
+        return tree
+
+    def _store(self, key:str, entry:tuple) -> None:
+        # Store an entry, and evict the least recently used entries if the cache is full
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        this method returns the counters of the cache
+
+        Returns:
+            dict: the hits, misses, evictions and current size of the cache
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries)}
+
+    def clear(self) -> None:
+        # Remove all the entries (the counters are kept)
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
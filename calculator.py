@@ -1,8 +1,40 @@
+from time import perf_counter
+
+from Algorithms.approximate import Approximation, evaluate_approximate
+from Algorithms.backends import NumericBackend
+from Algorithms.cost import estimate_nodes
+from Algorithms.factorial import operand_limit
+from Algorithms.profiling import NodeProfile, profile_expression
+from Algorithms.rewrite import rewrite
+from cache import ExpressionCache
+from cost_policy import HEAVY, INLINE, REFUSE, CostPolicy
 from Exceptions.exceptions import *
+from evaluator import CompiledExpression, Evaluator, TreeEvaluator
 from IO.input import ConsoleReader, InputReader
 from IO.output import ConsoleOutputPrinter, OutputPrinter
 from lexer import Lexer
+from metrics import Metrics, count_nodes
 from parsing import Parser, RecursiveDescentParser
+from result_store import PersistentResultCache
+from timeouts import time_limit
+from tokens import Token
+
+# The exceptions that a calculation of a single expression can raise
+CALCULATION_ERRORS = (InvalidSymbolException, EmptyInputString, SyntaxException, InvalidOperandException, OverflowError,
+                      ExpressionTooExpensiveException, EvaluationTimeoutException, UnboundVariableException)
+
+
+def error_message(error:Exception) -> str:
+    """
+    This function builds the message of an error record: the message of the exception, without the '\\0' sentinel of
+    the input string (the lexical and syntax exceptions quote the input string)
+    Args:
+        error (Exception): the exception
+
+    Returns:
+        str: the message of the exception
+    """
+    return str(error).replace('\0', '')
 
 
 class Calculator:
@@ -11,7 +43,215 @@ class Calculator:
         self.reader : InputReader = ConsoleReader() # Input device
         self.lexer : Lexer = Lexer() # Lexer object
         self.parser : Parser = RecursiveDescentParser() # Parser object
+        self.evaluator : Evaluator = TreeEvaluator() # Evaluator object
         self.printer : OutputPrinter = ConsoleOutputPrinter() # Output device
+        self.cache : ExpressionCache = None # Compiled expressions cache (optional)
+        self.result_cache : PersistentResultCache = None # On-disk results cache (optional)
+        self.policy : CostPolicy = None # Budgets of the evaluation (optional)
+        self.metrics : Metrics = None # Counters of the pipeline (optional)
+        self.rewrite : bool = False # Whether the parsed trees are rewritten into cheaper equivalent trees
+        self.approximate : bool = False # Whether huge results are approximated (see Algorithms.approximate)
+        self.backend : NumericBackend = None # Numbers of the literals and the operators (optional, see Algorithms.backends)
+        self.max_factorial_operand : int = None # Largest operand of the factorial operator (optional, see Algorithms.factorial.MAX_OPERAND)
+
+    def compile(self, string:str) -> Token:
+        """
+        This function lexes and parses an expression string
+        Args:
+            string (str): the expression string (without the '\\0' sentinel)
+
+        Returns:
+            Token: a token node representing the expression
+        """
+        if self.cache is not None:
+            return self.cache.compile(string, self._compile, self._compile_variant())
+        return self._compile(string)
+
+    def _compile_variant(self) -> tuple:
+        # The settings that change the compiled tree: the rewrite pass, and the backend (which builds the literals and
+        # decides whether the constants are folded), and the factorial limit of the folded constants. The default
+        # settings have no variant
+        if not self.rewrite and self.backend is None:
+            return None
+        return (self.rewrite, self.backend.name if self.backend is not None else None,
+                self.max_factorial_operand if self.rewrite else None)
+
+    def _compile(self, string:str) -> Token:
+        string += '\0'
+        if self.metrics is None:
+            tokens = self._lex(string)
+            expression_node = self.parser.parse(tokens, string)
+            return self._rewrite(expression_node) if self.rewrite else expression_node
+
+        # Time the lexer and the parser separately
+        start = perf_counter()
+        tokens = self._lex(string)
+        lexed = perf_counter()
+        self.metrics.observe_stage('lex', lexed - start)
+
+        expression_node = self.parser.parse(tokens, string)
+        if self.rewrite:
+            expression_node = self._rewrite(expression_node)
+        self.metrics.observe_stage('parse', perf_counter() - lexed)
+
+        self.metrics.observe_compilation(len(tokens), count_nodes(expression_node))
+        return expression_node
+
+    def _lex(self, string:str) -> list[Token]:
+        # The backend builds the values of the literals
+        if self.backend is None:
+            return self.lexer.lex(string)
+        return self.lexer.lex(string, self.backend.literal)
+
+    def _rewrite(self, expression_node:Token) -> Token:
+        # The constant subtrees are folded with the native arithmetic, so they are only folded without a backend (and
+        # within the factorial limit, like the evaluation)
+        with operand_limit(self.max_factorial_operand):
+            return rewrite(expression_node, fold=self.backend is None)
+
+    def compile_function(self, string:str, codegen:bool = False) -> CompiledExpression:
+        """
+        This function compiles an expression string with variables (e.g. "rate * (x + 1)") into a callable, so the
+        expression is lexed and parsed once and then evaluated with many values of its variables
+        Args:
+            string (str): the expression string (without the '\\0' sentinel)
+            codegen (bool, optional): whether the expression is compiled into a generated Python function (else it
+                runs on the stack VM). Defaults to False.
+
+        Returns:
+            CompiledExpression: the callable expression (see CompiledExpression.__call__ and evaluate_many)
+        """
+        return CompiledExpression(self.compile(string), codegen)
+
+    def calculate(self, string:str, allow_heavy:bool = True) -> float:
+        """
+        This function calculates the result of an expression string.
+        If the calculator has a cost policy, the expression is refused, time-boxed or evaluated by its static estimate
+        Args:
+            string (str): the expression string (without the '\\0' sentinel)
+            allow_heavy (bool, optional): whether heavy expressions are evaluated (else a HeavyExpressionException
+                is raised, so the caller can send them to a heavy queue). Defaults to True.
+
+        Returns:
+            float: the result of the expression
+        """
+        if self.metrics is None:
+            return self._calculate(string, allow_heavy)
+
+        # Count the results and every exception (unexpected ones like ZeroDivisionError as well, since the batch and
+        # the server report them as errors of the line). A heavy expression is counted when it is evaluated later
+        try:
+            result = self._calculate(string, allow_heavy)
+        except HeavyExpressionException:
+            raise
+        except Exception as error:
+            self.metrics.observe_error(type(error).__name__)
+            raise
+
+        self.metrics.observe_result(result)
+        return result
+
+    def _calculate(self, string:str, allow_heavy:bool) -> float:
+        expression_node = self.compile(string)
+
+        # The approximations are cheap, so the budgets of the exact evaluation do not apply
+        if self.policy is None or self.approximate:
+            return self.evaluate(expression_node)
+
+        decision = self.decide(expression_node)
+        if decision == REFUSE:
+            raise ExpressionTooExpensiveException()
+        if decision == HEAVY and not allow_heavy:
+            raise HeavyExpressionException()
+
+        with time_limit(self.policy.time_limit(decision)):
+            return self.evaluate(expression_node)
+
+    def decide(self, expression_node:Token, bindings:dict = None) -> str:
+        """
+        This function decides how to evaluate a compiled expression, from its static estimate
+        Args:
+            expression_node (Token): the root node of the expression
+            bindings (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+
+        Returns:
+            str: the decision of the cost policy (INLINE if the calculator has no policy)
+        """
+        if self.policy is None:
+            return INLINE
+
+        # The largest intermediate result counts, not only the result
+        estimates = estimate_nodes(expression_node, bindings)
+        return self.policy.decide(estimates[id(expression_node)], max(e.bits for e in estimates.values()))
+
+    def evaluate(self, expression_node:Token) -> float:
+        """
+        This function evaluates a compiled expression (through the results cache, if the calculator has one)
+        Args:
+            expression_node (Token): the root node of the expression
+
+        Returns:
+            float: the result of the expression
+        """
+        if self.metrics is None:
+            return self._evaluate(expression_node)
+
+        start = perf_counter()
+        try:
+            return self._evaluate(expression_node)
+        finally:
+            self.metrics.observe_stage('evaluate', perf_counter() - start)
+
+    def _evaluate(self, expression_node:Token) -> float:
+        if self.approximate:
+            return evaluate_approximate(expression_node)
+
+        with operand_limit(self.max_factorial_operand):
+            # The stored results are the native ones with the default factorial limit, so a backend or a factorial
+            # limit bypasses the results cache
+            if self.backend is not None:
+                return self.backend.evaluate(expression_node)
+            if self.result_cache is not None and self.max_factorial_operand is None:
+                return self.result_cache.evaluate(expression_node, self.evaluator)
+            return self.evaluator.evaluate(expression_node)
+
+    def explain(self, string:str, timeout:float = None) -> tuple[NodeProfile, float]:
+        """
+        This function evaluates an expression string and profiles every node of its tree (EXPLAIN ANALYZE)
+        Args:
+            string (str): the expression string (without the '\\0' sentinel)
+            timeout (float, optional): the time limit of the evaluation. Defaults to None (no limit).
+
+        Returns:
+            tuple[NodeProfile, float]: the profile of the root node (see Algorithms.profiling.format_profile), and the
+                result (None if the evaluation raised, the error is in the profile)
+        """
+        expression_node = self.compile(string)
+        with time_limit(timeout), operand_limit(self.max_factorial_operand):
+            return profile_expression(expression_node)
+
+    def output(self, result:float) -> None:
+        """
+        This function outputs the result of an expression with the printer, in the printer's number format
+        Args:
+            result (float): the result of the expression
+        """
+        if self.metrics is None:
+            self._output(result)
+            return
+
+        start = perf_counter()
+        try:
+            self._output(result)
+        finally:
+            self.metrics.observe_stage('output', perf_counter() - start)
+
+    def _output(self, result:float) -> None:
+        if type(result) == Approximation:
+            self.printer.output(f"The result is approximately {result} (relative error at most {result.relative_error:.1e})")
+        else:
+            # Large integers are converted in subquadratic time and written in chunks (see OutputPrinter.output_number)
+            self.printer.output_number("The result is ", result)
 
     def activate(self) -> bool:
         """
@@ -22,11 +262,9 @@ class Calculator:
         """
         # Try getting the input string
         try:
-            string = self.reader.input("Enter the expression string:\n") + '\0'
-            tokens = self.lexer.lex(string)
-            expression_node = self.parser.parse(tokens, string)
-            result = expression_node.evaluate()
-            self.printer.output(f"The result is {result}")
+            string = self.reader.input("Enter the expression string:\n")
+            result = self.calculate(string)
+            self.output(result)
             return True
 
         # Catch input excpetions
@@ -64,12 +302,26 @@ class Calculator:
             # Return False
             return False
 
-        # Catch overflow error
+        # Catch overflow error (the numeric backends report their overflows as OverflowError)
         except OverflowError as ofe:
             # Print the message
             print(ofe)
             # Return False
             return False
+
+        # Catch the exceptions of expressions that are too expensive or too slow
+        except (ExpressionTooExpensiveException, EvaluationTimeoutException) as ee:
+            # Print the message
+            print(ee)
+            # Return False
+            return False
+
+        # Catch unbound variable exception (the calculator has no values for variables)
+        except UnboundVariableException as uve:
+            # Print the message
+            print(uve)
+            # Return False
+            return False
         
         # Catch output exception
         except ParsingInterrupt as pi:
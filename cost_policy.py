@@ -0,0 +1,48 @@
+from Algorithms.cost import Estimate
+
+# The decisions of the cost policy
+INLINE = 'inline'  # Evaluate the expression right away
+TIME_BOX = 'time_box'  # Evaluate the expression with a time limit
+HEAVY = 'heavy'  # Evaluate the expression in the heavy queue, with a longer time limit
+REFUSE = 'refuse'  # Do not evaluate the expression
+
+
+class CostPolicy:
+    """
+    This class represents the budgets that decide how an expression is evaluated, from its static estimate.
+    The costs are in word multiplications (roughly 5ns each), and the sizes are in bits
+    """
+
+    def __init__(self, inline_cost:float = 1e6, time_box_cost:float = 1e8, heavy_cost:float = 1e10,
+                 max_bits:float = 1 << 26, time_box_seconds:float = 1.0, heavy_seconds:float = 60.0) -> None:
+        self.inline_cost = inline_cost  # The largest cost that is evaluated without a time limit
+        self.time_box_cost = time_box_cost  # The largest cost that is evaluated with the short time limit
+        self.heavy_cost = heavy_cost  # The largest cost that is evaluated at all
+        self.max_bits = max_bits  # The largest result (and intermediate result) that is evaluated at all
+        self.time_box_seconds = time_box_seconds  # The time limit of time-boxed expressions
+        self.heavy_seconds = heavy_seconds  # The time limit of heavy expressions
+
+    def decide(self, estimate:Estimate, largest_bits:float = None) -> str:
+        """
+        this method decides how to evaluate an expression
+
+        Args:
+            estimate (Estimate): the estimate of the expression's root node
+            largest_bits (float, optional): the size of the largest intermediate result. Defaults to the result's size.
+
+        Returns:
+            str: INLINE, TIME_BOX, HEAVY or REFUSE
+        """
+        bits = estimate.bits if largest_bits is None else largest_bits
+
+        if bits > self.max_bits or estimate.cost > self.heavy_cost:
+            return REFUSE
+        if estimate.cost > self.time_box_cost:
+            return HEAVY
+        if estimate.cost > self.inline_cost:
+            return TIME_BOX
+        return INLINE
+
+    def time_limit(self, decision:str) -> float:
+        # The time limit of a decision (None for no limit)
+        return {TIME_BOX: self.time_box_seconds, HEAVY: self.heavy_seconds}.get(decision)
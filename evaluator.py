@@ -0,0 +1,170 @@
+from functools import partial
+from typing import Iterable, Iterator
+
+from Algorithms.bounds import evaluate_pruned
+from Algorithms.codegen import FunctionCache, functions
+from Algorithms.hash_consing import evaluate_dag, hash_cons
+from Algorithms.stack_vm import Program, compile_expression, run_program
+from Algorithms.vectorized import evaluate_columns
+from Exceptions.exceptions import UnboundVariableException
+from tokens import Token
+
+
+class Evaluator:
+    """
+    This class represents an evaluator of expression trees
+    """
+    def evaluate(self, expression: Token) -> float:
+        pass
+
+
+class TreeEvaluator(Evaluator):
+    """
+    This class represents an evaluator that walks the expression tree recursively
+    """
+
+    def evaluate(self, expression: Token) -> float:
+        return expression.evaluate()
+
+
+class StackVMEvaluator(Evaluator):
+    """
+    This class represents an evaluator that compiles the expression tree into a postfix program and runs it on a stack VM
+    """
+
+    def compile(self, expression: Token) -> Program:
+        return compile_expression(expression)
+
+    def run(self, program: Program) -> float:
+        return run_program(program)
+
+    def evaluate(self, expression: Token) -> float:
+        return self.run(self.compile(expression))
+
+
+class DagEvaluator(Evaluator):
+    """
+    This class represents an evaluator that interns identical subtrees into shared nodes (common subexpression
+    elimination), and evaluates every unique node only once
+    """
+
+    def __init__(self) -> None:
+        self.deduplicated = 0  # The number of nodes that were deduplicated in the last evaluated expression
+
+    def evaluate(self, expression: Token) -> float:
+        dag, self.deduplicated = hash_cons(expression)
+        return evaluate_dag(dag)
+
+
+class PruningEvaluator(Evaluator):
+    """
+    This class represents an evaluator that bounds every subtree first, and skips the operands of '$' and '&' that
+    cannot be their result (see Algorithms.bounds). With a tolerance, the expensive subtrees whose bounds are narrow
+    enough get an approximate float result
+    """
+
+    def __init__(self, strict: bool = True, tolerance: float = None) -> None:
+        self.strict = strict  # Whether only the subtrees that cannot raise are skipped
+        self.tolerance = tolerance  # The largest relative error of an approximate result (None for exact results)
+        self.pruned = 0  # The number of subtrees that were skipped in the last evaluated expression
+
+    def evaluate(self, expression: Token) -> float:
+        result, self.pruned = evaluate_pruned(expression, strict=self.strict, tolerance=self.tolerance)
+        return result
+
+
+class CodegenEvaluator(Evaluator):
+    """
+    This class represents an evaluator that generates a Python function for the expression (see Algorithms.codegen),
+    and caches the function, so an expression that is evaluated again skips the generation
+    """
+
+    def __init__(self, cache: FunctionCache = None) -> None:
+        self.cache = cache if cache is not None else functions  # The generated functions cache
+
+    def evaluate(self, expression: Token) -> float:
+        function, variables = self.cache.function(expression)
+        if variables:
+            raise UnboundVariableException(variables[0])
+        return function()
+
+
+class CompiledExpression:
+    """
+    This class represents an expression with variables that is compiled once (into a stack VM program, or into a
+    generated Python function), and then called with different values of its variables (without lexing and parsing
+    the expression again)
+    """
+
+    def __init__(self, expression: Token, codegen: bool = False) -> None:
+        self.expression = expression  # The root node of the expression
+
+        # The function that evaluates the expression from the values of its variables (in the order of their appearance)
+        if codegen:
+            self.program = None
+            self.function, self.variables = functions.function(expression)
+        else:
+            self.program = compile_expression(expression)  # The compiled program
+            self.function = partial(_run, self.program)
+            self.variables = tuple(self.program.variables)  # The names of the variables
+
+    def __call__(self, *values, **bindings) -> float:
+        """
+        this method evaluates the expression. The variables are bound by their order of appearance (positional values)
+        or by their names (keyword values). Bindings of names that are not in the expression are ignored
+
+        Returns:
+            float: the result of the expression
+        """
+        if len(values) > len(self.variables):
+            raise TypeError(f"The expression has {len(self.variables)} variables, but {len(values)} values were given")
+
+        # Bind the rest of the variables by their names
+        if len(values) < len(self.variables):
+            values = list(values)
+            for name in self.variables[len(values):]:
+                if name not in bindings:
+                    raise UnboundVariableException(name)
+                values.append(bindings[name])
+
+        return self.function(*values)
+
+    def evaluate_many(self, rows: Iterable[dict]) -> Iterator[float]:
+        """
+        this method evaluates the expression for every row of bindings, lazily
+
+        Args:
+            rows (Iterable[dict]): the values of the variables of every evaluation, by name
+
+        Returns:
+            Iterator[float]: the results, in the order of the rows
+        """
+        variables = self.variables
+        function = self.function
+        for row in rows:
+            try:
+                values = [row[name] for name in variables]
+            except KeyError as error:
+                raise UnboundVariableException(error.args[0]) from None
+            yield function(*values)
+
+    def evaluate_columns(self, columns: dict = None, size: int = None) -> tuple:
+        """
+        this method evaluates the expression over whole columns of values with NumPy (see
+        Algorithms.vectorized.evaluate_columns). The rows whose evaluation would raise are marked in an error mask
+
+        Args:
+            columns (dict, optional): the values of the variables, by name. Defaults to None (no variables).
+            size (int, optional): the number of rows, if the expression has no variables. Defaults to None.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: the float results of the rows (NaN where they fail), and the error mask
+        """
+        return evaluate_columns(self.expression, columns, size)
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression(variables={self.variables})"
+
+
+def _run(program: Program, *values) -> float:
+    return run_program(program, values)
@@ -0,0 +1,26 @@
+import argparse
+import json
+
+from Algorithms.profiling import format_profile, operator_summary
+from calculator import Calculator
+
+
+def parse_arguments(arguments:list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluate an expression and show the time spent in every node")
+    parser.add_argument('expression', help="the expression string")
+    parser.add_argument('--timeout', type=float, help="stop the evaluation after this many seconds")
+    parser.add_argument('--json', action='store_true', help="print the profile as JSON")
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    profile, result = Calculator().explain(arguments.expression, arguments.timeout)
+
+    if arguments.json:
+        print(json.dumps({'profile': profile.to_dict(), 'operators': operator_summary(profile)}, indent=2))
+    else:
+        print(format_profile(profile))
+        print()
+        for name, entry in operator_summary(profile).items():
+            print(f"{name}: {entry['calls']} nodes, {entry['seconds'] * 1e3:.2f} ms")
@@ -1,9 +1,25 @@
-from Algorithms.lexing import lex_input_string
+from Algorithms.lexing import CompactTokenStream, lex_input_string, native_literal, scan_input_string
 from tokens import Token
 
 
 class Lexer:
-    # This class represents a Lexer object
+    # This class represents a Lexer object. The literal function builds the values of the numbers (see Algorithms.backends)
     
-    def lex(self, string:str) -> list[Token]:
-        return lex_input_string(string)
\ No newline at end of file
+    def lex(self, string:str, literal=native_literal) -> list[Token]:
+        return lex_input_string(string, literal)
+
+
+class ScannerLexer(Lexer):
+    # This class represents a Lexer object that scans the input with a single compiled pattern into a compact (array-backed)
+    # token stream. It is several times faster than the Lexer on long inputs
+
+    def lex(self, string:str, literal=native_literal) -> list[Token]:
+        return scan_input_string(string, literal=literal)
+
+
+class CompactLexer(Lexer):
+    # This class represents a Lexer object that scans the input into a compact (array-backed) token stream (the same stream
+    # as the ScannerLexer)
+
+    def lex(self, string:str, literal=native_literal) -> list[Token]:
+        return scan_input_string(string, CompactTokenStream, literal)
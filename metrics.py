@@ -0,0 +1,177 @@
+import json
+import math
+import numbers
+import threading
+from bisect import bisect_left
+
+from Algorithms.approximate import Approximation
+from tokens import Token
+
+# The stages of the calculation pipeline
+STAGES = ('lex', 'parse', 'evaluate', 'output')
+
+# The upper bounds of the buckets of the stage timers (in seconds) and of the result sizes (in bits)
+SECONDS_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0, math.inf)
+BITS_BUCKETS = (8, 32, 128, 512, 2048, 8192, 32768, 131072, 524288, math.inf)
+
+
+class Histogram:
+    # This class represents a histogram of observations, with the total and the number of the observations
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets:tuple) -> None:
+        self.buckets = buckets  # The upper bounds of the buckets (the last one is inf)
+        self.counts = [0] * len(buckets)  # The number of observations in every bucket (not cumulative)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value:float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        return {'buckets': {_format_bound(bound): count for bound, count in zip(self.buckets, self.counts)},
+                'sum': self.sum, 'count': self.count}
+
+
+class Metrics:
+    """
+    This class represents the in-process counters of a calculator: the time spent in every stage of the pipeline,
+    the numbers of tokens and nodes, a histogram of the results' sizes in bits, and the number of every exception type.
+    A calculator without metrics skips all the measurements (a single None check per stage)
+    """
+
+    def __init__(self) -> None:
+        self.stages = {stage: Histogram(SECONDS_BUCKETS) for stage in STAGES}  # The timers of the stages
+        self.result_bits = Histogram(BITS_BUCKETS)  # The sizes of the results
+        self.calculations = 0  # The number of calculated expressions
+        self.tokens = 0  # The total number of lexed tokens
+        self.nodes = 0  # The total number of parsed nodes
+        self.errors = {}  # The number of every exception type
+        self.lock = threading.Lock()
+
+    def observe_stage(self, stage:str, seconds:float) -> None:
+        with self.lock:
+            self.stages[stage].observe(seconds)
+
+    def observe_compilation(self, tokens:int, nodes:int) -> None:
+        with self.lock:
+            self.tokens += tokens
+            self.nodes += nodes
+
+    def observe_result(self, result:float) -> None:
+        with self.lock:
+            self.calculations += 1
+            self.result_bits.observe(result_bits(result))
+
+    def observe_error(self, error_type:str) -> None:
+        with self.lock:
+            self.calculations += 1
+            self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def snapshot(self) -> dict:
+        """
+        this method returns a copy of all the counters
+
+        Returns:
+            dict: the counters, by their names
+        """
+        with self.lock:
+            return {'calculations': self.calculations,
+                    'tokens': self.tokens,
+                    'nodes': self.nodes,
+                    'stages': {stage: histogram.snapshot() for stage, histogram in self.stages.items()},
+                    'result_bits': self.result_bits.snapshot(),
+                    'errors': dict(self.errors)}
+
+    def to_json(self) -> str:
+        # Dump the counters as a JSON object
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self) -> str:
+        """
+        this method dumps the counters in the Prometheus text exposition format
+
+        Returns:
+            str: the counters' lines
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        lines += ["# HELP calculator_calculations_total Number of calculated expressions",
+                  "# TYPE calculator_calculations_total counter",
+                  f"calculator_calculations_total {snapshot['calculations']}",
+                  "# HELP calculator_tokens_total Number of lexed tokens",
+                  "# TYPE calculator_tokens_total counter",
+                  f"calculator_tokens_total {snapshot['tokens']}",
+                  "# HELP calculator_nodes_total Number of parsed nodes",
+                  "# TYPE calculator_nodes_total counter",
+                  f"calculator_nodes_total {snapshot['nodes']}"]
+
+        lines += ["# HELP calculator_stage_seconds Time spent in every stage of the pipeline",
+                  "# TYPE calculator_stage_seconds histogram"]
+        for stage, histogram in snapshot['stages'].items():
+            lines += _histogram_lines('calculator_stage_seconds', histogram, f'stage="{stage}",')
+
+        lines += ["# HELP calculator_result_bits Size of the results in bits",
+                  "# TYPE calculator_result_bits histogram"]
+        lines += _histogram_lines('calculator_result_bits', snapshot['result_bits'], '')
+
+        lines += ["# HELP calculator_errors_total Number of failed calculations by exception type",
+                  "# TYPE calculator_errors_total counter"]
+        for name, count in sorted(snapshot['errors'].items()):
+            lines.append(f'calculator_errors_total{{type="{name}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def count_nodes(expression:Token) -> int:
+    """
+    This function counts the nodes of an expression, with an explicit stack
+    Args:
+        expression (Token): the root node of the expression
+
+    Returns:
+        int: the number of nodes
+    """
+    count = 0
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def result_bits(result:float) -> int:
+    # The size of a result in bits (the binary exponent of a float, or of an approximation)
+    if type(result) == int:
+        return abs(result).bit_length()
+    # The integers and fractions of the numeric backends (see Algorithms.backends)
+    if isinstance(result, numbers.Rational):
+        return max(0, abs(result.numerator).bit_length() - result.denominator.bit_length() + 1)
+    if type(result) == Approximation:
+        return max(0, math.ceil(result.log10 * math.log2(10)))
+    if math.isfinite(result):
+        return max(0, math.frexp(result)[1])
+    return 1024
+
+
+def _format_bound(bound:float) -> str:
+    return '+Inf' if bound == math.inf else repr(bound)
+
+
+def _histogram_lines(name:str, histogram:dict, labels:str) -> list[str]:
+    # The lines of a histogram (Prometheus buckets are cumulative)
+    lines = []
+    total = 0
+    for bound, count in histogram['buckets'].items():
+        total += count
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {total}')
+
+    labels = labels.rstrip(',')
+    labels = f'{{{labels}}}' if labels else ''
+    lines.append(f"{name}_sum{labels} {histogram['sum']}")
+    lines.append(f"{name}_count{labels} {histogram['count']}")
+    return lines
@@ -0,0 +1,244 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Callable
+
+from calculator import Calculator, error_message
+from Exceptions.exceptions import EvaluationTimeoutException, HeavyExpressionException
+from IO.input import StreamReader
+from IO.output import RecordOutputPrinter
+from timeouts import time_limit
+
+# Extra time (in seconds) a chunk gets, beyond the time limits of its expressions, before its worker is killed
+KILL_GRACE_PERIOD = 1.0
+
+_calculator = None  # The calculator of the worker process
+
+
+def _initialize_worker(calculator_factory:Callable[[], Calculator]) -> None:
+    # Build the calculator of the worker process once
+    global _calculator
+    _calculator = calculator_factory()
+
+
+def _evaluate_chunk(chunk:list[tuple[int, str]], timeout:float, heavy:bool = False) -> list[tuple]:
+    """
+    This function evaluates a chunk of lines in a worker process
+    Args:
+        chunk (list[tuple[int, str]]): the (line number, expression) pairs of the chunk
+        timeout (float): the time limit of every expression (None for no limit)
+        heavy (bool, optional): whether the chunk is from the heavy queue. Defaults to False.
+
+    Returns:
+        list[tuple]: a (line number, True, result) or (line number, False, (error type, message)) record per line,
+            or a (line number, None, expression) record for a heavy expression outside the heavy queue
+    """
+    records = []
+
+    for line_number, string in chunk:
+        try:
+            with time_limit(timeout):
+                result = _calculator.calculate(string, allow_heavy=heavy)
+            records.append((line_number, True, result))
+
+        # Heavy expressions are sent back, so they are evaluated in the heavy queue
+        except HeavyExpressionException:
+            records.append((line_number, None, string))
+
+        # The exceptions are sent back as (type, message) pairs, since they cannot all be pickled. Every exception is
+        # caught (unexpected ones like RecursionError or ZeroDivisionError as well), so it does not fail the chunk
+        except Exception as error:
+            records.append((line_number, False, (type(error).__name__, error_message(error))))
+
+    return records
+
+
+class _Task:
+    # This class represents a chunk of lines that is submitted to the pool
+    __slots__ = ('chunk', 'deadline', 'crashes', 'heavy')
+
+    def __init__(self, chunk:list[tuple[int, str]], crashes:int = 0, heavy:bool = False) -> None:
+        self.chunk = chunk
+        self.deadline = None  # The time at which the chunk's worker is killed
+        self.crashes = crashes  # The number of times the pool broke while the chunk was running
+        self.heavy = heavy  # Whether the chunk is a heavy expression
+
+
+class ParallelBatchCalculator:
+    """
+    This class represents a batch calculator that spreads chunks of lines across a pool of worker processes.
+
+    Every expression gets a soft time limit inside its worker. A chunk that overruns the sum of its limits (a worker
+    stuck inside a single long C call) gets its worker killed: the pool is replaced, the other running chunks are
+    resubmitted, and the overdue chunk is split into single lines, so only the runaway line ends with a timeout error.
+
+    If the calculators have a cost policy, the expressions it marks as heavy are sent back by the workers, and run one
+    by one in a heavy queue that never takes more than heavy_workers workers, so they do not hold up the cheap lines
+    """
+
+    def __init__(self, reader:StreamReader, printer:RecordOutputPrinter, workers:int = None, chunk_size:int = 256,
+                 ordered:bool = True, timeout:float = None, calculator_factory:Callable[[], Calculator] = Calculator,
+                 heavy_workers:int = 1, heavy_timeout:float = None) -> None:
+        self.reader = reader  # Input device
+        self.printer = printer  # Output device
+        self.workers = workers if workers else os.cpu_count()  # The number of worker processes
+        self.chunk_size = chunk_size  # The number of lines in every chunk
+        self.ordered = ordered  # Whether the records are written in input order
+        self.timeout = timeout  # The time limit of every expression in seconds (None for no limit)
+        self.calculator_factory = calculator_factory  # Builds the calculator of every worker (must be picklable)
+        self.heavy_workers = max(1, heavy_workers)  # The largest number of workers that run heavy expressions at once
+        self.heavy_timeout = heavy_timeout  # The time limit of every heavy expression (None for no limit)
+
+    def run(self) -> tuple[int, int]:
+        """
+        This function evaluates all the lines of the input, and writes a record for each one of them
+        Returns:
+            tuple[int, int]: the number of successful lines and the number of failed lines
+        """
+        self.succeeded = self.failed = 0
+        self._buffer = {}  # The records that wait for the records of earlier lines (in ordered mode)
+        self._next_line = 1  # The line of the next record to write (in ordered mode)
+        self._retries = deque()  # The tasks that wait to be resubmitted
+        self._heavy = deque()  # The heavy expressions that wait to be submitted
+
+        lines = enumerate(self.reader.lines(), start=1)
+        exhausted = False
+        pending = {}  # The running tasks, by their futures
+        buffer_limit = 4 * self.workers * self.chunk_size
+        executor = self._new_executor()
+
+        try:
+            while True:
+                # Keep one task per worker running (so a task runs as soon as it is submitted). New chunks wait while
+                # too many records wait for a slow chunk
+                while len(pending) < self.workers:
+                    if self._retries:
+                        task = self._retries.popleft()
+                    elif self._heavy and sum(running.heavy for running in pending.values()) < self.heavy_workers:
+                        task = self._heavy.popleft()
+                    elif not exhausted and len(self._buffer) < buffer_limit:
+                        chunk = list(islice(lines, self.chunk_size))
+                        if not chunk:
+                            exhausted = True
+                            continue
+                        task = _Task(chunk)
+                    else:
+                        break
+
+                    timeout = self.heavy_timeout if task.heavy else self.timeout
+                    if timeout:
+                        task.deadline = time.monotonic() + timeout * len(task.chunk) + KILL_GRACE_PERIOD
+                    pending[executor.submit(_evaluate_chunk, task.chunk, timeout, task.heavy)] = task
+
+                # If there are no running tasks, all the lines were evaluated
+                if not pending:
+                    break
+
+                done, _ = wait(pending, timeout=self._time_to_deadline(pending.values()), return_when=FIRST_COMPLETED)
+
+                broken = False
+                for future in done:
+                    task = pending.pop(future)
+                    try:
+                        self._write_records(future.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        self._crashed(task)
+
+                # If a worker died, the pool is broken and all its running tasks are lost
+                if broken:
+                    for task in pending.values():
+                        self._crashed(task)
+
+                # Else, kill the workers if some tasks are overdue
+                else:
+                    now = time.monotonic()
+                    overdue = [task for task in pending.values() if task.deadline is not None and task.deadline <= now]
+                    if not overdue:
+                        continue
+
+                    # The overdue tasks are split (or time out), the rest are resubmitted as they are
+                    for task in pending.values():
+                        if task in overdue:
+                            self._timed_out(task)
+                        else:
+                            self._retries.append(task)
+                    self._kill(executor)
+
+                pending.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = self._new_executor()
+
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.printer.flush()
+
+        return self.succeeded, self.failed
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, initializer=_initialize_worker, initargs=(self.calculator_factory,))
+
+    def _kill(self, executor:ProcessPoolExecutor) -> None:
+        # Terminate the worker processes (the executor has no public API to stop a running task)
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+
+    def _time_to_deadline(self, tasks) -> float:
+        # The time until the earliest deadline of the running tasks (None if there are no deadlines)
+        deadlines = [task.deadline for task in tasks if task.deadline is not None]
+        return max(0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    def _timed_out(self, task:_Task) -> None:
+        # Split a chunk into single lines, to find the line that timed out. If it is a single line, it has timed out
+        if len(task.chunk) > 1:
+            self._retries.extend(_Task([line]) for line in task.chunk)
+        else:
+            line_number, _ = task.chunk[0]
+            self._write_records([(line_number, False, ('EvaluationTimeoutException', str(EvaluationTimeoutException())))])
+
+    def _crashed(self, task:_Task) -> None:
+        # Split a chunk into single lines, to find the line that crashed the worker. A single line gets one more chance
+        if len(task.chunk) > 1:
+            self._retries.extend(_Task([line]) for line in task.chunk)
+        elif task.crashes == 0:
+            self._retries.append(_Task(task.chunk, crashes=1, heavy=task.heavy))
+        else:
+            line_number, _ = task.chunk[0]
+            self._write_records([(line_number, False, ('BrokenProcessPool', "The worker process evaluating the expression has died"))])
+
+    def _write_records(self, records:list[tuple]) -> None:
+        # Send the heavy expressions to the heavy queue
+        if any(record[1] is None for record in records):
+            self._heavy.extend(_Task([(line_number, string)], heavy=True) for line_number, succeeded, string in records if succeeded is None)
+            records = [record for record in records if record[1] is not None]
+
+        # Write the records (in ordered mode, keep them until the records of all the earlier lines were written)
+        if not self.ordered:
+            for record in records:
+                self._write_record(record)
+            return
+
+        for record in records:
+            self._buffer[record[0]] = record
+
+        while self._next_line in self._buffer:
+            self._write_record(self._buffer.pop(self._next_line))
+            self._next_line += 1
+
+    def _write_record(self, record:tuple) -> None:
+        line_number, succeeded, value = record
+
+        if succeeded:
+            try:
+                self.printer.output_result(line_number, value)
+                self.succeeded += 1
+                return
+            # Catch the exceptions of results that cannot be converted to a string
+            except ValueError as error:
+                value = (type(error).__name__, str(error))
+
+        self.printer.output_error(line_number, *value)
+        self.failed += 1
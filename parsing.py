@@ -1,4 +1,5 @@
 from Algorithms.lexing import Token, TokenStream
+from Algorithms.precedence_climbing import parse_expression_iteratively
 from Algorithms.recursive_descent import parse_expression
 
 
@@ -17,3 +18,12 @@ class RecursiveDescentParser(Parser):
     
     def parse(self, token_stream: TokenStream, string: str) -> Token:
         return parse_expression(token_stream, string)
+
+
+class PrecedenceClimbingParser(Parser):
+    """
+    This class represents a non-recursive, table-driven precedence climbing parser
+    """
+
+    def parse(self, token_stream: TokenStream, string: str) -> Token:
+        return parse_expression_iteratively(token_stream, string)
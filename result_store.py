@@ -0,0 +1,212 @@
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from hashlib import sha256
+
+import tokens
+from Algorithms import canonical, digits, factorial
+from Config import constants
+from Algorithms.canonical import expression_digests
+from evaluator import Evaluator
+from Exceptions.exceptions import InvalidOperandException
+from tokens import Token
+
+# The modules that define the semantics of the operators and the keys of their results. A change in any of them
+# invalidates the stored results
+SEMANTIC_MODULES = [tokens, digits, factorial, canonical, constants]
+
+# The evaluation exceptions that are stored (they are raised for a given tree no matter when it is evaluated)
+STORED_ERRORS = {error.__name__: error for error in (InvalidOperandException, OverflowError)}
+
+# The prefixes of the keys of results and of errors
+RESULT_PREFIX = b'r'
+ERROR_PREFIX = b'e'
+
+TOUCH_INTERVAL = 60.0  # A hit only refreshes the last-used time of an entry that is older than this (in seconds)
+
+
+def semantics_version() -> str:
+    """
+    This function computes the version of the operators' semantics, as a hash of the source of their modules
+    Returns:
+        str: the version string
+    """
+    digest = sha256()
+    for module in SEMANTIC_MODULES:
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()
+
+
+class PersistentResultCache:
+    """
+    This class represents an on-disk (SQLite) cache of expression results, shared across runs and processes.
+
+    Results are keyed by the canonical digest of the tree, so commutative operands in any order share an entry (the
+    operands of '$' and '&' are not sorted, since their order decides a tie, so a cached result is always the result of
+    the evaluation). Errors depend on the evaluation order, so they are keyed by the ordered digest. Every process and thread opens its own connection,
+    and the least recently used entries are evicted once the stored values pass max_bytes
+    """
+
+    def __init__(self, path:str, max_bytes:int = 1 << 30, version:str = None) -> None:
+        self.path = path  # The path of the database file
+        self.max_bytes = max_bytes  # The maximum total size of the stored values
+        self.version = version if version else semantics_version()  # The version of the stored results
+        self.local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Open a connection for the current process and thread (connections cannot be shared after a fork)
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None and self.local.pid == os.getpid():
+            return connection
+
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+        with _transaction(connection):
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+            connection.execute("CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, kind TEXT, value TEXT, size INTEGER, used REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+            # If the results were stored with other semantics, drop them
+            row = connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != self.version:
+                connection.execute("DELETE FROM results")
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?), ('size', 0)", (self.version,))
+
+        self.local.connection = connection
+        self.local.pid = os.getpid()
+        return connection
+
+    def evaluate(self, expression:Token, evaluator:Evaluator) -> float:
+        """
+        This function returns the stored result of an expression, and evaluates (and stores) it on a miss
+        Args:
+            expression (Token): the root node of the expression
+            evaluator (Evaluator): the evaluator to use on a miss
+
+        Returns:
+            float: the result of the expression
+        """
+        ordered_key, canonical_key = expression_digests(expression)
+
+        entry = self.lookup(RESULT_PREFIX + canonical_key, ERROR_PREFIX + ordered_key)
+        if entry is not None:
+            kind, value = entry
+            if kind == 'error':
+                name, message = value
+                raise STORED_ERRORS[name](message)
+            return value
+
+        try:
+            result = evaluator.evaluate(expression)
+        except tuple(STORED_ERRORS.values()) as error:
+            self.store(ERROR_PREFIX + ordered_key, 'error', (type(error).__name__, str(error)))
+            raise
+
+        self.store(RESULT_PREFIX + canonical_key, 'result', result)
+        return result
+
+    def lookup(self, result_key:bytes, error_key:bytes) -> tuple:
+        """
+        this method looks for a stored result or a stored error
+
+        Args:
+            result_key (bytes): the key of the result (the result prefix and the canonical digest)
+            error_key (bytes): the key of the error (the error prefix and the ordered digest)
+
+        Returns:
+            tuple: a ('result', value) or ('error', (error type, message)) pair, or None on a miss
+        """
+        connection = self._connection()
+        rows = connection.execute("SELECT key, kind, value, used FROM results WHERE key IN (?, ?)",
+                                  (result_key, error_key)).fetchall()
+
+        for key, kind, value, used in rows:
+            # Refresh the last-used time (rarely, so hits do not turn into writes)
+            now = time.time()
+            if now - used > TOUCH_INTERVAL:
+                connection.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+
+            return _decode(kind, value)
+
+        return None
+
+    def store(self, key:bytes, kind:str, value) -> None:
+        """
+        this method stores a result or an error, and evicts the least recently used entries if the cache is too large
+
+        Args:
+            key (bytes): the key of the entry
+            kind (str): 'result' or 'error'
+            value: the result, or the (error type, message) pair
+        """
+        kind, encoded = _encode(kind, value)
+        connection = self._connection()
+
+        with _transaction(connection):
+            inserted = connection.execute("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?)",
+                                          (key, kind, encoded, len(encoded), time.time())).rowcount
+            if not inserted:
+                return
+
+            size = connection.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()[0] + len(encoded)
+
+            # Evict the least recently used entries until the cache is back under 90% of its limit
+            if size > self.max_bytes:
+                while size > self.max_bytes * 0.9:
+                    rows = connection.execute("SELECT key, size FROM results ORDER BY used LIMIT 256").fetchall()
+                    if not rows:
+                        break
+                    for old_key, old_size in rows:
+                        connection.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                        size -= old_size
+                        if size <= self.max_bytes * 0.9:
+                            break
+
+            connection.execute("UPDATE meta SET value = ? WHERE name = 'size'", (size,))
+
+    def size(self) -> int:
+        # The total size of the stored values in bytes
+        return self._connection().execute("SELECT value FROM meta WHERE name = 'size'").fetchone()[0]
+
+    def clear(self) -> None:
+        # Remove all the stored entries
+        connection = self._connection()
+        with _transaction(connection):
+            connection.execute("DELETE FROM results")
+            connection.execute("UPDATE meta SET value = 0 WHERE name = 'size'")
+
+
+class _transaction:
+    # Context manager of an immediate (write-locking) transaction
+    def __init__(self, connection:sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __enter__(self) -> None:
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exception_type, exception, traceback) -> None:
+        self.connection.execute("COMMIT" if exception_type is None else "ROLLBACK")
+
+
+def _encode(kind:str, value) -> tuple[str, str]:
+    # Encode a result or an error as a (kind, text) pair. Integers are stored in hexadecimal (no decimal string limit)
+    if kind == 'error':
+        name, message = value
+        return 'error', name + '\n' + message
+    if type(value) == float:
+        return 'float', value.hex()
+    return 'int', format(value, 'x')
+
+
+def _decode(kind:str, text:str) -> tuple:
+    # Decode a stored (kind, text) pair
+    if kind == 'error':
+        name, message = text.split('\n', 1)
+        return 'error', (name, message)
+    if kind == 'float':
+        return 'result', float.fromhex(text)
+    return 'result', int(text, 16)
@@ -0,0 +1,444 @@
+import argparse
+import asyncio
+import json
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable
+
+from cache import ExpressionCache
+from calculator import Calculator, error_message
+from cost_policy import INLINE, REFUSE, CostPolicy
+from evaluator import StackVMEvaluator, TreeEvaluator
+from Exceptions.exceptions import EvaluationTimeoutException, ExpressionTooExpensiveException
+from IO.output import format_json_result
+from lexer import Lexer, ScannerLexer
+from metrics import Metrics
+from parallel import KILL_GRACE_PERIOD, _evaluate_chunk, _initialize_worker
+from parsing import PrecedenceClimbingParser, RecursiveDescentParser
+
+# The HTTP status of every error type (the other errors are invalid expressions)
+HTTP_ERROR_STATUSES = {
+    'EvaluationTimeoutException': 504,
+    'BrokenProcessPool': 500}
+
+# The largest HTTP request body in bytes
+MAX_HTTP_BODY = 1 << 20
+
+
+class CalculatorServer:
+    """
+    This class represents an asyncio server that evaluates expressions for remote clients.
+
+    The TCP protocol is line based: every line is an expression, and the answer is a JSON line with the number of the
+    line on the connection and its result or error (like the JSON lines batch output). The answers are sent in order.
+    The optional HTTP endpoint answers a POST /evaluate request with a {"expression": ...} body.
+
+    Cheap expressions (by the calculator's cost policy) are evaluated in the event loop, and the others are sent to a
+    pool of worker processes. Every connection has a limit on its requests in flight (beyond it, its lines are not read,
+    so the client is pushed back by TCP), and all the connections share a global limit
+    """
+
+    def __init__(self, calculator_factory:Callable[[], Calculator] = Calculator, workers:int = None,
+                 max_requests:int = 64, max_connection_requests:int = 8, timeout:float = 10.0) -> None:
+        self.calculator_factory = calculator_factory  # Builds the calculators of the server and the workers (must be picklable)
+        self.workers = workers  # The number of worker processes (None for the number of CPUs)
+        self.max_requests = max_requests  # The largest number of requests in flight
+        self.max_connection_requests = max_connection_requests  # The largest number of requests in flight per connection
+        self.timeout = timeout  # The time limit of every request in seconds
+
+        # The calculator of the event loop routes the expressions, so it always has a cost policy. It lexes with the
+        # scanner, parses with the iterative parser and evaluates with the stack VM, so a long line is lexed quickly and
+        # a deeply nested line or a long flat chain does not exhaust the stack of the event loop
+        self.calculator = calculator_factory()
+        if self.calculator.policy is None:
+            self.calculator.policy = CostPolicy()
+        if type(self.calculator.lexer) == Lexer:
+            self.calculator.lexer = ScannerLexer()
+        if type(self.calculator.parser) == RecursiveDescentParser:
+            self.calculator.parser = PrecedenceClimbingParser()
+        if type(self.calculator.evaluator) == TreeEvaluator:
+            self.calculator.evaluator = StackVMEvaluator()
+
+        self.servers = []  # The listening servers
+        self.requests = set()  # The requests in flight
+        self.handlers = set()  # The tasks of the open connections (line protocol and HTTP)
+        self.connections = {}  # The answers queues of the open connections, by their writers (None for HTTP)
+        self.draining = False
+        self.pool = None
+        self.slots = None
+
+    async def start(self, host:str = '127.0.0.1', port:int = 0, http_port:int = None) -> None:
+        """
+        this method starts listening (port 0 picks a free port, see addresses)
+
+        Args:
+            host (str, optional): the address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): the port of the line protocol. Defaults to 0.
+            http_port (int, optional): the port of the HTTP endpoint. Defaults to None (no HTTP endpoint).
+        """
+        self.slots = asyncio.Semaphore(self.max_requests)
+        self.pool = self._new_pool()
+
+        self.servers.append(await asyncio.start_server(self._handle_connection, host, port))
+        if http_port is not None:
+            self.servers.append(await asyncio.start_server(self._handle_http, host, http_port))
+
+    @property
+    def addresses(self) -> list[tuple]:
+        # The (host, port) addresses of the line protocol and the HTTP endpoint
+        return [server.sockets[0].getsockname()[:2] for server in self.servers]
+
+    async def close(self, drain_timeout:float = 10.0) -> None:
+        """
+        this method stops the server gracefully: it stops accepting connections and reading requests (an HTTP request
+        gets a 503 answer), waits for the requests in flight to be answered, and then closes the connections and the
+        worker processes
+
+        Args:
+            drain_timeout (float, optional): the time to wait for the requests in flight. Defaults to 10.0.
+        """
+        self.draining = True
+        for server in self.servers:
+            server.close()
+
+        if self.requests:
+            await asyncio.wait(list(self.requests), timeout=drain_timeout)
+        for request in list(self.requests):
+            request.cancel()
+
+        # Wait for the connections to send their last answers
+        queues = [asyncio.create_task(answers.join()) for answers in self.connections.values() if answers is not None]
+        if queues:
+            await asyncio.wait(queues, timeout=drain_timeout)
+        for writer in list(self.connections):
+            writer.close()
+
+        # Stop the connection handlers that are still running (like a client that does not read its answers), so no
+        # task is left when the event loop stops
+        handlers = list(self.handlers)
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+        for server in self.servers:
+            await server.wait_closed()
+
+        # The workers of the requests that were cancelled may still be running them
+        self._kill(self.pool)
+
+    async def evaluate(self, string:str) -> tuple:
+        """
+        This function evaluates an expression in the event loop or in a worker process
+        Args:
+            string (str): the expression string
+
+        Returns:
+            tuple: a (True, result) or (False, (error type, message)) pair
+        """
+        succeeded, value = await self._evaluate(string)
+
+        # Count the results and the exceptions (of the workers as well)
+        metrics = self.calculator.metrics
+        if metrics is not None:
+            if succeeded:
+                metrics.observe_result(value)
+            else:
+                metrics.observe_error(value[0])
+
+        return succeeded, value
+
+    async def _evaluate(self, string:str) -> tuple:
+        async with self.slots:
+            try:
+                expression_node = self.calculator.compile(string)
+                decision = self.calculator.decide(expression_node)
+                if decision == REFUSE:
+                    raise ExpressionTooExpensiveException()
+                if decision == INLINE:
+                    return True, self.calculator.evaluate(expression_node)
+
+            # Every exception is an error answer (unexpected ones like ZeroDivisionError as well)
+            except Exception as error:
+                return False, (type(error).__name__, error_message(error))
+
+            # The worker gets the same time limit, so it stops running the expression on its own. If it is stuck inside
+            # a single C call, it is killed after a grace period (like the workers of the parallel batch)
+            loop = asyncio.get_running_loop()
+            retried = False
+            while True:
+                pool = self.pool
+                try:
+                    records = await asyncio.wait_for(
+                        loop.run_in_executor(pool, _evaluate_chunk, [(0, string)], self.timeout, True),
+                        self.timeout + KILL_GRACE_PERIOD if self.timeout else None)
+                except asyncio.TimeoutError:
+                    if pool is self.pool:
+                        self.pool = self._new_pool()
+                        self._kill(pool)
+                    return False, ('EvaluationTimeoutException', str(EvaluationTimeoutException()))
+                except BrokenProcessPool:
+                    # A request whose pool was killed (or broken) by another request gets one more chance in the new pool
+                    if pool is not self.pool and not retried:
+                        retried = True
+                        continue
+                    if pool is self.pool:
+                        self.pool = self._new_pool()
+                    return False, ('BrokenProcessPool', "The worker process evaluating the expression has died")
+                except Exception as error:
+                    return False, (type(error).__name__, error_message(error))
+
+                _, succeeded, value = records[0]
+                return succeeded, value
+
+    async def _respond(self, line_number:int, string:str, connection_slots:asyncio.Semaphore) -> str:
+        # Evaluate a line and build its answer (an unexpected exception is the error answer of the line, so the
+        # answers of the next lines are still sent)
+        try:
+            succeeded, value = await self.evaluate(string)
+            return _encode_record(line_number, succeeded, value)
+        except Exception as error:
+            return _encode_record(line_number, False, (type(error).__name__, error_message(error)))
+        finally:
+            connection_slots.release()
+
+    async def _handle_connection(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        # Read the lines of a connection, and answer them in order
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        connection_slots = asyncio.Semaphore(self.max_connection_requests)
+        answers = asyncio.Queue()
+        self.connections[writer] = answers
+        sender = asyncio.create_task(self._send_answers(answers, writer))
+        line_number = 0
+
+        try:
+            while not self.draining:
+                # Stop reading while the connection has too many requests in flight
+                await connection_slots.acquire()
+                try:
+                    line = await reader.readline()
+
+                # A line that is longer than the limit of the reader gets an error answer, and the connection is
+                # closed (the rest of the line cannot be told apart from the next lines)
+                except (ValueError, asyncio.LimitOverrunError) as error:
+                    line_number += 1
+                    answer = asyncio.get_running_loop().create_future()
+                    answer.set_result(_encode_record(line_number, False, (type(error).__name__, str(error))))
+                    await answers.put((line_number, answer))
+                    break
+
+                if not line or self.draining:
+                    break
+
+                line_number += 1
+                request = asyncio.create_task(self._respond(line_number, line.decode('utf-8', 'replace').rstrip('\r\n'), connection_slots))
+                self.requests.add(request)
+                request.add_done_callback(self.requests.discard)
+                await answers.put((line_number, request))
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        # The server is closed (a cancelled handler would be reported as an error by asyncio)
+        except asyncio.CancelledError:
+            sender.cancel()
+
+        finally:
+            await answers.put(None)
+            try:
+                await sender
+            except asyncio.CancelledError:
+                sender.cancel()
+            self.connections.pop(writer, None)
+            self.handlers.discard(handler)
+            writer.close()
+
+    async def _send_answers(self, answers:asyncio.Queue, writer:asyncio.StreamWriter) -> None:
+        # Write the answers of a connection in the order of its lines (the queue has the (line number, request) pairs)
+        while True:
+            item = await answers.get()
+            if item is None:
+                answers.task_done()
+                return
+
+            line_number, request = item
+            try:
+                # A cancelled request has no answer (waiting does not raise the exceptions of the request, so only the
+                # cancellation of the sender itself stops it)
+                await asyncio.wait([request])
+                if request.cancelled():
+                    continue
+
+                # An unexpected exception of a request is its error answer, so the sender keeps running
+                try:
+                    answer = request.result()
+                except Exception as error:
+                    answer = _encode_record(line_number, False, (type(error).__name__, error_message(error)))
+
+                writer.write(answer.encode() + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                return
+            finally:
+                answers.task_done()
+
+    async def _handle_http(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        # Answer a single HTTP request (the connection is closed after it)
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        self.connections[writer] = None
+        try:
+            try:
+                status, body = await self._http_request(reader)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                status, body = 400, {"error": "BadRequest", "message": "Invalid HTTP request"}
+
+            # A text body is sent as it is (the metrics), a result is encoded like the JSON lines records, and the rest
+            # are JSON
+            content_type = 'text/plain; version=0.0.4' if type(body) == str else 'application/json'
+            if type(body) == str:
+                payload = body.encode()
+            elif 'result' in body:
+                payload = f'{{"result": {_encode_result(body["result"])}}}'.encode()
+            else:
+                payload = json.dumps(body, allow_nan=False).encode()
+
+            writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+        # The server is closed (a cancelled handler would be reported as an error by asyncio)
+        except asyncio.CancelledError:
+            pass
+
+        finally:
+            self.connections.pop(writer, None)
+            self.handlers.discard(handler)
+            writer.close()
+
+    async def _http_request(self, reader:asyncio.StreamReader) -> tuple[int, dict]:
+        # Parse an HTTP request, and evaluate its expression (or dump the metrics)
+        method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # The counters of the server's calculator
+        if path == '/metrics' and method == 'GET' and self.calculator.metrics is not None:
+            return 200, self.calculator.metrics.to_prometheus()
+
+        if path != '/evaluate':
+            return 404, {"error": "NotFound", "message": "Unknown path " + path}
+        if method != 'POST':
+            return 405, {"error": "MethodNotAllowed", "message": "Use POST"}
+
+        length = int(headers.get('content-length', 0))
+        if length > MAX_HTTP_BODY:
+            return 413, {"error": "PayloadTooLarge", "message": "The request body is too large"}
+
+        body = json.loads(await reader.readexactly(length))
+        if self.draining:
+            return 503, {"error": "ServiceUnavailable", "message": "The server is shutting down"}
+        expression = body.get('expression') if type(body) == dict else None
+        if type(expression) != str:
+            return 400, {"error": "BadRequest", "message": "The body must be a JSON object with an 'expression' string"}
+
+        request = asyncio.create_task(self.evaluate(expression))
+        self.requests.add(request)
+        request.add_done_callback(self.requests.discard)
+
+        succeeded, value = await request
+        if succeeded:
+            return 200, {"result": value}
+        error_type, message = value
+        return HTTP_ERROR_STATUSES.get(error_type, 422), {"error": error_type, "message": message.strip()}
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, initializer=_initialize_worker, initargs=(self.calculator_factory,))
+
+    def _kill(self, pool:ProcessPoolExecutor) -> None:
+        # Terminate the worker processes of a pool (the executor has no public API to stop a running task), so its
+        # waiting requests fail with BrokenProcessPool
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+            422: 'Unprocessable Entity', 500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+def _encode_record(line_number:int, succeeded:bool, value) -> str:
+    # Encode an answer like a record of the JSON lines batch output
+    if succeeded:
+        return f'{{"line": {line_number}, "result": {_encode_result(value)}}}'
+
+    error_type, message = value
+    return json.dumps({"line": line_number, "error": error_type, "message": message.strip()}, allow_nan=False)
+
+
+def _encode_result(result) -> str:
+    # The JSON value of a result (the integers of any size are written in full, and the infinities and NaN as strings)
+    return ''.join(format_json_result(result))
+
+
+async def serve(arguments:argparse.Namespace) -> None:
+    # Run the server until SIGINT or SIGTERM, and then drain it
+    policy = CostPolicy(inline_cost=arguments.inline_cost)
+    server = CalculatorServer(partial(_make_calculator, policy, arguments.cache_size), arguments.workers, arguments.max_requests,
+                              arguments.max_connection_requests, arguments.timeout)
+    if arguments.metrics:
+        server.calculator.metrics = Metrics()
+    await server.start(arguments.host, arguments.port, arguments.http_port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    print("Listening on " + ", ".join(f"{host}:{port}" for host, port in server.addresses))
+    await stop.wait()
+    await server.close(arguments.drain_timeout)
+
+
+def _make_calculator(policy:CostPolicy, cache_size:int = 0) -> Calculator:
+    # The workers lex with the scanner, parse with the iterative parser and evaluate with the stack VM as well. A
+    # repeated expression is compiled once by every calculator that has a cache
+    calculator = Calculator()
+    calculator.policy = policy
+    if cache_size:
+        calculator.cache = ExpressionCache(cache_size)
+    calculator.lexer = ScannerLexer()
+    calculator.parser = PrecedenceClimbingParser()
+    calculator.evaluator = StackVMEvaluator()
+    return calculator
+
+
+def parse_arguments(arguments:list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve expression evaluations over TCP (and HTTP)")
+    parser.add_argument('--host', default='127.0.0.1', help="the address to listen on")
+    parser.add_argument('--port', type=int, default=7000, help="the port of the line protocol")
+    parser.add_argument('--http-port', type=int, help="the port of the HTTP endpoint")
+    parser.add_argument('-j', '--workers', type=int, help="the number of worker processes for expensive expressions")
+    parser.add_argument('--max-requests', type=int, default=64, help="the largest number of requests in flight")
+    parser.add_argument('--max-connection-requests', type=int, default=8, help="the largest number of requests in flight per connection")
+    parser.add_argument('--timeout', type=float, default=10.0, help="the time limit of every request in seconds")
+    parser.add_argument('--inline-cost', type=float, default=1e6, help="the largest estimated cost that is evaluated in the event loop")
+    parser.add_argument('--cache-size', type=int, default=0, help="the number of compiled expressions that are cached "
+                                                                  "(by the server and by every worker)")
+    parser.add_argument('--metrics', action='store_true', help="count the requests, and serve the counters on GET /metrics")
+    parser.add_argument('--drain-timeout', type=float, default=10.0, help="the time to wait for the requests in flight on shutdown")
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_arguments()))
@@ -0,0 +1,246 @@
+import re
+
+from Algorithms.factorial import operand_limit
+from calculator import Calculator, error_message
+from cost_policy import REFUSE
+from evaluator import CompiledExpression
+from Exceptions.exceptions import *
+from timeouts import time_limit
+
+# An assignment line: a name, an '=' and an expression string
+ASSIGNMENT_PATTERN = re.compile(r'\s*(?P<name>[A-Za-z_][A-Za-z0-9_]*)\s*=(?P<string>.*)', re.DOTALL)
+
+
+class Cell:
+    # This class represents a named result of a session: its compiled expression and its memoized value
+    __slots__ = ('name', 'string', 'function', 'value', 'error', 'dirty')
+
+    def __init__(self, name:str, string:str, function:CompiledExpression) -> None:
+        self.name = name  # The name of the result
+        self.string = string  # The expression string
+        self.function = function  # The compiled expression (its variables are the names it depends on)
+        self.value = None  # The memoized value (None until it is evaluated)
+        self.error = None  # The exception of the last evaluation, or of a result it depends on (None if it succeeded)
+        self.dirty = True  # Whether the value must be evaluated again
+
+    @property
+    def dependencies(self) -> tuple:
+        return self.function.variables
+
+
+class Session:
+    """
+    This class represents a calculation session of named results (like the cells of a spreadsheet), where an
+    expression can use the results that are defined before or after it (e.g. "a = 30!", "b = a# + 2").
+    The session keeps the dependency graph of the results. A change marks its downstream results as dirty, and a
+    dirty result is evaluated again only when it is read, so an update costs time proportional to the results it
+    affects and not to the size of the session. The other results keep their memoized values
+    """
+
+    def __init__(self, calculator:Calculator = None) -> None:
+        self.calculator = calculator if calculator else Calculator()  # The calculator that compiles the expressions
+        self.cells = {}  # The named results, by name
+        self.dependents = {}  # The names of the results that use a name, by name (the name may not be defined yet)
+        self.evaluations = 0  # The number of evaluated results (memoized values are not counted)
+
+    def assign(self, name:str, string:str) -> None:
+        """
+        This function defines a named result, or changes its expression. The expression is compiled right away, and
+        evaluated lazily (when it or a result that depends on it is read)
+        Args:
+            name (str): the name of the result
+            string (str): the expression string (without the '\\0' sentinel)
+        """
+        function = self.calculator.compile_function(string)
+
+        # Refuse an expression that depends on its own name (before the graph is changed)
+        if self._reaches(function.variables, name):
+            raise CircularDependencyException(name)
+
+        if name in self.cells:
+            self._unlink(self.cells[name])
+
+        cell = Cell(name, string, function)
+        self.cells[name] = cell
+        for dependency in cell.dependencies:
+            self.dependents.setdefault(dependency, set()).add(name)
+
+        self._invalidate(name)
+
+    def remove(self, name:str) -> None:
+        """
+        This function removes a named result. The results that depend on it become unbound
+        Args:
+            name (str): the name of the result
+        """
+        if name not in self.cells:
+            raise UnboundVariableException(name)
+
+        self._unlink(self.cells.pop(name))
+        self._invalidate(name)
+
+    def value(self, name:str) -> float:
+        """
+        This function returns the value of a named result, and evaluates the dirty results it depends on first
+        Args:
+            name (str): the name of the result
+
+        Returns:
+            float: the value of the result
+        """
+        cell = self.cells.get(name)
+        if cell is None:
+            raise UnboundVariableException(name)
+
+        if cell.dirty:
+            self._refresh(cell)
+
+        if cell.error is not None:
+            raise cell.error.with_traceback(None)
+        return cell.value
+
+    def calculate(self, string:str) -> float:
+        """
+        This function calculates an expression string that may use the named results, without naming it
+        Args:
+            string (str): the expression string (without the '\\0' sentinel)
+
+        Returns:
+            float: the result of the expression
+        """
+        function = self.calculator.compile_function(string)
+        return self._evaluate(function, {name: self.value(name) for name in function.variables})
+
+    def execute(self, line:str) -> float:
+        """
+        This function runs a line of the session: an assignment ("name = expression") or an expression
+        Args:
+            line (str): the line
+
+        Returns:
+            float: the value of the assigned result, or of the expression
+        """
+        match = ASSIGNMENT_PATTERN.fullmatch(line)
+        if match is None:
+            return self.calculate(line)
+
+        self.assign(match.group('name'), match.group('string'))
+        return self.value(match.group('name'))
+
+    def __getitem__(self, name:str) -> float:
+        return self.value(name)
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.cells
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def _reaches(self, names:tuple, target:str) -> bool:
+        # Whether the target is one of the names, or one of the names they depend on (walked with an explicit stack)
+        visited = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name == target:
+                return True
+            if name in visited or name not in self.cells:
+                continue
+            visited.add(name)
+            stack.extend(self.cells[name].dependencies)
+        return False
+
+    def _unlink(self, cell:Cell) -> None:
+        # Remove the edges of a result from the names it depends on
+        for dependency in cell.dependencies:
+            dependents = self.dependents[dependency]
+            dependents.discard(cell.name)
+            if not dependents:
+                del self.dependents[dependency]
+
+    def _invalidate(self, name:str) -> None:
+        # Mark the results downstream of a name as dirty. A dirty result's dependents are already dirty, so the walk
+        # stops there (every result is marked once, no matter how many paths lead to it)
+        stack = [name]
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                cell = self.cells[dependent]
+                if not cell.dirty:
+                    cell.dirty = True
+                    stack.append(dependent)
+
+    def _refresh(self, root:Cell) -> None:
+        # Evaluate the dirty results that a result depends on (in post-order, with an explicit stack), then the result
+        stack = [(root, False)]
+        while stack:
+            cell, expanded = stack.pop()
+            if not cell.dirty:
+                continue
+
+            if expanded:
+                self._update(cell)
+                continue
+
+            stack.append((cell, True))
+            for dependency in cell.dependencies:
+                dependency_cell = self.cells.get(dependency)
+                if dependency_cell is not None and dependency_cell.dirty:
+                    stack.append((dependency_cell, False))
+
+    def _update(self, cell:Cell) -> None:
+        # Evaluate a result from the memoized values of its dependencies (a failed dependency fails the result)
+        cell.value = cell.error = None
+        cell.dirty = False
+
+        bindings = {}
+        for dependency in cell.dependencies:
+            dependency_cell = self.cells.get(dependency)
+            if dependency_cell is None:
+                cell.error = UnboundVariableException(dependency)
+                return
+            if dependency_cell.error is not None:
+                cell.error = dependency_cell.error
+                return
+            bindings[dependency] = dependency_cell.value
+
+        # Every exception is held by the result (unexpected ones like ZeroDivisionError and RecursionError as well), so
+        # a clean result always has a value or an error
+        self.evaluations += 1
+        try:
+            cell.value = self._evaluate(cell.function, bindings)
+        except Exception as error:
+            cell.error = error
+
+    def _evaluate(self, function:CompiledExpression, bindings:dict) -> float:
+        # Evaluate a compiled expression within the budgets of the calculator's cost policy (if it has one) and its
+        # factorial limit
+        policy = self.calculator.policy
+        if policy is None:
+            with operand_limit(self.calculator.max_factorial_operand):
+                return function(**bindings)
+
+        decision = self.calculator.decide(function.expression, bindings)
+        if decision == REFUSE:
+            raise ExpressionTooExpensiveException()
+
+        with time_limit(policy.time_limit(decision)), operand_limit(self.calculator.max_factorial_operand):
+            return function(**bindings)
+
+
+if __name__ == "__main__":
+    session = Session()
+
+    # Run the lines of the session until the input ends
+    while True:
+        try:
+            line = input("> ")
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if not line.strip():
+            continue
+
+        try:
+            print(session.execute(line))
+        except Exception as error:
+            print(error_message(error))
@@ -0,0 +1,290 @@
+import io
+import json
+import math
+import signal
+import time
+
+import pytest
+
+from functools import partial
+
+from Algorithms.digits import int_to_string
+from batch import BatchCalculator, make_calculator, make_policy, parse_arguments
+from calculator import Calculator
+from cost_policy import CostPolicy
+from evaluator import TreeEvaluator
+from Exceptions.exceptions import InvalidOperandException
+from IO.input import StreamReader
+from IO.output import JsonLinesOutputPrinter, TsvOutputPrinter
+from parallel import ParallelBatchCalculator
+from result_store import PersistentResultCache
+
+
+def run_batch(text:str, printer_type=JsonLinesOutputPrinter) -> tuple[list[str], tuple[int, int]]:
+    output = io.StringIO()
+    counts = BatchCalculator(StreamReader(io.StringIO(text)), printer_type(output)).run()
+    return output.getvalue().splitlines(), counts
+
+
+# Batch evaluation
+def test_batch_jsonl_records():
+    lines, counts = run_batch("3+2\n5!\n130+*3\n1/0\n")
+    records = [json.loads(line) for line in lines]
+
+    assert counts == (2, 2)
+    assert records[0] == {"line": 1, "result": 5}
+    assert records[1] == {"line": 2, "result": 120}
+    assert records[2]["line"] == 3 and records[2]["error"] == "MissingOperandException"
+    assert records[3]["error"] == "InvalidOperandException"
+
+def test_batch_tsv_records():
+    lines, counts = run_batch("15/2\r\n14 + 23 = 12\n\n", TsvOutputPrinter)
+
+    assert counts == (1, 2)
+    assert lines[0] == "1\tresult\t7.5"
+    assert lines[1].startswith("2\terror\tInvalidSymbolException\t")
+    assert lines[2].startswith("3\terror\tEmptyInputString\t")
+    # every record is a single line
+    assert len(lines) == 3
+
+def test_batch_unexpected_errors():
+    # A line that exhausts the stack of a recursive parser and a line that raises an unexpected exception get error
+    # records, and the lines around them are evaluated
+    lines, counts = run_batch("1+1\n" + "(" * 2000 + "1" + ")" * 2000 + "+1\n0^-1\n3+\n2*3\n")
+    records = [json.loads(line) for line in lines]
+
+    assert counts == (3, 2)
+    assert records[0] == {"line": 1, "result": 2}
+    assert records[1] == {"line": 2, "result": 2}
+    assert records[2]["line"] == 3 and records[2]["error"] == "ZeroDivisionError"
+    assert records[3]["error"] == "MissingOperandException" and "\u0000" not in lines[3]
+    assert records[4] == {"line": 5, "result": 6}
+
+    # Long flat chains are evaluated without recursion as well
+    lines, counts = run_batch("1+" * 3000 + "1\n" + "-" * 3000 + "1\n" + "2*" * 3000 + "1\n")
+    records = [json.loads(line) for line in lines]
+    assert counts == (3, 0)
+    assert records[0] == {"line": 1, "result": 3001} and records[1] == {"line": 2, "result": 1}
+    assert records[2] == {"line": 3, "result": 2 ** 3000}
+
+    # The deep line is an error record with the recursive parser as well
+    output = io.StringIO()
+    calculator = Calculator()
+    BatchCalculator(StreamReader(io.StringIO("1+1\n" + "(" * 2000 + "1" + ")" * 2000 + "\n0^-1\n2*3\n")),
+                    JsonLinesOutputPrinter(output), calculator).run()
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record.get("error") for record in records] == [None, "RecursionError", "ZeroDivisionError", None]
+    assert records[3] == {"line": 4, "result": 6}
+
+def test_batch_non_finite_records():
+    # The infinities and NaN are not JSON numbers, so they are written as strings (and strict parsers accept every line)
+    lines, counts = run_batch("(2.0^1000)*(2.0^1000)\n-(2.0^1000)*(2.0^1000)\n(2.0^1000)*(2.0^1000)-(2.0^1000)*(2.0^1000)\n1.5\n")
+
+    def reject(constant):
+        raise ValueError(constant)
+
+    records = [json.loads(line, parse_constant=reject) for line in lines]
+    assert counts == (4, 0)
+    assert [record["result"] for record in records] == ["inf", "-inf", "nan", 1.5]
+
+def test_batch_buffered_output():
+    output = io.StringIO()
+    printer = JsonLinesOutputPrinter(output, buffer_size=1 << 20)
+    printer.output_result(1, 5)
+    assert output.getvalue() == ""
+
+    printer.flush()
+    assert output.getvalue() == '{"line": 1, "result": 5}\n'
+
+def test_batch_arguments():
+    arguments = parse_arguments(["expressions.txt", "-f", "tsv"])
+    assert arguments.input == "expressions.txt" and arguments.output == "-" and arguments.format == "tsv"
+
+def test_batch_expression_cache():
+    # a repeated line (up to its whitespaces) is compiled once
+    output = io.StringIO()
+    calculator = make_calculator(cache_size=16)
+    BatchCalculator(StreamReader(io.StringIO("3+2\n3 + 2\n1/0\n1/0\n")), JsonLinesOutputPrinter(output), calculator).run()
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert [record.get("result") for record in records] == [5, 5, None, None]
+    assert calculator.cache.hits == 2 and calculator.cache.misses == 2
+    assert make_calculator().cache is None and parse_arguments(["--cache-size", "100"]).cache_size == 100
+
+def test_batch_policy_from_the_largest_cost():
+    # every threshold is derived from the largest cost, so a small one still routes the expressions in order
+    policy = make_policy(1e5, heavy_seconds=5.0)
+    assert policy.inline_cost < policy.time_box_cost < policy.heavy_cost == 1e5
+    assert policy.heavy_seconds == 5.0 and make_policy(1e5).heavy_seconds == CostPolicy().heavy_seconds
+    assert parse_arguments(["--max-cost", "1e5", "--heavy-timeout", "5"]).heavy_timeout == 5.0
+
+def test_batch_approximate_records():
+    output = io.StringIO()
+    calculator = make_calculator(approximate=True)
+    BatchCalculator(StreamReader(io.StringIO("(10000!)^3\n3+2\n(10000!)#\n(1000!)#\n")), JsonLinesOutputPrinter(output),
+                    calculator).run()
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert records[0] == {"line": 1, "result": "2.30581023e+106978"}
+    assert records[1] == {"line": 2, "result": 5}
+    assert records[2]["error"] == "InvalidOperandException"
+    assert records[3] == {"line": 4, "result": 10539}
+    assert parse_arguments(["--approximate"]).approximate
+
+def test_batch_backend_records():
+    output = io.StringIO()
+    BatchCalculator(StreamReader(io.StringIO("0.1+0.2\n171!\n")), JsonLinesOutputPrinter(output),
+                    make_calculator(backend='float')).run()
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert records[0] == {"line": 1, "result": 0.30000000000000004}
+    assert records[1]["error"] == "OverflowError"
+    assert parse_arguments(["--backend", "exact"]).backend == 'exact'
+
+def test_batch_number_formats():
+    # The integers that are too long for str() are written as strings of their digits
+    output = io.StringIO()
+    BatchCalculator(StreamReader(io.StringIO("3000!\n3+2\n")), JsonLinesOutputPrinter(output),
+                    make_calculator()).run()
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert records[0]["result"] == int_to_string(math.factorial(3000)) and records[1]["result"] == 5
+
+    output = io.StringIO()
+    BatchCalculator(StreamReader(io.StringIO("3000!\n3+2\n")),
+                    TsvOutputPrinter(output, number_format='scientific', significant_digits=5), make_calculator()).run()
+    assert output.getvalue() == "1\tresult\t4.1493e+9130\n2\tresult\t5.0000e+0\n"
+    assert parse_arguments(["--number-format", "hex"]).number_format == 'hex'
+
+
+
+# Parallel batch evaluation
+class BlockingEvaluator(TreeEvaluator):
+    # An evaluator that ignores the soft time limit, like a single long C call
+    def evaluate(self, expression):
+        signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+        try:
+            time.sleep(60)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGALRM])
+
+class BlockingCalculator(Calculator):
+    # A calculator that blocks on the expression "0"
+    def calculate(self, string:str, allow_heavy:bool = True) -> float:
+        if string == "0":
+            return BlockingEvaluator().evaluate(None)
+        return super().calculate(string, allow_heavy)
+
+def run_parallel(text:str, **options) -> list[dict]:
+    output = io.StringIO()
+    ParallelBatchCalculator(StreamReader(io.StringIO(text)), JsonLinesOutputPrinter(output), **options).run()
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+def test_parallel_batch_keeps_input_order():
+    expressions = [f"{i}*2" if i % 7 else "1/0" for i in range(1, 200)]
+    records = run_parallel("\n".join(expressions), workers=2, chunk_size=8)
+
+    assert [record["line"] for record in records] == list(range(1, 200))
+    assert records[0] == {"line": 1, "result": 2}
+    assert records[6]["error"] == "InvalidOperandException"
+
+def test_parallel_batch_unexpected_errors():
+    # The unexpected exceptions of a worker are error records, like the calculation exceptions
+    records = run_parallel("1+1\n" + "(" * 2000 + "1" + ")" * 2000 + "\n0^-1\n2*3\n", workers=2, chunk_size=2)
+
+    assert [record.get("error") for record in records] == [None, "RecursionError", "ZeroDivisionError", None]
+    assert records[3] == {"line": 4, "result": 6}
+
+    records = run_parallel("(" * 2000 + "1" + ")" * 2000 + "\n0^-1\n" + "1+" * 3000 + "1\n", workers=2,
+                           calculator_factory=make_calculator)
+    assert records[0] == {"line": 1, "result": 1} and records[1]["error"] == "ZeroDivisionError"
+    assert records[2] == {"line": 3, "result": 3001}
+
+def test_parallel_batch_unordered():
+    expressions = [f"{i}+1" for i in range(100)]
+    records = run_parallel("\n".join(expressions), workers=2, chunk_size=3, ordered=False)
+
+    assert sorted((record["line"], record["result"]) for record in records) == [(i + 1, i + 1) for i in range(100)]
+
+def test_parallel_batch_kills_runaway_workers():
+    records = run_parallel("1+1\n0\n2+2\n", workers=2, chunk_size=2, timeout=0.2, calculator_factory=BlockingCalculator)
+
+    assert records[0] == {"line": 1, "result": 2}
+    assert records[1]["error"] == "EvaluationTimeoutException"
+    assert records[2] == {"line": 3, "result": 4}
+
+
+# Cost policy
+def test_parallel_batch_routes_heavy_expressions():
+    # 1000! is heavy, (999^999)! is refused
+    policy = CostPolicy(inline_cost=1e2, time_box_cost=1e3, heavy_cost=1e9)
+    records = run_parallel("1000!\n1+2\n(999^999)!\n4!\n", workers=2, chunk_size=2,
+                           calculator_factory=partial(make_calculator, None, policy))
+
+    assert [record["line"] for record in records] == [1, 2, 3, 4]
+    assert records[0]["result"] == math.factorial(1000)
+    assert records[1]["result"] == 3 and records[3]["result"] == 24
+    assert records[2]["error"] == "ExpressionTooExpensiveException"
+
+
+# Persistent results cache
+class CountingEvaluator(TreeEvaluator):
+    def __init__(self) -> None:
+        self.evaluations = 0
+
+    def evaluate(self, expression):
+        self.evaluations += 1
+        return super().evaluate(expression)
+
+def cached_calculator(path) -> Calculator:
+    calculator = Calculator()
+    calculator.evaluator = CountingEvaluator()
+    calculator.result_cache = PersistentResultCache(str(path))
+    return calculator
+
+def test_result_cache_shares_commutative_forms(tmp_path):
+    calculator = cached_calculator(tmp_path / "results.db")
+
+    assert calculator.calculate("(30!)*2+1") == 2 * math.factorial(30) + 1
+    assert calculator.calculate("1+2*(30!)") == 2 * math.factorial(30) + 1
+    assert calculator.calculate("1.5@2") == 1.75
+    assert calculator.calculate("2@1.5") == 1.75
+    assert calculator.evaluator.evaluations == 2
+
+    # a new calculator (another run) reads the same file
+    calculator = cached_calculator(tmp_path / "results.db")
+    assert calculator.calculate("2*30!+1") == 2 * math.factorial(30) + 1
+    assert calculator.evaluator.evaluations == 0
+
+def test_result_cache_does_not_change_results(tmp_path):
+    # the operands of '$' and '&' decide a tie (and NaN), so their orders are different entries
+    strings = ["2$2.0", "2.0$2", "2&2.0", "2.0&2", "(2.0^1000*2.0^1000 - 2.0^1000*2.0^1000)$1",
+               "1$(2.0^1000*2.0^1000 - 2.0^1000*2.0^1000)",
+               "(3*2.0)&6", "6&(2.0*3)", "1+2.0", "2.0+1", "(2$2.0)*3", "3*(2.0$2)", "0.5@2", "2@0.5"]
+    expected = [repr(Calculator().calculate(string)) for string in strings]
+
+    calculator = cached_calculator(tmp_path / "results.db")
+    for _ in range(2):
+        assert [repr(calculator.calculate(string)) for string in strings] == expected
+
+def test_result_cache_keeps_evaluation_order_of_errors(tmp_path):
+    calculator = cached_calculator(tmp_path / "results.db")
+
+    for _ in range(2):
+        with pytest.raises(InvalidOperandException, match="divide by 0"):
+            calculator.calculate("1/0+0^0")
+        with pytest.raises(InvalidOperandException, match="0\\^0"):
+            calculator.calculate("0^0+1/0")
+
+    assert calculator.evaluator.evaluations == 2
+
+def test_result_cache_version_and_eviction(tmp_path):
+    path = str(tmp_path / "results.db")
+    cache = PersistentResultCache(path, max_bytes=200, version="1")
+    calculator = Calculator()
+    for i in range(50):
+        cache.evaluate(calculator.compile(f"{i}!"), TreeEvaluator())
+
+    assert 0 < cache.size() <= 200
+
+    # results stored with another version of the semantics are dropped
+    assert PersistentResultCache(path, version="2").size() == 0
@@ -1,8 +1,37 @@
+import copy
+import io
+import math
+import pickle
+import random
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from time import perf_counter
+
 import pytest
 
-from lexer import Lexer
-from parsing import RecursiveDescentParser
+from lexer import CompactLexer, Lexer, ScannerLexer
+from parsing import PrecedenceClimbingParser, RecursiveDescentParser
+from Algorithms.approximate import Approximation
+from Algorithms.backends import ExactBackend, FloatBackend, GmpyBackend, NumericBackend, gmpy2, make_backend
+from Algorithms.bounds import bound_nodes, evaluate_pruned, magnitude
+from Algorithms.codegen import FunctionCache
+from Algorithms.cost import estimate
+from Algorithms.digits import int_to_bytes, int_to_chunks, int_to_decimal, int_to_scientific, int_to_string
+from Algorithms.factorial import memo as factorial_memo
+from Algorithms.hash_consing import evaluate_dag, hash_cons
+from Algorithms.profiling import format_profile, operator_summary
+from Algorithms.rewrite import rewrite
+from Algorithms.stack_vm import compile_expression, run_program
+from cache import ExpressionCache
+from calculator import CALCULATION_ERRORS, Calculator
+from cost_policy import CostPolicy
+from IO.output import HEX, RAW, SCIENTIFIC, StreamOutputPrinter, format_json_result, format_number
+from evaluator import (CodegenEvaluator, CompiledExpression, DagEvaluator, PruningEvaluator, StackVMEvaluator,
+                       TreeEvaluator)
+from metrics import Metrics
+from session import Session
 from Exceptions.exceptions import *
+from tokens import FactorialMod, Negative, Number, PowerMod, Product, Sum, Variable
 
 
 def calculate(string:str):
@@ -199,4 +228,987 @@ def test_complex_equation_19():
 
 def test_complex_equation_20():
     string = "((10+10+10+3^2)/5!#)^2-(0.5*(2^-(-2&2)))\0"
-    assert calculate(string) == 167
\ No newline at end of file
+    assert calculate(string) == 167
+
+# Stack VM evaluation
+def calculate_vm(string:str):
+    lexer = Lexer()
+    parser = RecursiveDescentParser()
+
+    tokens = lexer.lex(string)
+    program = compile_expression(parser.parse(tokens, string))
+
+    return run_program(program)
+
+def test_vm_matches_tree_evaluation():
+    strings = ["(3*(5-2)!)/((5!)/((-2^2)!)+1)\0", "((22/2)^2)#! - ~---120#!\0",
+               "(30$14)*120#+2^(2&10)-(0.5+1/(16%((5!+1)/11)))\0", "((10+10+10+3^2)/5!#)^2-(0.5*(2^-(-2&2)))\0"]
+    for string in strings:
+        assert calculate_vm(string) == calculate(string)
+
+def test_vm_division_by_zero():
+    string = "3+2/(1-1)\0"
+    with pytest.raises(InvalidOperandException, match="divide by 0"):
+        calculate_vm(string)
+
+def test_vm_invalid_tilda_raises_in_evaluation_order():
+    # the division by zero is evaluated before the invalid tilda expression
+    string = "1/0 + ~-(1+2)\0"
+    with pytest.raises(InvalidOperandException, match="divide by 0"):
+        calculate_vm(string)
+
+    string = "~-(1+2) + 1/0\0"
+    with pytest.raises(InvalidOperandException, match="tilda"):
+        calculate_vm(string)
+
+def test_vm_deep_expression():
+    # the tree is deeper than the recursion limit
+    node = Number(0, 1)
+    for i in range(100000):
+        node = Negative(0, '-', node)
+
+    assert run_program(compile_expression(node)) == 1
+
+
+# Precedence climbing parser
+def parse_both(string:str):
+    trees = []
+    for parser in (RecursiveDescentParser(), PrecedenceClimbingParser()):
+        try:
+            trees.append(dump_tree(parser.parse(Lexer().lex(string), string)))
+        except Exception as e:
+            trees.append((type(e), str(e)))
+    return trees
+
+def dump_tree(node):
+    if not node.children:
+        return node.value
+    return (type(node).__name__, node.index) + tuple(dump_tree(child) for child in node.children)
+
+def test_precedence_climbing_builds_the_same_trees():
+    strings = ["(3*(5-2)!)/((5!)/((-2^2)!)+1)\0", "4!#^ 2 -(2^(-(2^2)@(2^3)))!\0", "((22/2)^2)#! - ~---120#!\0",
+               "-(2^3)*(5!#+3)+((5^2*2^2)/10+~---4)\0", "3%3^3$2@1\0", "--5!##\0"]
+    for string in strings:
+        recursive_tree, iterative_tree = parse_both(string)
+        assert recursive_tree == iterative_tree
+
+def test_precedence_climbing_raises_the_same_errors():
+    strings = ["3(34-20)\0", "3!20-30\0", "130+*3\0", "((10-23)+3!\0", "((10-23)))+3!\0", "~(2)\0", "5+~\0", "(5##)\0", "()\0"]
+    for string in strings:
+        recursive_error, iterative_error = parse_both(string)
+        assert recursive_error == iterative_error
+        assert issubclass(iterative_error[0], Exception)
+
+def test_precedence_climbing_deep_nesting():
+    string = "(" * 50000 + "--5" + ")" * 50000 + "\0"
+    tree = PrecedenceClimbingParser().parse(Lexer().lex(string), string)
+    assert run_program(compile_expression(tree)) == 5
+
+
+# Scanner lexer
+def lex_tokens(lexer, string:str):
+    tokens = []
+    stream = lexer.lex(string)
+    while stream.has_next():
+        token = stream.next()
+        tokens.append((type(token), token.index, token.value))
+    return tokens
+
+def test_scanner_produces_the_same_tokens():
+    strings = ["(30$14)*120#+2^(2&10)-(0.5+1/(16%((5!+1)/11)))\0", "1 2 . 3 4 +~-- 5 \0", "0.30 * 7.\t1\0"]
+    for string in strings:
+        assert lex_tokens(ScannerLexer(), string) == lex_tokens(Lexer(), string)
+
+def test_scanner_raises_the_same_errors():
+    for string in ["14 + 23 = 12\0", "2342. + 1\0", "3 + .5\0", "12. \0"]:
+        with pytest.raises(InvalidSymbolException) as scanner_error:
+            ScannerLexer().lex(string)
+        with pytest.raises(InvalidSymbolException) as loop_error:
+            Lexer().lex(string)
+        assert str(scanner_error.value) == str(loop_error.value)
+
+    for string in ["\0", "   \t\r\0", ""]:
+        with pytest.raises(EmptyInputString):
+            ScannerLexer().lex(string)
+
+def test_scanner_without_sentinel():
+    assert lex_tokens(ScannerLexer(), "3+2") == lex_tokens(Lexer(), "3+2\0")
+
+def test_scanner_long_literal():
+    # the literal is longer than the interpreter's int-to-str limit
+    string = "1" + "0" * 10000 + "+1\0"
+    assert ScannerLexer().lex(string).next().value == 10 ** 10000
+
+def test_scanner_is_faster_on_long_inputs():
+    # a benchmark of a long input (the scanner is 2.5 to 4 times faster, the factor of 1.5 leaves room for noise)
+    numbers = random.Random(0)
+    string = "+".join(str(numbers.randint(1, 10 ** 8)) for _ in range(30000)) + "\0"
+
+    def best_time(lexer):
+        times = []
+        for _ in range(3):
+            start = perf_counter()
+            lexer.lex(string)
+            times.append(perf_counter() - start)
+        return min(times)
+
+    assert best_time(ScannerLexer()) * 1.5 < best_time(Lexer())
+
+
+# Compact token stream
+def test_compact_stream_produces_the_same_tokens():
+    string = "(30$14)*120#+2^(2&10)-(0.5+1/(16%((5!+1)/11)))+123456789012345678901234567890\0"
+    compact_stream = CompactLexer().lex(string)
+    assert len(compact_stream) == len(Lexer().lex(string))
+
+    tokens = []
+    while compact_stream.has_next():
+        assert compact_stream.peek_type() == type(compact_stream.peek())
+        token = compact_stream.next()
+        tokens.append((type(token), token.index, token.value))
+
+    assert tokens == lex_tokens(Lexer(), string)
+    assert type(tokens[-1][2]) == int
+
+def test_compact_stream_parses_the_same_trees():
+    strings = ["((22/2)^2)#! - ~---120#!\0", "-(2^3)*(5!#+3)+((5^2*2^2)/10+~---4)\0"]
+    for string in strings:
+        for parser in (RecursiveDescentParser(), PrecedenceClimbingParser()):
+            compact_tree = parser.parse(CompactLexer().lex(string), string)
+            assert dump_tree(compact_tree) == dump_tree(parser.parse(Lexer().lex(string), string))
+
+    with pytest.raises(MissingOperandException):
+        PrecedenceClimbingParser().parse(CompactLexer().lex("130+*3\0"), "130+*3\0")
+
+def test_nodes_have_no_instance_dict():
+    assert not hasattr(Number(0, 1), '__dict__')
+    assert not hasattr(Negative(0, '-', Number(1, 1)), '__dict__')
+
+
+# Compiled expressions cache
+def test_cache_hits_normalized_strings():
+    calculator = Calculator()
+    calculator.cache = ExpressionCache(max_size=2)
+
+    assert calculator.calculate("3 + 2") == 5
+    assert calculator.calculate("3+2") == 5
+    assert calculator.calculate(" 3+ 2\t") == 5
+    assert calculator.cache.stats() == {'hits': 2, 'misses': 1, 'evictions': 0, 'size': 1}
+
+def test_cache_evicts_least_recently_used():
+    cache = ExpressionCache(max_size=2)
+    calculator = Calculator()
+    for string in ["1+1", "2+2", "1+1", "3+3"]:
+        cache.compile(string, calculator.compile)
+
+    assert cache.stats()['evictions'] == 1
+    assert list(cache.entries) == ["1+1", "3+3"]
+
+def test_cache_keeps_the_compiler_variants_apart():
+    # The rewrite pass and the backend change the compiled trees, so switching them does not reuse stale trees
+    calculator = Calculator()
+    calculator.cache = ExpressionCache()
+    assert calculator.calculate("0.1+0.2") == 0.1 + 0.2
+
+    calculator.backend = ExactBackend()
+    assert calculator.calculate("0.1+0.2") == Fraction(3, 10)
+    calculator.rewrite = True
+    assert calculator.calculate("0.1+0.2") == Fraction(3, 10)
+    calculator.backend = None
+    assert type(calculator.compile("1+x+2")) == Sum
+
+    calculator.rewrite = False
+    assert calculator.calculate("0.1+0.2") == 0.1 + 0.2
+    assert type(calculator.compile("1+x+2")) != Sum
+    assert calculator.cache.stats()['size'] == 5
+
+def test_cache_stores_deterministic_errors():
+    calculator = Calculator()
+    calculator.cache = ExpressionCache()
+    for _ in range(3):
+        with pytest.raises(MissingOperandException, match="index 3"):
+            calculator.calculate("130+*3")
+
+    assert calculator.cache.stats()['hits'] == 2
+
+    # the same expression with different whitespaces is compiled again, so the error points at the right index
+    with pytest.raises(MissingOperandException, match="index 4"):
+        calculator.calculate("130 +*3")
+
+
+# Common subexpression elimination
+def test_hash_consing_deduplicates_subtrees():
+    string = "(200!)# + (200!)# * ((200!)# - 3)\0"
+    tree = RecursiveDescentParser().parse(Lexer().lex(string), string)
+    dag, deduplicated = hash_cons(tree)
+
+    # (200!)# is 3 nodes, and the literal 3 is unique
+    assert deduplicated == 6
+    assert dag.left is dag.right.left is dag.right.right.left
+
+    evaluator = DagEvaluator()
+    assert evaluator.evaluate(tree) == tree.evaluate()
+    assert evaluator.deduplicated == 6
+
+def test_hash_consing_keeps_number_types():
+    string = "1 + 1.0 + 1\0"
+    dag, deduplicated = hash_cons(RecursiveDescentParser().parse(Lexer().lex(string), string))
+    assert deduplicated == 1
+    assert type(dag.left.left.value) == int and type(dag.left.right.value) == float
+
+def test_dag_evaluation_raises_the_same_error_first():
+    strings = ["(1/0) + (0^0) + (1/0)\0", "(0^0)*(1/0) + (0^0)\0", "~-(2+1) + 1/0\0"]
+    for string in strings:
+        tree = RecursiveDescentParser().parse(Lexer().lex(string), string)
+        with pytest.raises(InvalidOperandException) as tree_error:
+            tree.evaluate()
+        with pytest.raises(InvalidOperandException) as dag_error:
+            DagEvaluator().evaluate(tree)
+        assert str(dag_error.value) == str(tree_error.value)
+
+
+# Factorial engine
+def test_large_factorials():
+    assert calculate("5000!\0") == math.factorial(5000)
+    assert calculate("(3000+2)!\0") == math.factorial(3002)
+
+def test_factorial_extends_memoized_factorials():
+    factorial_memo.clear()
+    assert calculate("1000!\0") == math.factorial(1000)
+    assert calculate("1010!\0") == math.factorial(1010)
+    assert len(factorial_memo) == 2
+
+def test_factorial_of_floats():
+    assert calculate("(10/2)!\0") == 120.0
+    assert calculate("(342/2)!\0") == math.inf
+
+def test_factorial_too_large():
+    string = "100001!\0"
+    with pytest.raises(InvalidOperandException):
+        calculate(string)
+
+def test_factorial_limit_is_a_setting():
+    calculator = Calculator()
+    calculator.max_factorial_operand = 10
+    assert calculator.calculate("10!") == 3628800
+    # the folded constants and the fused residues respect the limit as well
+    calculator.rewrite = True
+    for string in ["11!", "(5+6)!", "(11!)%7"]:
+        with pytest.raises(InvalidOperandException, match="too large"):
+            calculator.calculate(string)
+    assert Calculator().calculate("11!") == 39916800
+
+    calculator = Calculator()
+    calculator.max_factorial_operand = 100001
+    assert calculator.calculate("(100001!)%7") == 0
+
+
+# Digit sum kernel
+def test_sum_digits_of_big_integers():
+    # 3000! has 9131 digits, more than the int-to-str limit
+    expected = sum(int(digit) for digit in str(int_to_decimal(math.factorial(3000))))
+    assert calculate("(3000!)#\0") == expected
+    assert int_to_string(-10 ** 5000 - 7) == '-1' + '0' * 4999 + '7'
+
+def test_sum_digits_of_floats():
+    assert calculate("(1/4)#\0") == 7
+    assert calculate("(10^20.0)#\0") == 1
+    assert calculate("-(3/2)#\0") == -6
+
+
+# Cost estimation
+def test_cost_estimates():
+    calculator = Calculator()
+    assert estimate(calculator.compile("1^5000")).bits == 0
+    assert estimate(calculator.compile("(2^10)!")).bits == pytest.approx(math.log2(math.factorial(1024)))
+    assert estimate(calculator.compile("2.5^1000")).is_float
+    assert estimate(calculator.compile("(999^999)!")).cost == math.inf
+    assert estimate(calculator.compile("5000!")).cost > estimate(calculator.compile("500!")).cost
+
+def test_power_limit_is_on_the_result_size():
+    assert calculate("1^5000\0") == 1
+    assert calculate("2^5000\0") == 2 ** 5000
+    with pytest.raises(InvalidOperandException):
+        calculate("3^100000000\0")
+
+    # the size of the result is bounded by |a|.bit_length() * b, so 3^16000000 (25 million bits) is never computed
+    for calculator in (Calculator(), backend_calculator(ExactBackend())):
+        with pytest.raises(InvalidOperandException, match="too large"):
+            calculator.calculate("3^16000000")
+    with pytest.raises(InvalidOperandException, match="too large"):
+        Calculator().compile_function("3^x", codegen=True)(x=16000000)
+
+def test_cost_policy_decisions():
+    calculator = Calculator()
+    calculator.policy = CostPolicy(inline_cost=1e3, time_box_cost=1e5, heavy_cost=1e7, max_bits=1e5)
+
+    assert calculator.calculate("500!") == math.factorial(500)
+    with pytest.raises(HeavyExpressionException):
+        calculator.calculate("5000!", allow_heavy=False)
+    with pytest.raises(ExpressionTooExpensiveException):
+        calculator.calculate("(999^999)!")
+    # the largest intermediate result counts
+    with pytest.raises(ExpressionTooExpensiveException):
+        calculator.calculate("(2^1000000)%7")
+
+
+# Metrics
+def test_metrics_counters():
+    calculator = Calculator()
+    calculator.metrics = Metrics()
+
+    assert calculator.calculate("3+2") == 5
+    assert calculator.calculate("2^100") == 2 ** 100
+    with pytest.raises(InvalidOperandException):
+        calculator.calculate("1/0")
+    with pytest.raises(SyntaxException):
+        calculator.calculate("1+")
+    with pytest.raises(ZeroDivisionError):
+        calculator.calculate("0^-1")
+
+    snapshot = calculator.metrics.snapshot()
+    assert snapshot['calculations'] == 5
+    assert snapshot['errors'] == {'InvalidOperandException': 1, 'MissingOperandException': 1, 'ZeroDivisionError': 1}
+    assert snapshot['nodes'] == 3 + 3 + 3 + 4
+    assert snapshot['stages']['lex']['count'] == 5 and snapshot['stages']['evaluate']['count'] == 4
+    # 5 has 3 bits, 2^100 has 101 bits
+    assert snapshot['result_bits']['buckets'] == {'8': 1, '32': 0, '128': 1, '512': 0, '2048': 0, '8192': 0,
+                                                  '32768': 0, '131072': 0, '524288': 0, '+Inf': 0}
+
+def test_metrics_prometheus_text():
+    metrics = Metrics()
+    metrics.observe_stage('parse', 0.002)
+    metrics.observe_error('EmptyInputString')
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'calculator_stage_seconds_bucket{stage="parse",le="0.001"} 0' in lines
+    assert 'calculator_stage_seconds_bucket{stage="parse",le="0.01"} 1' in lines
+    assert 'calculator_stage_seconds_count{stage="parse"} 1' in lines
+    assert 'calculator_errors_total{type="EmptyInputString"} 1' in lines
+    assert 'calculator_result_bits_bucket{le="+Inf"} 0' in lines
+
+
+# EXPLAIN ANALYZE
+def test_explain_profiles_every_node():
+    profile, result = Calculator().explain("(2000!)# + 2^10*3")
+    assert result == calculate("(2000!)# + 2^10*3\0")
+
+    # The factorial is the hottest path
+    assert profile.hot and profile.children[0].hot and profile.children[0].children[0].hot
+    assert not profile.children[1].hot
+    assert profile.children[0].children[0].name == 'Factorial'
+    assert profile.children[0].children[0].bits == math.factorial(2000).bit_length()
+    assert profile.seconds >= profile.children[0].seconds >= profile.children[0].children[0].seconds
+    assert operator_summary(profile)['Power']['calls'] == 1
+
+    lines = format_profile(profile).splitlines()
+    assert lines[0].startswith("* Plus '+'") and lines[2].startswith("* │  └─ Factorial '!'")
+
+def test_explain_keeps_the_failing_path():
+    profile, result = Calculator().explain("(3+4)! + 1/(2-2)")
+    assert result is None
+    assert profile.error == profile.children[1].error == "Invalid operand for division operator. Cannot divide by 0"
+    assert profile.children[1].hot and not profile.children[0].hot
+    assert profile.children[0].error is None and profile.children[0].result == 5040
+    assert profile.to_dict()['children'][1]['operator'] == 'Div'
+
+    # an unvalidated arithmetic error stops the evaluation as well
+    profile, result = Calculator().explain("(2000!)#+0^-1")
+    assert result is None and profile.children[0].result == 23382
+    assert profile.children[1].error == profile.error and profile.children[1].hot
+
+
+# Immutable trees
+def test_trees_are_immutable():
+    string = "(3!)^2 + ~-4\0"
+    tree = RecursiveDescentParser().parse(Lexer().lex(string), string)
+
+    with pytest.raises(AttributeError):
+        tree.left = Number(0, 1)
+    with pytest.raises(AttributeError):
+        tree.value = '-'
+
+    # a copy is rebuilt through the constructors
+    copied = copy.deepcopy(pickle.loads(pickle.dumps(tree)))
+    assert dump_tree(copied) == dump_tree(tree)
+
+def test_shared_tree_evaluated_from_threads():
+    string = "((3+2)!/(4-4+2)%7)^2 + (300!)# + (1/0.5)!\0"
+    tree = PrecedenceClimbingParser().parse(Lexer().lex(string), string)
+    expected = tree.evaluate()
+    bad_string = "(5!)/(3-3) + 0^0\0"
+    bad_tree = PrecedenceClimbingParser().parse(Lexer().lex(bad_string), bad_string)
+
+    def evaluate(i):
+        if i % 3 == 0:
+            with pytest.raises(InvalidOperandException):
+                bad_tree.evaluate()
+            return expected
+        evaluator = StackVMEvaluator() if i % 2 else TreeEvaluator()
+        return evaluator.evaluate(tree)
+
+    with ThreadPoolExecutor(8) as executor:
+        assert all(result == expected for result in executor.map(evaluate, range(200)))
+    assert dump_tree(tree) == dump_tree(PrecedenceClimbingParser().parse(Lexer().lex(string), string))
+
+
+# Variables
+def test_lexers_produce_the_same_variable_tokens():
+    string = "rate * (x_1 + 2)! - ~_y + x_1 2\0"
+    tokens = lex_tokens(Lexer(), string)
+    assert lex_tokens(ScannerLexer(), string) == tokens
+    assert [token for token in tokens if token[0] == Variable] == [(Variable, 0, 'rate'), (Variable, 8, 'x_1'),
+                                                                   (Variable, 21, '_y'), (Variable, 26, 'x_1')]
+
+    compact_stream = CompactLexer().lex(string)
+    compact_tokens = []
+    while compact_stream.has_next():
+        token = compact_stream.next()
+        compact_tokens.append((type(token), token.index, token.value))
+    assert compact_tokens == tokens
+
+def test_parsers_build_the_same_trees_with_variables():
+    for string in ["rate * (x + 2)! - ~y\0", "-a^2 @ b $ c#\0", "x y\0", "2x\0", "(x\0"]:
+        recursive_tree, iterative_tree = parse_both(string)
+        assert recursive_tree == iterative_tree
+
+    assert parse_both("x y\0")[0][0] == MissingOperatorException
+
+def test_compiled_expression_matches_substituted_strings():
+    calculator = Calculator()
+    function = calculator.compile_function("rate * (x + 2)! - ~y + x^2 % 7")
+    assert function.variables == ('rate', 'x', 'y')
+
+    rows = [{'rate': rate, 'x': x, 'y': y} for rate in (1, 0.5) for x in range(5) for y in (3, 2.5)]
+    expected = [calculator.calculate(f"{row['rate']} * ({row['x']} + 2)! - ~{row['y']} + {row['x']}^2 % 7")
+                for row in rows]
+    assert list(function.evaluate_many(rows)) == expected
+    assert [function(**row) for row in rows] == expected
+    assert function(1, 2, 3) == function(1, y=3, x=2) == calculator.calculate("1 * (2 + 2)! - ~3 + 2^2 % 7")
+
+def test_unbound_variables():
+    calculator = Calculator()
+    function = calculator.compile_function("x + y")
+    with pytest.raises(UnboundVariableException) as error:
+        function(1)
+    assert error.value.name == 'y'
+    with pytest.raises(UnboundVariableException):
+        list(function.evaluate_many([{'x': 1, 'y': 2}, {'x': 1}]))
+    with pytest.raises(TypeError):
+        function(1, 2, 3)
+
+    for evaluator in (TreeEvaluator(), StackVMEvaluator(), DagEvaluator()):
+        calculator.evaluator = evaluator
+        with pytest.raises(UnboundVariableException):
+            calculator.calculate("x + 1")
+
+    # an invalid tilda is raised before its variable is needed
+    with pytest.raises(InvalidOperandException):
+        calculator.compile_function("~~x")()
+    assert calculator.compile_function("~x")(x=4) == -4
+
+def test_cache_keeps_separate_variable_names():
+    calculator = Calculator()
+    calculator.cache = ExpressionCache()
+    assert calculator.compile_function("ab + 1")(ab=1) == 2
+    with pytest.raises(MissingOperatorException):
+        calculator.compile_function("a b + 1")
+
+
+# Vectorized evaluation
+def test_vectorized_evaluation_matches_the_scalar_path():
+    np = pytest.importorskip("numpy")
+    calculator = Calculator()
+    function = calculator.compile_function("(x + 2)! / (y - 1) - x ^ y % 7 + (x @ y $ 3) & 10 + x# - ~y")
+
+    x = np.array([0, 1, 2, 3.5, 4, -2, 12345.0, 3])
+    y = np.array([2, 0.5, 1, 3, -2, 0.5, 2, 1.25])
+    values, errors = function.evaluate_columns({'x': x, 'y': y})
+
+    for i in range(len(x)):
+        try:
+            expected = float(function(x=float(x[i]), y=float(y[i])))
+        except CALCULATION_ERRORS:
+            assert errors[i] and np.isnan(values[i])
+            continue
+        assert not errors[i]
+        assert values[i] == pytest.approx(expected, rel=1e-12)
+
+    assert errors.tolist() == [False, False, True, True, False, True, False, False]
+
+def test_vectorized_evaluation_error_mask():
+    np = pytest.importorskip("numpy")
+    calculator = Calculator()
+
+    values, errors = calculator.compile_function("1 / x").evaluate_columns({'x': [1, 0, 4]})
+    assert errors.tolist() == [False, True, False]
+    assert values[0] == 1 and np.isnan(values[1]) and values[2] == 0.25
+
+    values, errors = calculator.compile_function("x ^ 0.5 + x! + 10 ^ x").evaluate_columns({'x': [4, -4, 1.5, 400]})
+    assert errors.tolist() == [False, True, True, True]
+
+    values, errors = calculator.compile_function("~~x").evaluate_columns({'x': [1, 2]})
+    assert errors.all()
+
+    values, errors = calculator.compile_function("3! + 1").evaluate_columns(size=3)
+    assert values.tolist() == [7, 7, 7]
+
+    with pytest.raises(UnboundVariableException):
+        calculator.compile_function("x + y").evaluate_columns({'x': [1]})
+
+
+# Sessions
+def test_session_named_results():
+    session = Session()
+    assert session.execute("a = 30!") == math.factorial(30)
+    assert session.execute("b = a# + 2") == sum(map(int, str(math.factorial(30)))) + 2
+    assert session.execute("b * 2 - a % 7") == 2 * session["b"]
+
+    # a result can use a name that is defined later
+    session.assign("d", "c ^ 2")
+    with pytest.raises(UnboundVariableException):
+        session.value("d")
+    session.assign("c", "3")
+    assert session["d"] == 9
+
+    session.assign("c", "1 / 0")
+    with pytest.raises(InvalidOperandException):
+        session.value("d")
+    session.remove("c")
+    with pytest.raises(UnboundVariableException):
+        session.value("d")
+
+def test_session_refuses_circular_dependencies():
+    session = Session()
+    session.assign("a", "1")
+    session.assign("b", "a + 1")
+    session.assign("c", "b * 2")
+    with pytest.raises(CircularDependencyException):
+        session.assign("a", "c - 1")
+    with pytest.raises(CircularDependencyException):
+        session.execute("x = x + 1")
+    assert session["c"] == 4
+
+def test_session_recomputes_only_the_dirty_results():
+    session = Session()
+    session.assign("x0", "1")
+    for i in range(1, 1000):
+        session.assign(f"x{i}", f"x{i - 1} + 1")
+    session.assign("y", "2")
+    session.assign("z", "y * 3")
+
+    # a long chain is evaluated without recursion
+    assert session["x999"] == 1000
+    assert session["z"] == 6
+    evaluations = session.evaluations
+
+    session.assign("y", "5")
+    assert session["x999"] == 1000 and session["z"] == 15
+    assert session.evaluations - evaluations == 2
+
+    session.assign("x998", "0")
+    assert session["x999"] == 1
+    assert session.evaluations - evaluations == 4
+
+def test_session_holds_unexpected_errors():
+    session = Session()
+    session.assign("a", "0^-1")
+    session.assign("b", "a+1")
+
+    # the error of the evaluation is held by the result and by its dependents, on every read
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            session["a"]
+        with pytest.raises(ZeroDivisionError):
+            session["b"]
+
+    session.assign("a", "2")
+    assert session["b"] == 3
+
+
+# Generated functions
+def test_generated_functions_match_tree_evaluation():
+    calculator = Calculator()
+    calculator.evaluator = CodegenEvaluator(FunctionCache())
+    strings = ["(3*(5-2)!)/((5!)/((-2^2)!)+1)", "((22/2)^2)#! - ~---120#!", "(30$14)*120#+2^(2&10)-(0.5+1/(16%((5!+1)/11)))",
+               "((10+10+10+3^2)/5!#)^2-(0.5*(2^-(-2&2)))", "2^0.5 + 10^30 + " + "9" * 30 + " % 97 + 30!#"]
+    for string in strings:
+        assert calculator.calculate(string) == calculate(string + "\0")
+
+    errors = ["1/0 + ~-(1+2)", "~-(1+2) + 1/0", "0^0", "(-8)^(1/3)", "2^(2^30)", "(-3)!", "2.5!", "5%(2-2)", "(2^0.5)!"]
+    for string in errors:
+        with pytest.raises(InvalidOperandException) as expected:
+            calculate(string + "\0")
+        with pytest.raises(InvalidOperandException) as error:
+            calculator.calculate(string)
+        assert str(error.value) == str(expected.value)
+
+def test_generated_functions_are_cached():
+    cache = FunctionCache(max_size=2)
+    evaluator = CodegenEvaluator(cache)
+    string = "(1+2)*3\0"
+    for i in range(3):
+        assert evaluator.evaluate(RecursiveDescentParser().parse(Lexer().lex(string), string)) == 9
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+
+    with pytest.raises(UnboundVariableException):
+        evaluator.evaluate(Calculator().compile("x + 1"))
+
+def test_generated_functions_with_variables():
+    calculator = Calculator()
+    string = "(x + 2)! / (y - 1) - x ^ y % 7 + (x @ y $ 3) & 10 + x# - ~y"
+    vm_function = calculator.compile_function(string)
+    generated_function = calculator.compile_function(string, codegen=True)
+    assert generated_function.variables == vm_function.variables == ('x', 'y')
+
+    for x in (0, 1, 2, 3.5, 4, -2, 3):
+        for y in (2, 0.5, 1, 3, -2, 1.25, 0):
+            try:
+                expected = vm_function(x, y)
+            except CALCULATION_ERRORS as error:
+                with pytest.raises(type(error)):
+                    generated_function(x, y)
+                continue
+            assert generated_function(x=x, y=y) == expected
+
+def test_generated_function_deep_expression():
+    node = Number(0, 1)
+    for i in range(20000):
+        node = Negative(0, '-', node)
+
+    assert CodegenEvaluator(FunctionCache()).evaluate(node) == 1
+
+
+# Rewrite pass
+def evaluate_all(tree, bindings:dict):
+    # The result (or the exception) of every evaluator
+    outcomes = []
+    function = CompiledExpression(tree)
+    generated_function = CompiledExpression(tree, codegen=True)
+    for evaluate in (lambda: evaluate_dag(tree, bindings), lambda: function(**bindings),
+                     lambda: generated_function(**bindings)):
+        try:
+            result = evaluate()
+            outcomes.append((type(result), result))
+        # 0 to a negative power raises a ZeroDivisionError
+        except CALCULATION_ERRORS + (ZeroDivisionError,) as error:
+            outcomes.append((type(error), str(error)))
+    return outcomes
+
+def test_rewrites_are_equivalent():
+    calculator = Calculator()
+    strings = ["(3^1000)%7 + (2^0.5)%3 + (5!)%7", "(2^x)%97 * (x!)%1000 - y", "1+2+x+y+3.5+y", "x*1.05*y*2*x",
+               "(2^3)^2%5 + 2^3^2", "(0^x)%7", "(x^y)%13", "(x!)%y", "((2+x)! % 3) + 10!%11", "(x - 3)! % 5",
+               "-(2^3)*(5!#+3)+((5^2*2^2)/10+~---4)", "~-x + 4 / (2 - 2) + (2^y)%(0)", "(1.5 + x) * 2.5 * y",
+               # Folded negative literals are parenthesized in the generated source, and keep the complex result check
+               "(2-9)^x", "(2-9)^y * (7/(0-6))^2.5", "(7/(0-6))^2.5", "(1-4)^(1/2) + x"]
+    for string in strings:
+        tree = calculator.compile(string)
+        rewritten = rewrite(tree)
+        for x in (0, 1, 3, 2.5, -2, 25):
+            for y in (0, 2, 0.5, -3, 12):
+                bindings = {'x': x, 'y': y}
+                assert evaluate_all(rewritten, bindings) == evaluate_all(tree, bindings)
+
+def test_rewrite_fuses_and_flattens():
+    calculator = Calculator()
+    calculator.rewrite = True
+
+    tree = calculator.compile("(x^1000000)%7 + (x!)%1000003")
+    assert type(tree.left) == PowerMod and type(tree.right) == FactorialMod
+    assert calculator.compile_function("(x^1000000)%7")(3) == pow(3, 1000000, 7)
+    assert calculator.compile_function("(x!)%1000003")(100000) == math.factorial(100000) % 1000003
+
+    tree = calculator.compile("x + 1 + 2 + y")
+    assert type(tree) == Sum and dump_tree(tree)[2:] == ('x', 1, 2, 'y')
+    assert type(calculator.compile("2 * 3 * x * 4")) == Product
+    assert dump_tree(calculator.compile("(2^3 + 1) * x")) == ('Mult', 10, 9, 'x')
+
+    # a long chain is flattened in a single pass over its spine
+    tree = calculator.compile("+".join(["x"] * 40000))
+    assert type(tree) == Sum and len(tree.operands) == 40000
+
+    # a literal power that is too large is left to raise when it is evaluated
+    with pytest.raises(InvalidOperandException, match="too large"):
+        calculator.calculate("(2^(2^30))%7")
+    assert calculator.calculate("(3^100000)%1000 + 7!%5") == pow(3, 100000, 1000)
+
+    # A folded negative base is the base of the generated power (not the negation of the power)
+    assert calculator.compile_function("(2-9)^x", codegen=True)(x=2) == 49
+    with pytest.raises(InvalidOperandException, match="complex"):
+        calculator.compile_function("(7/(0-6))^2.5", codegen=True)()
+
+    # Long flattened chains are generated without exhausting the stack of the compiler
+    assert calculator.compile_function("+".join(["x"] * 3000), codegen=True)(x=2) == 6000
+    assert calculator.compile_function("*".join(["x"] * 3000), codegen=True)(x=3) == 3 ** 3000
+
+
+# Interval-bound pruning
+def test_bounds_hold_the_results():
+    calculator = Calculator()
+    strings = ["(3^1000)%7 + (2^0.5)%3 - (5!)#", "-(2^3)*(5!#+3)+((5^2*2^2)/10+~---4)", "((10^400 + 1) / 10^399) @ 2.5",
+               "(1.5 - 20!) * 2.5 / (7 - 2^0.5)", "(200!)# $ (3^-2) & (12.5 - 7!)"]
+    for string in strings:
+        tree = calculator.compile(string)
+        bounds = bound_nodes(tree)
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            assert bounds[id(node)].safe and bounds[id(node)].trusted
+            assert bounds[id(node)].low <= magnitude(node.evaluate()) <= bounds[id(node)].high
+
+def test_pruning_skips_dominated_operands():
+    calculator = Calculator()
+    calculator.evaluator = PruningEvaluator()
+    expected = {"5 & 100000!": 5, "(99999!)# & (3^5 + (10!)^2)": sum(map(int, int_to_string(math.factorial(99999)))),
+                "((2^100000)*3) & (3^63093)": 3 ** 63093, "(2.5 @ 7) $ -(50000!)": 4.75, "((10^400 + 1) / 10^399) & 20!": 10.0}
+    for string, result in expected.items():
+        assert calculator.calculate(string) == result
+        assert calculator.evaluator.pruned == 1
+
+    # without a separating bound, both operands are evaluated
+    for string in ["(2^10) $ (2^10)", "(3.5 - 1) & 2.5", "0.1 & (1/10)"]:
+        assert calculator.calculate(string) == calculator.compile(string).evaluate()
+        assert calculator.evaluator.pruned == 0
+
+def test_pruning_raises_the_skipped_errors_in_strict_mode():
+    calculator = Calculator()
+    for string in ["1 & (10^20000000 + 5)", "3 $ (-5)!", "0.5 & (0.5 - 1)!"]:
+        tree = calculator.compile(string)
+        with pytest.raises(InvalidOperandException) as tree_error:
+            tree.evaluate()
+        with pytest.raises(InvalidOperandException) as pruned_error:
+            evaluate_pruned(tree)
+        assert str(pruned_error.value) == str(tree_error.value)
+
+    # the skipped operand is not evaluated at all without the strict mode
+    assert evaluate_pruned(calculator.compile("1 & (10^20000000 + 5)"), strict=False) == (1, 1)
+    assert evaluate_pruned(calculator.compile("3 $ (-5)!"), strict=False) == (3, 1)
+    assert evaluate_pruned(calculator.compile("0.5 & (0.5 - 1)!"), strict=False) == (0.5, 1)
+
+def test_pruning_approximates_within_the_tolerance():
+    calculator = Calculator()
+    calculator.evaluator = PruningEvaluator(tolerance=1e-6)
+    result = calculator.calculate("((2^100000 + 1) / 2^99990) @ (3^5000 / 3^4990)")
+    assert type(result) == float and math.isclose(result, (1024 + 3 ** 10) / 2, rel_tol=1e-6)
+    assert calculator.evaluator.pruned == 1
+
+    # cheap subtrees stay exact, and variables are bound like in the other evaluations
+    assert calculator.calculate("2 + 3") == 5
+    tree = calculator.compile("x & (x!)")
+    assert evaluate_pruned(tree, {'x': 5}, tolerance=1e-6) == (5, 1)
+    with pytest.raises(UnboundVariableException):
+        evaluate_pruned(tree)
+
+def test_pruning_approximates_only_under_continuous_operators():
+    calculator = Calculator()
+    string = "(((-97)$((2.5)+(300)))$((300)+(~2.5)))*((300^(3^(-12)))#)"
+    assert evaluate_pruned(calculator.compile(string), tolerance=1e-6)[0] == calculator.compile(string).evaluate()
+
+    # random expressions of positive operands (so a sum or a product of approximations keeps their relative error),
+    # with expensive subtrees of float-sized results under every operator
+    generator = random.Random(2024)
+    atoms = ["7", "300", "2.5", "13", "((2^3000 + 1) / 2^2990)", "(3^2000 / 3^1990)", "(300^(3^(-12)))", "(40!/38!)"]
+    operators = ["+", "*", "/", "@", "$", "&", "%", "^"]
+
+    def expression(depth):
+        if depth == 0 or generator.random() < 0.2:
+            return generator.choice(atoms)
+        if generator.random() < 0.15:
+            return f"({expression(depth - 1)})" + generator.choice(["#", "!"])
+        return f"({expression(depth - 1)}){generator.choice(operators)}({expression(depth - 1)})"
+
+    for _ in range(300):
+        tree = calculator.compile(expression(4))
+        try:
+            expected = tree.evaluate()
+        except (InvalidOperandException, ZeroDivisionError, OverflowError) as error:
+            with pytest.raises(type(error)):
+                evaluate_pruned(tree, tolerance=1e-6)
+            continue
+
+        result, _ = evaluate_pruned(tree, tolerance=1e-6)
+        if not (type(expected) == float and math.isnan(expected)):
+            assert result == expected or math.isclose(result, expected, rel_tol=1e-4)
+
+
+# Approximate mode
+def test_approximations_of_huge_results():
+    calculator = Calculator()
+    calculator.approximate = True
+
+    result = calculator.calculate("(10000!)^3")
+    assert type(result) == Approximation and result.sign == 1 and result.exponent == 106978
+    assert result.relative_error < 1e-8
+    exact = math.factorial(10000)
+    assert str(calculator.calculate("10000!")).startswith(int_to_string(exact)[0] + "." + int_to_string(exact)[1:8])
+    assert abs(calculator.calculate("10000!").log10 - math.log10(exact)) <= calculator.calculate("10000!").error
+
+    # the size limits of the exact evaluation do not apply, and small results stay exact
+    assert calculator.calculate("1000000!").exponent == 5565708
+    assert str(calculator.calculate("-(2^(2^40))")).startswith("-8.1e+330985980541")
+    assert calculator.calculate("(10^400 + 1) / 10^399") == 10.0
+    for string in ["2+3*4", "(15!)#", "5!^2 % 7", "10^400 & 3", "(2^0.5)*3 @ 1", "100 % (10^2000)"]:
+        assert calculator.calculate(string) == calculator.compile(string).evaluate()
+
+    # the results within the exact bit budget keep their digits and residues
+    for string in ["(1000!)#", "(2^4000)%3", "(2^4000)-(2^4000)", "(3000!) % 7", "2^65535"]:
+        assert calculator.calculate(string) == calculator.compile(string).evaluate()
+    assert type(calculator.calculate("2^65536")) == Approximation
+
+def test_approximations_raise_like_the_exact_evaluation():
+    calculator = Calculator()
+    calculator.approximate = True
+    for string in ["1/0", "0^0", "(-5)!", "2.5!", "~(2+1)", "(-10)^0.5"]:
+        with pytest.raises(InvalidOperandException) as approximate_error:
+            calculator.calculate(string)
+        with pytest.raises(InvalidOperandException) as exact_error:
+            calculator.compile(string).evaluate()
+        assert str(approximate_error.value) == str(exact_error.value)
+
+    # the digits and the residues of approximations are unknown, and so is a difference below their error
+    for string in ["(10000!)#", "(10000!) % 7", "(10000!) - (10000!)", "(-2)^(10^1000)", "(-10)^(400.5)"]:
+        with pytest.raises(InvalidOperandException):
+            calculator.calculate(string)
+
+def test_approximate_output():
+    class Printer:
+        def output(self, string):
+            self.string = string
+
+    calculator = Calculator()
+    calculator.approximate = True
+    calculator.printer = Printer()
+    calculator.output(calculator.calculate("(10^400 + 1) * 2.5"))
+    assert calculator.printer.string.startswith("The result is approximately 2.5000000000")
+    assert calculator.printer.string.endswith("e+400 (relative error at most 3.3e-12)")
+    assert str(Approximation(-1, 160.5, 1e-3, True)) == "-3.2e+160"
+    assert str(Approximation(1, 1.5e160, 1e147, True)) == "10^1.500000000000e+160"
+
+
+# Numeric backends
+def backend_calculator(backend, lexer=None):
+    calculator = Calculator()
+    calculator.backend = backend
+    if lexer is not None:
+        calculator.lexer = lexer
+    return calculator
+
+def test_native_backend_matches_the_tree_evaluation():
+    for string in ["0.1+0.2", "7/2", "3!+2^10", "(5@2)%3", "~3*4", "123#", "2.5$1", "2^0.5"]:
+        assert backend_calculator(NumericBackend()).calculate(string) == Calculator().calculate(string)
+
+def test_exact_backend():
+    for lexer in (Lexer(), ScannerLexer(), CompactLexer()):
+        calculator = backend_calculator(ExactBackend(), lexer)
+        assert calculator.calculate("0.1+0.2") == Fraction(3, 10)
+        assert calculator.calculate("1/3*3") == 1 and type(calculator.calculate("1/3*3")) == int
+        assert calculator.calculate("2^(0-2)") == Fraction(1, 4)
+        assert calculator.calculate("4.5@2") == Fraction(13, 4)
+        assert calculator.calculate("5%0.3") == Fraction(1, 5)
+        assert calculator.calculate("(1/3)^2") == Fraction(1, 9)
+        assert calculator.calculate("(2.0)!") == 2
+        assert calculator.calculate("10^400*1.0") == 10 ** 400
+
+    # The irrational powers are rounded, and the invalid operands raise like the tree evaluation
+    calculator = backend_calculator(ExactBackend())
+    assert calculator.calculate("2^0.5") == 2 ** 0.5
+    for string in ["1.5!", "1/0", "(0.5-1)^0.5", "(1/2)^100000000", "~(1+2)"]:
+        with pytest.raises(InvalidOperandException):
+            calculator.calculate(string)
+
+def test_float_backend_reports_overflows():
+    calculator = backend_calculator(FloatBackend())
+    assert calculator.calculate("3!") == 6.0 and type(calculator.calculate("3!")) == float
+    assert calculator.calculate("0.1+0.2") == 0.1 + 0.2
+    for string in ["171!", "10^400", "2^1024", "1.7*10^308*10", "(171!)%7"]:
+        with pytest.raises(OverflowError):
+            calculator.calculate(string)
+
+def test_backend_overflows_in_activate(capsys):
+    class Reader:
+        def input(self, prompt):
+            return "171!"
+
+    calculator = backend_calculator(FloatBackend())
+    calculator.reader = Reader()
+    assert not calculator.activate()
+    assert "too large for the float backend" in capsys.readouterr().out
+
+def test_backend_rewrite_does_not_fold():
+    calculator = backend_calculator(ExactBackend())
+    calculator.rewrite = True
+    assert calculator.calculate("1/3+1/3+1/3") == 1
+    assert calculator.calculate("(3^200)%7") == pow(3, 200, 7)
+
+def test_make_backend():
+    assert type(make_backend()) == NumericBackend
+    assert type(make_backend('float')) == FloatBackend
+    assert type(make_backend('gmpy2')) == (GmpyBackend if gmpy2 is not None else ExactBackend)
+    with pytest.raises(ValueError):
+        make_backend('decimal')
+
+def test_gmpy2_backend():
+    pytest.importorskip("gmpy2")
+    calculator = backend_calculator(GmpyBackend())
+    exact = backend_calculator(ExactBackend())
+    # The results are equal and of the same kind (the integers, fractions and floats of the two backends)
+    kinds = {int: int, gmpy2.mpz: int, Fraction: Fraction, gmpy2.mpq: Fraction, float: float}
+    for string in ["0.1+0.2", "7/2", "2^(0-2)", "3000!", "(2^100)^50", "(3^200)%(0-7)", "(5000!)%1009", "123456789#",
+                   "4.5@2", "2^0.5", "(99!)#", "(99!)/(2^0.5)", "(0.5^0.5)$(1/3)", "(2.5$(2^0.5))+1", "(2^0.5)%(10^30)"]:
+        result, exact_result = calculator.calculate(string), exact.calculate(string)
+        assert result == exact_result and kinds[type(result)] == kinds[type(exact_result)]
+    assert str(calculator.calculate("2^100")) == str(2 ** 100)
+
+    # The mpz results are JSON numbers (and strings of their digits past the int-to-str digits limit)
+    assert ''.join(format_json_result(calculator.calculate("2^100"))) == str(2 ** 100)
+    assert ''.join(format_json_result(calculator.calculate("3000!"))) == f'"{int_to_string(math.factorial(3000))}"'
+
+
+# Output formats
+def test_int_to_scientific():
+    for n in [0, 7, -12345, 10 ** 5000, 10 ** 5000 - 1, math.factorial(3000), -(3 ** 20000)]:
+        digits = int_to_string(abs(n))
+        for significant_digits in (1, 5, 20):
+            leading = digits[:significant_digits].ljust(significant_digits, '0')
+            mantissa = leading[0] + ('.' + leading[1:] if significant_digits > 1 else '')
+            assert int_to_scientific(n, significant_digits) == f"{'-' if n < 0 else ''}{mantissa}e+{len(digits) - 1}"
+
+def test_format_number():
+    n = 7 ** 20000
+    assert ''.join(format_number(n)) == int_to_string(n)
+    assert ''.join(int_to_chunks(-n, 1000)) == int_to_string(-n)
+    assert ''.join(format_number(n, HEX)) == hex(n)
+    assert ''.join(format_number(Fraction(-1, 3), SCIENTIFIC, 5)) == "-3.3333e-1"
+    assert ''.join(format_number(Fraction(3, 10))) == "3/10"
+    assert ''.join(format_number(0.5, HEX)) == (0.5).hex()
+    assert ''.join(format_number(1.5, SCIENTIFIC, 3)) == "1.50e+0"
+    assert ''.join(format_number(math.inf, SCIENTIFIC)) == "inf"
+    for n in (0, 127, 128, -128, -129, 2 ** 100):
+        assert int.from_bytes(int_to_bytes(n), 'big', signed=True) == n
+
+def test_output_large_results():
+    calculator = Calculator()
+    result = calculator.calculate("5000!")
+
+    stream = io.StringIO()
+    calculator.printer = StreamOutputPrinter(stream, buffer_size=1000)
+    calculator.output(result)
+    calculator.printer.flush()
+    assert stream.getvalue() == "The result is " + int_to_string(math.factorial(5000)) + "\n"
+
+    stream = io.StringIO()
+    calculator.printer = StreamOutputPrinter(stream, number_format=SCIENTIFIC, significant_digits=8)
+    calculator.output(result)
+    calculator.printer.flush()
+    assert stream.getvalue() == "The result is 4.2285779e+16325\n"
+
+    stream = io.TextIOWrapper(io.BytesIO())
+    calculator.printer = StreamOutputPrinter(stream, number_format=RAW)
+    calculator.output(result)
+    assert int.from_bytes(stream.buffer.getvalue(), 'big', signed=True) == math.factorial(5000)
+
+    with pytest.raises(ValueError):
+        StreamOutputPrinter(stream, number_format='octal')
+
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import math
+import signal
+import time
+from functools import partial
+
+from Algorithms.digits import int_to_string
+from calculator import Calculator
+from cost_policy import CostPolicy
+from evaluator import TreeEvaluator
+from server import CalculatorServer, _make_calculator, parse_arguments
+
+
+class SlowEvaluator(TreeEvaluator):
+    def evaluate(self, expression):
+        time.sleep(0.3)
+        return super().evaluate(expression)
+
+class BlockingEvaluator(TreeEvaluator):
+    # An evaluator that ignores the soft time limit on the expression "0", like a single long C call
+    def evaluate(self, expression):
+        if expression.value == 0:
+            signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+            try:
+                time.sleep(60)
+            finally:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGALRM])
+        return super().evaluate(expression)
+
+def make_calculator(inline_cost:float, slow:bool = False, blocking:bool = False) -> Calculator:
+    calculator = Calculator()
+    calculator.policy = CostPolicy(inline_cost=inline_cost)
+    if slow:
+        calculator.evaluator = SlowEvaluator()
+    if blocking:
+        calculator.evaluator = BlockingEvaluator()
+    return calculator
+
+async def send_lines(address:tuple, lines:list[str]) -> list[dict]:
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write("".join(line + "\n" for line in lines).encode())
+    await writer.drain()
+
+    answers = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    return answers
+
+async def post(address:tuple, method:str, body:bytes, connection:tuple = None) -> tuple[int, dict]:
+    reader, writer = connection if connection is not None else await asyncio.open_connection(*address)
+    writer.write(f"{method} /evaluate HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()).strip():
+        pass
+    answer = json.loads(await reader.read())
+    writer.close()
+    return status, answer
+
+
+def test_server_line_protocol():
+    async def scenario():
+        # 1000! is too expensive to be evaluated inline, so it goes to a worker
+        server = CalculatorServer(partial(make_calculator, 1e3), workers=1)
+        await server.start()
+        try:
+            return await send_lines(server.addresses[0], ["1+2", "1000!", "1/0", "3+", "5@7"])
+        finally:
+            await server.close()
+
+    answers = asyncio.run(scenario())
+
+    assert [answer["line"] for answer in answers] == [1, 2, 3, 4, 5]
+    assert answers[0]["result"] == 3 and answers[1]["result"] == math.factorial(1000) and answers[4]["result"] == 6
+    assert answers[2]["error"] == "InvalidOperandException"
+    assert answers[3]["error"] == "MissingOperandException"
+
+def test_server_expression_cache():
+    async def scenario():
+        server = CalculatorServer(partial(_make_calculator, CostPolicy(), 16), workers=1)
+        await server.start()
+        try:
+            return await send_lines(server.addresses[0], ["3+2", "3 + 2", "2^10"]), server.calculator.cache
+        finally:
+            await server.close()
+
+    answers, cache = asyncio.run(scenario())
+    assert [answer["result"] for answer in answers] == [5, 5, 1024]
+    assert cache.hits == 1 and cache.misses == 2
+    assert parse_arguments(["--cache-size", "100"]).cache_size == 100
+
+def test_server_http_endpoint():
+    async def scenario():
+        server = CalculatorServer(partial(make_calculator, 1e6), workers=1)
+        await server.start(http_port=0)
+        address = server.addresses[1]
+        try:
+            return [await post(address, "POST", b'{"expression": "2^10"}'),
+                    await post(address, "POST", b'{"expression": "(2+"}'),
+                    await post(address, "POST", b'[1, 2]'),
+                    await post(address, "GET", b'')]
+        finally:
+            await server.close()
+
+    answers = asyncio.run(scenario())
+
+    assert answers[0] == (200, {"result": 1024})
+    assert answers[1][0] == 422 and answers[1][1]["error"] == "MissingOperandException"
+    assert answers[2][0] == 400
+    assert answers[3][0] == 405
+
+def test_server_large_and_non_finite_results():
+    async def scenario():
+        server = CalculatorServer(partial(make_calculator, 1e6), workers=1)
+        await server.start(http_port=0)
+        try:
+            lines = ["3000!", "2^20000", "(2.0^1000)*(2.0^1000)", "(2.0^1000)*(2.0^1000)-(2.0^1000)*(2.0^1000)"]
+            return (await send_lines(server.addresses[0], lines),
+                    await post(server.addresses[1], "POST", b'{"expression": "2^20000"}'),
+                    await post(server.addresses[1], "POST", b'{"expression": "(2.0^1000)*(2.0^1000)"}'))
+        finally:
+            await server.close()
+
+    answers, power, infinity = asyncio.run(scenario())
+
+    # The integers beyond the int-to-str digits limit are strings of their digits (like the batch records), and the
+    # infinities and NaN are strings, so every answer is strict JSON
+    assert answers[0] == {"line": 1, "result": int_to_string(math.factorial(3000))}
+    assert answers[1] == {"line": 2, "result": int_to_string(2 ** 20000)}
+    assert answers[2] == {"line": 3, "result": "inf"} and answers[3] == {"line": 4, "result": "nan"}
+    assert power == (200, {"result": int_to_string(2 ** 20000)})
+    assert infinity == (200, {"result": "inf"})
+
+def test_server_drains_requests_in_flight():
+    async def scenario():
+        # Every expression goes to a worker, and takes 0.3 seconds
+        server = CalculatorServer(partial(make_calculator, -1, True), workers=2)
+        await server.start()
+        answers = asyncio.create_task(send_lines(server.addresses[0], ["1+1", "2+2"]))
+
+        await asyncio.sleep(0.1)
+        await server.close()
+        return await answers
+
+    answers = asyncio.run(scenario())
+    assert answers == [{"line": 1, "result": 2}, {"line": 2, "result": 4}]
+
+def test_server_close_answers_http_with_503():
+    async def scenario():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+
+        # A line takes 0.3 seconds in a worker, so the server is draining while the HTTP request is sent
+        server = CalculatorServer(partial(make_calculator, -1, True), workers=1)
+        await server.start(http_port=0)
+        connection = await asyncio.open_connection(*server.addresses[1])
+        idle = await asyncio.open_connection(*server.addresses[0])
+        answers = asyncio.create_task(send_lines(server.addresses[0], ["1+1"]))
+
+        await asyncio.sleep(0.1)
+        closing = asyncio.create_task(server.close())
+        await asyncio.sleep(0.05)
+        status = await post(None, "POST", b'{"expression": "1+2"}', connection)
+        await closing
+        idle[1].close()
+        return errors, status, await answers, server.handlers
+
+    errors, status, answers, handlers = asyncio.run(scenario())
+    assert status == (503, {"error": "ServiceUnavailable", "message": "The server is shutting down"})
+    assert answers == [{"line": 1, "result": 2}]
+    assert not errors and not handlers
+
+def test_server_kills_runaway_workers():
+    async def scenario():
+        server = CalculatorServer(partial(make_calculator, -1, blocking=True), workers=1, timeout=0.2)
+        await server.start()
+        try:
+            start = time.monotonic()
+            answers = await send_lines(server.addresses[0], ["0"])
+            # The only worker is free again (it would be blocked for a minute if it was not killed)
+            answers += await send_lines(server.addresses[0], ["2+2"])
+            return answers, time.monotonic() - start
+        finally:
+            await server.close()
+
+    answers, elapsed = asyncio.run(scenario())
+    assert answers[0]["error"] == "EvaluationTimeoutException"
+    assert answers[1] == {"line": 1, "result": 4}
+    assert elapsed < 10
+
+def test_server_unexpected_errors():
+    async def scenario():
+        server = CalculatorServer(partial(make_calculator, 1e6), workers=1)
+        await server.start()
+        try:
+            deep = "(" * 2000 + "1" + ")" * 2000
+            answers = await send_lines(server.addresses[0], ["1+1", deep, "1+" * 3000 + "1", "0^-1", "2*3"])
+            # A line longer than the reader's limit is answered with an error, and the connection is closed
+            answers += await send_lines(server.addresses[0], ["3+4", "1" * 100000])
+            return answers
+        finally:
+            await server.close()
+
+    answers = asyncio.run(scenario())
+
+    assert answers[0] == {"line": 1, "result": 2} and answers[1] == {"line": 2, "result": 1}
+    assert answers[2] == {"line": 3, "result": 3001} and answers[3]["error"] == "ZeroDivisionError"
+    assert answers[4] == {"line": 5, "result": 6}
+    assert answers[5] == {"line": 1, "result": 7}
+    assert answers[6]["line"] == 2 and answers[6]["error"] == "ValueError"
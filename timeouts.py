@@ -0,0 +1,44 @@
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from Exceptions.exceptions import EvaluationTimeoutException
+
+
+def _raise_timeout(signum, frame):
+    raise EvaluationTimeoutException()
+
+
+@contextmanager
+def time_limit(seconds:float):
+    """
+    This context manager raises an EvaluationTimeoutException inside its block once the time limit is over.
+    The limit is enforced with a SIGALRM timer, so it only interrupts Python code (a single long C call, like a huge
+    multiplication, is only interrupted once it returns). Outside the main thread, or on platforms without SIGALRM,
+    the block runs without a limit. Limits can be nested
+    Args:
+        seconds (float): the time limit (None or 0 for no limit)
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    # If an enclosing limit ends first, it is the one that applies
+    outer_remaining, _ = signal.getitimer(signal.ITIMER_REAL)
+    if outer_remaining and outer_remaining <= seconds:
+        yield
+        return
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+        # Restore the timer of the enclosing limit
+        if outer_remaining:
+            signal.setitimer(signal.ITIMER_REAL, max(outer_remaining - (time.monotonic() - start), 1e-6))
@@ -1,12 +1,25 @@
+from Algorithms.digits import sum_digits
+from Algorithms.factorial import factorial, factorial_mod
 from Exceptions.exceptions import *
 
+# The largest result of an integer power expression, in bits
+MAX_POWER_BITS = 1 << 24
 
-# Define the Token class
+
+# Define the Token class. Tokens are immutable, so a parsed tree can be shared between threads and caches
 class Token:
+    __slots__ = ('index', 'type', 'value')
+
     def __init__(self, index:int, type:str, value) -> None:
-        self.index = index
-        self.type = type
-        self.value = value
+        object.__setattr__(self, 'index', index)
+        object.__setattr__(self, 'type', type)
+        object.__setattr__(self, 'value', value)
+
+    def __setattr__(self, name:str, value) -> None:
+        raise AttributeError(f"Cannot set '{name}': {self.__class__.__name__} tokens are immutable")
+
+    def __delattr__(self, name:str) -> None:
+        raise AttributeError(f"Cannot delete '{name}': {self.__class__.__name__} tokens are immutable")
 
     def __str__(self) -> str:
         return f"<{self.index}, {self.type}, {self.value}>"
@@ -16,67 +29,138 @@ class Token:
 
 
 class Number(Token):
+    __slots__ = ()
+
     def __init__(self, index:int, value:float) -> None:
         super().__init__(index, "Number", value)
 
+    @property
+    def children(self) -> tuple:
+        return ()
+
     def evaluate(self) -> float:
         return self.value
 
+    # Method to pickle (and copy) the token through its constructor, since its attributes cannot be set
+    def __reduce__(self) -> tuple:
+        return (Number, (self.index, self.value))
+
+
+class Variable(Token):
+    __slots__ = ()
+
+    def __init__(self, index:int, name:str) -> None:
+        super().__init__(index, "Variable", name)
+
+    @property
+    def children(self) -> tuple:
+        return ()
+
+    # A tree has no variable values, so its variables are bound by the evaluators that take bindings
+    def evaluate(self) -> float:
+        raise UnboundVariableException(self.value)
+
+    # Method to pickle (and copy) the token through its constructor, since its attributes cannot be set
+    def __reduce__(self) -> tuple:
+        return (Variable, (self.index, self.value))
+
 
 class Operator(Token):
+    __slots__ = ()
+
     def __init__(self, index:int, value) -> None:
         super().__init__(index, "Operator", value)
 
-    # Method to validate the operands. Returns True by default (if not overridden)
-    def validate_operands(self) -> bool:
+    def build(self, *children:Token) -> Token:
+        """
+        this method builds a new node of the operator (at the same index) with the given children
+
+        Returns:
+            Token: the new node
+        """
+        return type(self)(self.index, self.value, *children)
+
+    # Method to pickle (and copy) the token through its constructor, since its attributes cannot be set
+    def __reduce__(self) -> tuple:
+        return (type(self), (self.index, self.value) + tuple(getattr(self, 'children', ())))
+
+    # Method to validate the operands' values. Returns True by default (if not overridden)
+    @staticmethod
+    def validate_operands(*values) -> bool:
         return True
 
 
 class OpenParen(Operator):
+    __slots__ = ()
+
     def __init__(self, index: int, value) -> None:
         super().__init__(index, value)
 
 class CloseParen(Operator):
+    __slots__ = ()
+
     def __init__(self, index: int, value) -> None:
         super().__init__(index, value)
     
 
 class UnaryOperator(Operator):
+    __slots__ = ('operand',)
+
     def __init__(self, index:int, value:str, operand:Token = None) -> None:
         super().__init__(index, value)
-        self.operand = operand
+        object.__setattr__(self, 'operand', operand)
+
+    @property
+    def children(self) -> tuple:
+        return (self.operand,)
+
+    def evaluate(self) -> float:
+        return self.operate(self.operand.evaluate())
+
+    # Method to compute the operator's result from the operand's value (overridden by every unary operator)
+    @staticmethod
+    def operate(value:float) -> float:
+        pass
 
 
 class BinaryOperator(Operator):
+    __slots__ = ('left', 'right')
+
     def __init__(self, index:int, value:str, left:Token = None, right:Token = None) -> None:
         super().__init__(index, value)
-        self.left = left
-        self.right = right
+        object.__setattr__(self, 'left', left)
+        object.__setattr__(self, 'right', right)
+
+    @property
+    def children(self) -> tuple:
+        return (self.left, self.right)
+
+    def evaluate(self) -> float:
+        return self.operate(self.left.evaluate(), self.right.evaluate())
+
+    # Method to compute the operator's result from the operands' values (overridden by every binary operator)
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
+        pass
 
         
 class Factorial(UnaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, operand: Token = None) -> None:
         super().__init__(index, value, operand)
 
-    def evaluate(self) -> float:
-        # Evaluate the operand
-        self.value = self.operand.evaluate()
-
+    @staticmethod
+    def operate(value:float) -> float:
         # Validate the operands
-        if self.validate_operands():
-            try:
-                return self._factorial(self.value)
-            except RecursionError:
-                raise InvalidOperandException("Invalid operand for the factorial operator. The operand is too large")
+        if Factorial.validate_operands(value):
+            return factorial(value)
 
-    def _factorial(self, n:int) -> int:
-        if n == 0: return 1
-        return n * self._factorial(n-1)
-
-    def validate_operands(self) -> bool:
+    @staticmethod
+    def validate_operands(value:float) -> bool:
         
          # If the value is not a natural number, raise an exception
-        if not(self.value >= 0 and self.value % 1 == 0):
+        if not(value >= 0 and value % 1 == 0):
             raise InvalidOperandException("Invalid operand for the factorial operator. Only natural numbers are allowed")
         
         # Else, return True
@@ -84,13 +168,19 @@ class Factorial(UnaryOperator):
 
 
 class Tilda(UnaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, operand: Token = None) -> None:
         super().__init__(index, value, operand)
 
     def evaluate(self) -> float:
         # Validate the operands
         if self.validate_operands():
-            return -1 * self.operand.evaluate()
+            return self.operate(self.operand.evaluate())
+
+    @staticmethod
+    def operate(value:float) -> float:
+        return -1 * value
 
     def validate_operands(self) -> bool:
         # If the operand is consist non-numbers tokens, raise an exception
@@ -101,81 +191,84 @@ class Tilda(UnaryOperator):
         return True
 
     def _check_children(self, node):
-        # Base case: if the current node is null or a number, return true
-        if not node or type(node) == Number:
-            return True
+        # Skip the chain of negative tokens
+        while type(node) == Negative:
+            node = node.operand
 
-        # If the node is not a negative token and not a number, return False
-        if type(node) != Negative:
-            return False
-        
-        # Check the rest of the nodes
-        return self._check_children(node.operand)
+        # The chain is valid if it is empty or ends with a number (or a variable, which stands for a number)
+        return not node or type(node) == Number or type(node) == Variable
 
 
 class Negative(UnaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, operand: Token = None) -> None:
         super().__init__(index, value, operand)
 
-    def evaluate(self) -> float:
-        return -1 * self.operand.evaluate()
+    @staticmethod
+    def operate(value:float) -> float:
+        return -1 * value
 
 
 class SumDigits(UnaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, operand: Token = None) -> None:
         super().__init__(index, value, operand)
 
-    def evaluate(self) -> float:
-        return self._count_digits(self.operand.evaluate())
-
-    def _count_digits(self, num):
-        sum = 0
-        for digit in str(num):
-            if digit.isdigit():
-                sum += int(digit)
-
-        return sum if num > 0 else -sum
+    @staticmethod
+    def operate(value:float) -> float:
+        return sum_digits(value)
 
 class Plus(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        return self.left.evaluate() + self.right.evaluate()
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
+        return left_value + right_value
 
 
 class Minus(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        return self.left.evaluate() - self.right.evaluate()
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
+        return left_value - right_value
 
 
 class Mult(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        return self.left.evaluate() * self.right.evaluate()
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
+        return left_value * right_value
 
 
 class Div(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        # Evaluate the operands
-        self.left_value = self.left.evaluate()
-        self.right_value = self.right.evaluate() 
-        
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
         # Validate the operands
-        if self.validate_operands():
-            return self.left_value / self.right_value
+        if Div.validate_operands(left_value, right_value):
+            return left_value / right_value
 
-    def validate_operands(self) -> bool:
+    @staticmethod
+    def validate_operands(left_value:float, right_value:float) -> bool:
         # If the right operand is 0, raise an exception
-        if self.right_value == 0:
+        if right_value == 0:
             raise InvalidOperandException("Invalid operand for division operator. Cannot divide by 0")
 
         # Else, return True
@@ -183,17 +276,16 @@ class Div(BinaryOperator):
 
 
 class Power(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        # Evaluate the operands
-        self.left_value = self.left.evaluate()
-        self.right_value = self.right.evaluate()
-
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
         # Validate the operands
-        if self.validate_operands():
-            value = self.left_value ** self.right_value
+        if Power.validate_operands(left_value, right_value):
+            value = left_value ** right_value
 
         # If the value is a complex number, raise an exception
         if type(value) == complex:
@@ -201,34 +293,38 @@ class Power(BinaryOperator):
 
         return value
 
-    def validate_operands(self) -> bool:
+    @staticmethod
+    def validate_operands(left_value:float, right_value:float) -> bool:
         # If the expression is 0^0, raise an exception
-        if self.left_value == 0 and self.right_value == 0:
+        if left_value == 0 and right_value == 0:
             raise InvalidOperandException("Invalid operand for power expression. Cannot evaluate 0^0")
 
-        if self.right_value >= 1000:
-            raise InvalidOperandException("Invalid operands for power expression. The operands are too large")
+        # If the result of an integer power is too large, raise an exception (its size in bits is at most the size of
+        # the base times the exponent, so it is known before computing it)
+        if type(left_value) == int and type(right_value) == int and right_value > 0 and abs(left_value) > 1:
+            if abs(left_value).bit_length() * right_value > MAX_POWER_BITS:
+                raise InvalidOperandException("Invalid operands for power expression. The operands are too large")
         
         # Else, return True
         return True
 
 
 class Mod(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        # Evaluate the operands
-        self.left_value = self.left.evaluate()
-        self.right_value = self.right.evaluate()
-
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
         # Validate the operands
-        if self.validate_operands():
-            return self.left_value % self.right_value
+        if Mod.validate_operands(left_value, right_value):
+            return left_value % right_value
 
-    def validate_operands(self) -> bool:
+    @staticmethod
+    def validate_operands(left_value:float, right_value:float) -> bool:
         # If the right side is 0, raise an exception
-        if self.right_value == 0:
+        if right_value == 0:
             raise InvalidOperandException("Invalid operand for mod operator. Cannot divide by 0")
 
         # Else, return True
@@ -236,33 +332,117 @@ class Mod(BinaryOperator):
 
 
 class Max(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        
-        a = self.left.evaluate()
-        b = self.right.evaluate()
-
+    @staticmethod
+    def operate(a:float, b:float) -> float:
         return a if a > b else b
 
 
 class Min(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:
-        
-        a = self.left.evaluate()
-        b = self.right.evaluate()
-
+    @staticmethod
+    def operate(a:float, b:float) -> float:
         return a if a < b else b
 
 
 class Avg(BinaryOperator):
+    __slots__ = ()
+
     def __init__(self, index:int, value: str, left: Token = None, right: Token = None) -> None:
         super().__init__(index, value, left, right)
 
-    def evaluate(self) -> float:        
-        return (self.left.evaluate() + self.right.evaluate()) / 2
+    @staticmethod
+    def operate(left_value:float, right_value:float) -> float:
+        return (left_value + right_value) / 2
+
+
+class NaryOperator(Operator):
+    __slots__ = ('operands',)
+
+    def __init__(self, index:int, value:str, *operands:Token) -> None:
+        super().__init__(index, value)
+        object.__setattr__(self, 'operands', operands)
+
+    @property
+    def children(self) -> tuple:
+        return self.operands
+
+    def evaluate(self) -> float:
+        return self.operate(*[operand.evaluate() for operand in self.operands])
+
+
+# The fused operators below are not parsed: the rewrite pass (Algorithms.rewrite) builds them from equivalent trees
+
+
+class Sum(NaryOperator):
+    __slots__ = ()
+
+    def __init__(self, index:int, value:str, *operands:Token) -> None:
+        super().__init__(index, value, *operands)
+
+    # The operands are added from left to right, like a chain of Plus operators (so floats are rounded the same way)
+    @staticmethod
+    def operate(*values:float) -> float:
+        result = values[0]
+        for value in values[1:]:
+            result = result + value
+        return result
+
+
+class Product(NaryOperator):
+    __slots__ = ()
+
+    def __init__(self, index:int, value:str, *operands:Token) -> None:
+        super().__init__(index, value, *operands)
+
+    # The operands are multiplied from left to right, like a chain of Mult operators
+    @staticmethod
+    def operate(*values:float) -> float:
+        result = values[0]
+        for value in values[1:]:
+            result = result * value
+        return result
+
+
+class PowerMod(NaryOperator):
+    __slots__ = ()
+
+    def __init__(self, index:int, value:str, *operands:Token) -> None:
+        super().__init__(index, value, *operands)
+
+    # (base ^ exponent) % modulus. Integers use modular exponentiation, without the full power
+    @staticmethod
+    def operate(base:float, exponent:float, modulus:float) -> float:
+        # The power is validated first, so it raises like the unfused power
+        Power.validate_operands(base, exponent)
+
+        if type(base) == int and type(exponent) == int and type(modulus) == int and exponent >= 0:
+            Mod.validate_operands(0, modulus)
+            return pow(base, exponent, modulus)
+
+        return Mod.operate(Power.operate(base, exponent), modulus)
+
+
+class FactorialMod(NaryOperator):
+    __slots__ = ()
+
+    def __init__(self, index:int, value:str, *operands:Token) -> None:
+        super().__init__(index, value, *operands)
+
+    # (n!) % modulus, without the full factorial for a small integer modulus
+    @staticmethod
+    def operate(value:float, modulus:float) -> float:
+        Factorial.validate_operands(value)
+
+        if type(modulus) == int and modulus != 0:
+            return factorial_mod(value, modulus)
 
+        return Mod.operate(factorial(value), modulus)
\ No newline at end of file